@@ -0,0 +1,159 @@
+from datetime import datetime, timedelta
+from operator import attrgetter
+from engine import PRIORITIES, CalendarStore
+from storage import EPOCH, Journal, SqliteStore, to_minutes, from_minutes
+from perf import timed
+import numpy as np
+import argparse
+import time
+import json
+import os
+
+DAY = 24 * 60
+WEEK = 7 * DAY
+MONDAY = 4 * DAY
+ORIGIN = EPOCH.toordinal()
+ROW = np.dtype([('start', np.int64), ('end', np.int64), ('priority', np.int64)])
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+Columns = tuple[np.ndarray, np.ndarray, np.ndarray]
+
+def to_array(times: list[datetime]) -> np.ndarray:
+    n = len(times)
+    days = np.fromiter(map(datetime.toordinal, times), np.int64, n)
+    hours = np.fromiter(map(attrgetter('hour'), times), np.int64, n)
+    minutes = np.fromiter(map(attrgetter('minute'), times), np.int64, n)
+    return (days - ORIGIN) * DAY + hours * 60 + minutes
+
+@timed("analytics.export")
+def export(store: CalendarStore, start: datetime, end: datetime) -> Columns:
+    with store.lock:
+        if store.backend.lazy:
+            rows = np.fromiter(store.backend.columns(start, end), ROW)
+            starts, ends, priorities = rows['start'], rows['end'], rows['priority']
+        else:
+            i, j = store.index.span(start, end)
+            starts = to_array(store.index.starts[i:j])
+            ends = to_array(store.index.ends[i:j])
+            priorities = np.fromiter(map(attrgetter('priority'), map(store.schedule.__getitem__, store.index.ids[i:j])), np.int64, j - i)
+
+        occurrences = store.occurrences(start, end)
+
+    if occurrences:
+        starts = np.concatenate((starts, to_array([o.start for o in occurrences])))
+        ends = np.concatenate((ends, to_array([o.end() for o in occurrences])))
+        priorities = np.concatenate((priorities, np.fromiter((o.priority for o in occurrences), np.int64, len(occurrences))))
+        order = np.argsort(starts, kind='stable')
+        starts, ends, priorities = starts[order], ends[order], priorities[order]
+
+    lo, hi = to_minutes(start), to_minutes(end)
+    return np.clip(starts, lo, hi), np.clip(ends, lo, hi), np.minimum(priorities, len(PRIORITIES) - 1)
+
+def booked(starts: np.ndarray, ends: np.ndarray, bounds: np.ndarray) -> np.ndarray:
+    ends = np.sort(ends)
+    start_totals = np.concatenate(([0], np.cumsum(starts)))
+    end_totals = np.concatenate(([0], np.cumsum(ends)))
+    i = np.searchsorted(starts, bounds)
+    j = np.searchsorted(ends, bounds)
+    return bounds * i - start_totals[i] - bounds * j + end_totals[j]
+
+def union(starts: np.ndarray, ends: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    if not len(starts):
+        return starts, ends
+
+    reach = np.maximum.accumulate(ends)
+    first = np.concatenate(([True], starts[1:] > reach[:-1]))
+    last = np.concatenate((first[1:], [True]))
+    return starts[first], reach[last]
+
+def hour_of_week(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    offsets = (starts - MONDAY) % WEEK
+    lengths = ends - starts
+    stops = offsets + lengths % WEEK
+    occupancy = np.cumsum(np.bincount(offsets, minlength=2 * WEEK + 1) - np.bincount(stops, minlength=2 * WEEK + 1))[:2 * WEEK]
+    occupancy = occupancy[:WEEK] + occupancy[WEEK:]
+    return (occupancy.reshape(7, 24, 60).sum(axis=2) + (lengths // WEEK).sum() * 60) / 60
+
+def first_monday(time: datetime) -> datetime:
+    return datetime.combine(time.date(), datetime.min.time()) - timedelta(days=time.weekday())
+
+@timed("analytics.report")
+def report(store: CalendarStore, start: datetime, end: datetime) -> dict:
+    begin = time.perf_counter()
+    starts, ends, priorities = export(store, start, end)
+    exported = time.perf_counter()
+
+    lo, hi = to_minutes(start), to_minutes(end)
+    first = to_minutes(first_monday(start))
+    bounds = first + WEEK * np.arange(-(-(hi - first) // WEEK) + 1)
+    hours = np.zeros((len(PRIORITIES), len(bounds) - 1))
+
+    for p in np.unique(priorities):
+        mask = priorities == p
+        hours[p] = np.diff(booked(starts[mask], ends[mask], bounds)) / 60
+
+    covered = np.diff(booked(*union(starts, ends), bounds))
+    by_hour = hour_of_week(starts, ends)
+    weekday, hour = np.unravel_index(np.argmax(by_hour), by_hour.shape)
+
+    return {
+        "start": start,
+        "end": end,
+        "events": len(starts),
+        "weeks": [from_minutes(int(b)) for b in bounds[:-1]],
+        "hours": hours,
+        "utilization": covered.sum() / (hi - lo) if hi > lo else 0.0,
+        "weekly_utilization": covered / np.maximum(1, np.diff(np.clip(bounds, lo, hi))),
+        "hour_of_week": by_hour,
+        "busiest_hour": int(np.argmax(by_hour.sum(axis=0))),
+        "busiest_slot": (int(weekday), int(hour)),
+        "export_seconds": exported - begin,
+        "seconds": time.perf_counter() - exported,
+    }
+
+def summary(r: dict) -> str:
+    totals = r["hours"].sum(axis=0)
+    weekday, hour = r["busiest_slot"]
+    lines = [
+        f"{r['events']} events between {r['start']:%Y-%m-%d %H:%M} and {r['end']:%Y-%m-%d %H:%M}",
+        f"Exported in {r['export_seconds']:.3f}s, analysed in {r['seconds']:.3f}s",
+        f"Utilization: {r['utilization']:.1%}",
+        f"Busiest hour of day: {r['busiest_hour']:02}:00",
+        f"Busiest hour of week: {WEEKDAYS[weekday]} {hour:02}:00 ({r['hour_of_week'][weekday, hour]:.1f}h)",
+    ]
+
+    if len(totals):
+        w = int(np.argmax(totals))
+        lines.append(f"Busiest week: {r['weeks'][w]:%Y-%m-%d} ({totals[w]:.1f}h, {r['weekly_utilization'][w]:.1%} booked)")
+
+    lines.append("Hours by priority: " + ", ".join(f"{p}: {h:.1f}" for p, h in enumerate(r["hours"].sum(axis=1)) if h))
+    return '\n'.join(lines)
+
+def to_json(r: dict) -> dict:
+    r = dict(r, start=r["start"].isoformat(), end=r["end"].isoformat(), weeks=[w.isoformat() for w in r["weeks"]])
+    return {key: value.tolist() if isinstance(value, np.ndarray) else value for key, value in r.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise booked hours, busiest hours and utilization")
+    parser.add_argument('--start', type=datetime.fromisoformat, help="ISO date or time, inclusive, the first event by default")
+    parser.add_argument('--end', type=datetime.fromisoformat, help="ISO date or time, exclusive, the end of the last event by default")
+    parser.add_argument('--json', action='store_true', help="print the full report as JSON")
+    args = parser.parse_args()
+
+    store = CalendarStore(SqliteStore() if os.environ.get("CALENDAR_STORAGE") == "sqlite" else Journal())
+    store.load()
+
+    try:
+        bounds = store.bounds()
+
+        if bounds is None and (args.start is None or args.end is None):
+            print("No events")
+            return
+
+        r = report(store, args.start or bounds[0], args.end or bounds[1])
+        print(json.dumps(to_json(r), indent=4) if args.json else summary(r))
+    finally:
+        store.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+from datetime import datetime, timedelta
+from collections.abc import Callable
+from engine import CalendarStore
+from render import get_week, get_first_day_of_month, get_first_day_of_year, daily_cells, weekly_cells, monthly_cells, yearly_cells
+from storage import Journal, write_snapshot
+import subprocess
+import tracemalloc
+import argparse
+import platform
+import tempfile
+import random
+import time
+import json
+import os
+
+START = datetime(2020, 1, 1)
+KINDS = ['short', 'long', 'dense']
+
+Spec = tuple[datetime, int, int, str, str, int]
+
+def quarters_to_duration(quarters: int) -> tuple[int, int]:
+    return quarters // 4, quarters % 4
+
+def generate(kind: str, n: int, seed: int) -> list[Spec]:
+    rng = random.Random(seed)
+    events = []
+    t = START
+
+    for i in range(n):
+        match kind:
+            case 'short':
+                t += timedelta(minutes=15 * rng.randint(0, 16))
+                quarters = rng.randint(1, 8)
+            case 'long':
+                t += timedelta(minutes=15 * rng.randint(0, 96))
+                quarters = rng.randint(8 * 4, 72 * 4)
+            case 'dense':
+                t = START + timedelta(minutes=15 * rng.randrange(n * 2))
+                quarters = rng.randint(1, 16)
+
+        hours, minutes = quarters_to_duration(quarters)
+        events.append((t, hours, minutes, f"Event {i}", rng.choice(["", "Notes", f"Description of event {i}"]), rng.randrange(11)))
+
+        if kind != 'dense':
+            t += timedelta(minutes=15 * quarters)
+
+    return events
+
+def measure(results: list[dict], kind: str, size: int, step: str, memory: bool, f: Callable[[], int]):
+    if memory:
+        tracemalloc.start()
+
+    begin = time.perf_counter()
+    ops = f()
+    seconds = time.perf_counter() - begin
+    peak = None
+
+    if memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    results.append({"kind": kind, "size": size, "step": step, "ops": ops, "seconds": seconds, "peak_bytes": peak})
+    print(f"{kind:>6} {size:>8} {step:<14} {seconds:10.4f}s {ops:>8} ops" + ("" if peak is None else f" {peak / 2 ** 20:10.1f} MiB"))
+
+def run(kind: str, size: int, seed: int, memory: bool, directory: str) -> list[dict]:
+    results = []
+    events = generate(kind, size, seed)
+    end = max(start + timedelta(minutes=15 * (hours * 4 + minutes)) for start, hours, minutes, *_ in events)
+    span = (end - START) // timedelta(minutes=15)
+    rng = random.Random(seed + 1)
+    journal = os.path.join(directory, f'{kind}-{size}.journal')
+    snapshot = os.path.join(directory, f'{kind}-{size}.snap')
+    store = CalendarStore(Journal(journal, snapshot))
+
+    def insert():
+        store.add_many(events, 'replace')
+        store.save()
+        return len(events)
+
+    def resolve():
+        n = min(1000, size)
+
+        for i in range(n):
+            start = START + timedelta(minutes=15 * rng.randrange(span))
+            store.add(start, rng.randint(0, 8), rng.randrange(4) or 1, f"Conflict {i}", "", rng.randrange(11))
+
+        store.save()
+        return n
+
+    def check():
+        n = min(1000, size)
+        store.check_many((START + timedelta(minutes=15 * rng.randrange(span)), rng.randint(0, 8), rng.randrange(4) or 1, f"Candidate {i}", "", rng.randrange(11)) for i in range(n))
+        return n
+
+    def query():
+        n = 1000
+
+        for _ in range(n):
+            start = START + timedelta(minutes=15 * rng.randrange(span))
+            store.range(start, start + timedelta(days=7))
+
+        return n
+
+    def render(mode: str) -> Callable[[], int]:
+        def f():
+            n = 100
+
+            for _ in range(n):
+                day = START + timedelta(days=rng.randrange(max(1, span // 96)))
+
+                match mode:
+                    case 'Daily':
+                        daily_cells(store, day)
+                    case 'Weekly':
+                        weekly_cells(store, get_week(day)[0])
+                    case 'Monthly':
+                        monthly_cells(store, get_first_day_of_month(day))
+                    case 'Yearly':
+                        yearly_cells(store, get_first_day_of_year(day))
+
+            return n
+
+        return f
+
+    def save():
+        write_snapshot(store.records(), store.backend.seq, snapshot)
+        return len(store)
+
+    def load():
+        loaded = CalendarStore(Journal(journal, snapshot))
+        loaded.load()
+        return len(loaded)
+
+    measure(results, kind, size, 'insert', memory, insert)
+    measure(results, kind, size, 'conflicts', memory, resolve)
+    measure(results, kind, size, 'batch-check', memory, check)
+    measure(results, kind, size, 'range', memory, query)
+
+    for mode in ['Daily', 'Weekly', 'Monthly', 'Yearly']:
+        measure(results, kind, size, f'render-{mode.lower()}', memory, render(mode))
+
+    measure(results, kind, size, 'save', memory, save)
+    store.close()
+    measure(results, kind, size, 'load', memory, load)
+
+    return results
+
+def revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results: list[dict], path: str):
+    with open(path) as f:
+        previous = {(r["kind"], r["size"], r["step"]): r for r in json.load(f)["results"]}
+
+    print(f"\nCompared with {path}:")
+
+    for r in results:
+        p = previous.get((r["kind"], r["size"], r["step"]))
+
+        if p is not None and p["seconds"] > 0:
+            print(f"{r['kind']:>6} {r['size']:>8} {r['step']:<14} {r['seconds'] / p['seconds']:8.2f}x time")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the calendar engine on synthetic calendars")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--kinds', nargs='+', choices=KINDS, default=KINDS)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default='bench.json')
+    parser.add_argument('--compare', metavar='PATH')
+    parser.add_argument('--no-memory', dest='memory', action='store_false')
+    args = parser.parse_args()
+
+    results = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            for kind in args.kinds:
+                results += run(kind, size, args.seed, args.memory, directory)
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            "revision": revision(),
+            "python": platform.python_version(),
+            "time": datetime.now().isoformat(),
+            "seed": args.seed,
+            "memory": args.memory,
+            "results": results,
+        }, f, indent=4)
+
+    if args.compare is not None:
+        compare(results, args.compare)
+
+if __name__ == '__main__':
+    main()
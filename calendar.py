@@ -1,4 +1,3 @@
-from time import time as epoch
 from datetime import datetime, timedelta
 from tkinter import Event as TkEvent
 from tkinter import ttk
@@ -6,53 +5,125 @@ from tkinter import messagebox
 from tkinter.scrolledtext import ScrolledText
 from typing import Any, Self
 from collections.abc import Iterator
+from functools import lru_cache
+from itertools import islice
+from engine import PRIORITIES, AgendaKey, Autosaver, CalendarStore, Loader, Event, Occurrence, Overlap
+from render import get_week, get_first_day_of_month, get_first_day_of_year, period_start, Prefetcher
+from storage import FREQUENCIES, Journal, SqliteStore
 import tkinter as tk
-import json
+import argparse
+import perf
+import os
+
+analytics = None
+
+RENDERER = os.environ.get("CALENDAR_RENDERER", "tree")
+
+Tip = tuple[tuple[str, str], ...]
 
 WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-PRIORITIES = ['black', '#005500', '#00BB00', '#00FF00', '#77DD00', '#AADD00', '#DDDD00', '#FFBB00', '#FF9900', '#FF6600', '#FF0000']
 
 def stoi(s: str, empty=0) -> int:
     return empty if s == "" else int(s)
 
-def get_week(date) -> tuple[datetime, datetime]:
-    date -= timedelta(days=date.weekday())
-    return (date, date + timedelta(days=6))
-
-def get_first_day_of_month(date) -> datetime:
-    return date - timedelta(days=date.day - 1)
-
 def format_date(date) -> str:
     return date.strftime("%A %d %B %Y")
 
+def blend(color: str, fraction: float) -> str:
+    r, g, b = (int(color[i:i + 2], 16) for i in (1, 3, 5)) if color.startswith('#') else (0, 0, 0)
+    return '#' + ''.join(f"{round(255 - (255 - c) * fraction):02X}" for c in (r, g, b))
+
+def heat(minutes: int, priority: int) -> tuple[str, ...]:
+    if minutes <= 0:
+        return ('-fill', 'white', '-outline', '#DDDDDD')
+    
+    color = PRIORITIES[min(max(priority, 0), len(PRIORITIES) - 1)]
+    return ('-fill', blend(color, 0.2 + 0.8 * min(1, minutes / 480)), '-outline', color)
+
+def parse_clock(s: str) -> timedelta:
+    hours, _, minutes = s.strip().partition(':')
+    t = timedelta(hours=int(hours), minutes=int(minutes or 0))
+    
+    if not timedelta(0) <= t <= timedelta(days=1):
+        raise ValueError(s)
+    
+    return t
+
 def ask_conflict():
     return messagebox.askokcancel(
         title="Schedule conflict",
         message="There is a conflict between the time of different events.\nRemove all other events in conflict?"
     )
 
-def create_tooltip(master: tk.Widget, widget) -> tk.Toplevel:
-    window = tk.Toplevel(master)
-    window.wm_overrideredirect(True)
-    
-    delta_x = 10
-    delta_y = 5
-    widget: tk.Widget = widget(window)
-    width = 5 * 2 + widget.winfo_reqwidth()
-    height = 3 * 2 + widget.winfo_reqheight()
-    mouse_x, mouse_y = master.winfo_pointerxy()
-    x = mouse_x + delta_x
-    y = mouse_y + delta_y
-    if x + width > master.winfo_screenwidth() and y + height > master.winfo_screenheight():
-        x = mouse_x - delta_x - width
-        y = mouse_y - delta_y - height
-    y = max(0, y)
-
-    window.wm_geometry(f"+{x}+{y}")
-    return window
-
-def tooltip(master: tk.Widget, widget: 'TkWidget'):
-    return Tooltip(master, lambda window: widget.pack_widget(window))
+class TooltipWindow(tk.Toplevel):
+    instance: Self = None
+    frame: ttk.Frame
+    labels: list[ttk.Label]
+    shown: int
+    owner: tk.Widget
+    
+    def __init__(self, master: tk.Widget):
+        super().__init__(master)
+        self.wm_overrideredirect(True)
+        self.withdraw()
+        self.frame = ttk.Frame(self, style='Tooltip.TFrame', relief=tk.SOLID, padding=1)
+        self.frame.pack()
+        self.labels = []
+        self.shown = 0
+        self.owner = None
+    
+    @classmethod
+    def get(cls, master: tk.Widget) -> Self:
+        if cls.instance is None:
+            cls.instance = cls(master._root())
+        
+        return cls.instance
+    
+    @perf.timed("ui.tooltip")
+    def show(self, owner: tk.Widget, tip: Tip):
+        while len(self.labels) < len(tip):
+            self.labels.append(ttk.Label(self.frame, relief=tk.SOLID, background='white'))
+        
+        for label, (text, color) in zip(self.labels, tip):
+            label.configure(text=text, foreground=color)
+        
+        for label in self.labels[self.shown:len(tip)]:
+            label.pack(fill=tk.X)
+        
+        for label in self.labels[len(tip):self.shown]:
+            label.pack_forget()
+        
+        self.shown = len(tip)
+        self.owner = owner
+        self.update_idletasks()
+        
+        delta_x = 10
+        delta_y = 5
+        width = self.winfo_reqwidth()
+        height = self.winfo_reqheight()
+        mouse_x, mouse_y = owner.winfo_pointerxy()
+        x = mouse_x + delta_x
+        y = mouse_y + delta_y
+        if x + width > owner.winfo_screenwidth() and y + height > owner.winfo_screenheight():
+            x = mouse_x - delta_x - width
+            y = mouse_y - delta_y - height
+        y = max(0, y)
+        
+        self.wm_geometry(f"+{x}+{y}")
+        self.deiconify()
+        self.lift()
+    
+    def hide(self, owner: tk.Widget):
+        if self.owner is owner:
+            self.withdraw()
+            self.owner = None
+
+def hide_tooltip(owner: tk.Widget):
+    if TooltipWindow.instance is not None:
+        TooltipWindow.instance.hide(owner)
+
+def tooltip(master: tk.Widget, tip: Tip):
+    return Tooltip(master, tip)
 
 class TkWidget:
     pack: dict[str, Any]
@@ -154,17 +225,16 @@ class Selector(tk.Radiobutton):
 
 class Tooltip:
     master: tk.Widget
-    window: tk.Toplevel
+    tip: Tip
     
-    def __init__(self, master: tk.Widget, widget=lambda w: VFrame(w).pack()):
+    def __init__(self, master: tk.Widget, tip: Tip):
         master.bind("<Enter>", self.on_enter)
         master.bind("<Leave>", self.on_leave)
         master.bind("<ButtonPress>", self.on_leave)
         
         self.master = master
         self.id = None
-        self.window = None
-        self.widget = widget
+        self.tip = tip
 
     def on_enter(self, _=None):
         self.cancel()
@@ -172,10 +242,7 @@ class Tooltip:
 
     def on_leave(self, _=None):
         self.cancel()
-        
-        if self.window is not None:
-            self.window.destroy()
-            self.window = None
+        hide_tooltip(self.master)
 
     def cancel(self):
         if self.id is not None:
@@ -183,7 +250,7 @@ class Tooltip:
             self.id = None
 
     def show(self):
-        self.window = create_tooltip(self.master, self.widget)
+        TooltipWindow.get(self.master).show(self.master, self.tip)
 
 class TreeGroup:
     selected: 'Tree'
@@ -192,10 +259,15 @@ class TreeGroup:
     def __init__(self):
         self.selected = None
         self.ids = 0
+    
+    def clear(self):
+        if self.selected is not None:
+            self.selected.deselect()
+            self.selected = None
 
 class Tree(ttk.Treeview):
-    window: tk.Toplevel
-    widget: TkWidget
+    tip: Tip
+    cells: list[tuple[str, str]]
     selected: int
     selectable: bool
     group: TreeGroup
@@ -211,7 +283,7 @@ class Tree(ttk.Treeview):
         self.on_select = on_select
         self.on_tooltip = on_tooltip
         self.id = None
-        self.window = None
+        self.tip = None
         self.hover_row = -1
         self.selected = -1
         self.selectable = selectable
@@ -221,32 +293,42 @@ class Tree(ttk.Treeview):
             self.group_id = group.ids
             group.ids += 1
 
+        self.cells = [("", "")] * rows
+
         for i in range(rows):
             self.insert("", tk.END, i)
     
+    def set_cell(self, row: int, text: str, tags: str = ""):
+        if self.cells[row] != (text, tags):
+            self.cells[row] = (text, tags)
+            
+            if row == self.selected:
+                self.item(row, text=text)
+            else:
+                self.item(row, text=text, tags=tags)
+    
     def cancel(self, _=None):
-        if self.window is not None:
-            self.window.destroy()
-            self.window = None
+        hide_tooltip(self)
         
         if self.id is not None:
             self.after_cancel(self.id)
             self.id = None
             self.hover_row = -1
     
+    @perf.timed("ui.motion")
     def motion(self, event: TkEvent):
         row = stoi(self.identify_row(event.y))
         
         if row != self.hover_row:
             self.cancel()
             self.hover_row = row
-            self.widget = self.on_tooltip(row)
+            self.tip = self.on_tooltip(row)
             
-            if self.widget is not None:
+            if self.tip is not None:
                 self.id = self.after(400, self.tooltip)
     
     def tooltip(self):
-        self.window = create_tooltip(self, lambda window: self.widget.pack_widget(window))
+        TooltipWindow.get(self).show(self, self.tip)
     
     def click(self, event: TkEvent):
         if self.selectable:
@@ -262,129 +344,245 @@ class Tree(ttk.Treeview):
                     self.group.selected = self
                 
                 if row != -1:
-                    self.selected_tags = self.item(row)["tags"]
                     self.item(row, tags="selected")
                     self.on_select(row)
     
     def deselect(self, _=None):
         if self.selected != -1:
-            self.item(self.selected, tags=self.selected_tags)
+            self.item(self.selected, tags=self.cells[self.selected][1])
             self.selected = -1
 
-class ViewTime:
-    time: datetime
-    
-    def __init__(self):
-        self.time = datetime.now()
-        self.time -= timedelta(hours=self.time.hour, minutes=self.time.minute, seconds=self.time.second, microseconds=self.time.microsecond)
+ROW_HEIGHT = 20
 
-def calendar():
-    def check_conflict(time: datetime, quarters: int):
-        for _ in range(quarters):
-            if time in time_map:
-                return True
+class CanvasView(tk.Canvas):
+    regions: list['CanvasTree']
+    buttons: list['CanvasButton']
+    pending: list[Any]
+    tip: Tip
+    
+    def __init__(self, master, width, height, **kwargs):
+        super().__init__(master, width=width, height=height, highlightthickness=0, **kwargs)
+        self.bind('<Motion>', self.motion)
+        self.bind('<Button-1>', self.click)
+        self.bind('<Leave>', self.cancel)
+        self.regions = []
+        self.buttons = []
+        self.pending = []
+        self.hover = None
+        self.id = None
+        self.tip = None
+        
+        if not self.tk.call('info', 'commands', '::canvas_configure'):
+            self.tk.eval("proc ::canvas_configure {canvas changes} { foreach {item options} $changes { $canvas itemconfigure $item {*}$options } }")
+    
+    def queue(self, item: int, *options):
+        if not self.pending:
+            self.after_idle(self.flush)
+        
+        self.pending.append(item)
+        self.pending.append(options)
+    
+    def flush(self):
+        if self.pending:
+            self.tk.call('::canvas_configure', self._w, tuple(self.pending))
+            self.pending.clear()
+    
+    def hit(self, x: int, y: int) -> tuple['CanvasTree', int]:
+        for region in self.regions:
+            if region.visible and region.x <= x < region.x + region.width and region.y <= y < region.y + region.rows * ROW_HEIGHT:
+                return region, (y - region.y) // ROW_HEIGHT
+        
+        return None, -1
+    
+    def cancel(self, _=None):
+        hide_tooltip(self)
+        
+        if self.id is not None:
+            self.after_cancel(self.id)
+            self.id = None
+            self.hover = None
+    
+    @perf.timed("ui.motion")
+    def motion(self, event: TkEvent):
+        hover = self.hit(event.x, event.y)
+        
+        if hover != self.hover:
+            self.cancel()
+            self.hover = hover
+            region, row = hover
+            self.tip = None if region is None else region.on_tooltip(row)
             
-            time += timedelta(minutes=15)
+            if self.tip is not None:
+                self.id = self.after(400, self.tooltip)
+    
+    def tooltip(self):
+        TooltipWindow.get(self).show(self, self.tip)
+    
+    def click(self, event: TkEvent):
+        for button in self.buttons:
+            if button.visible and button.x <= event.x < button.x + button.width and button.y <= event.y < button.y + button.height:
+                if button.command is not None:
+                    button.command()
+                
+                return
         
-        return False
+        region, row = self.hit(event.x, event.y)
+        
+        if region is not None:
+            region.click(row)
 
-    class Event:
-        start: datetime
-        hours: int
-        minutes: int
-        name: str
-        description: str
-        priority: int
-        
-        def __init__(self, start, hours, minutes, name, description, priority):
-            self.start = start
-            self.hours = hours
-            self.minutes = minutes
-            self.name = name
-            self.description = description
-            self.priority = priority
-        
-        def quarters(self) -> int:
-            return self.hours * 4 + self.minutes
-        
-        def update(self, hours, minutes, name, description, priority):
-            q = self.quarters()
-            r = hours * 4 + minutes
-            
-            if r == 0:
-                self.remove()
-            else:
-                t = self.start + timedelta(minutes=15 * q)
-                
-                if q > r:
-                    for _ in range(q - r):
-                        t -= timedelta(minutes=15)
-                        time_map.pop(t)
-                elif q < r:
-                    if check_conflict(t, r - q) and not ask_conflict():
-                        return
-                    
-                    event_id = time_map[self.start]
-                    
-                    for _ in range(r - q):
-                        e = time_map.get(t)
-                        
-                        if e is not None:
-                            schedule[e].remove()
-                        
-                        time_map[t] = event_id
-                        t += timedelta(minutes=15)
-                
-                self.hours = hours
-                self.minutes = minutes
-                self.name = name
-                self.description = description
-                self.priority = priority
+class CanvasButton:
+    visible: bool
+    
+    def __init__(self, canvas: CanvasView, x, y, width, height, text="", command=None):
+        self.canvas = canvas
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.command = command
+        self.visible = True
+        self.rect = canvas.create_rectangle(x, y, x + width - 1, y + height - 1, fill='#EEEEEE', outline='#AAAAAA')
+        self.text = canvas.create_text(x + width // 2, y + height // 2, text=text, justify=tk.CENTER, font='TkDefaultFont')
+        canvas.buttons.append(self)
+    
+    def configure(self, text):
+        self.canvas.queue(self.text, '-text', text)
+    
+    def grid(self):
+        if not self.visible:
+            self.visible = True
+            self.canvas.queue(self.rect, '-state', tk.NORMAL)
+            self.canvas.queue(self.text, '-state', tk.NORMAL)
+    
+    def grid_remove(self):
+        if self.visible:
+            self.visible = False
+            self.canvas.queue(self.rect, '-state', tk.HIDDEN)
+            self.canvas.queue(self.text, '-state', tk.HIDDEN)
+
+class CanvasTree:
+    cells: list[tuple[str, str]]
+    colors: dict[str, str]
+    selected: int
+    selectable: bool
+    visible: bool
+    group: TreeGroup
+    group_id: int
+    
+    def __init__(self, canvas: CanvasView, x, y, rows, width, group: TreeGroup = None, on_select=lambda _:None, on_tooltip=lambda _:None, selectable=True):
+        self.canvas = canvas
+        self.x = x
+        self.y = y
+        self.rows = rows
+        self.width = width
+        self.on_select = on_select
+        self.on_tooltip = on_tooltip
+        self.selected = -1
+        self.selectable = selectable
+        self.visible = True
+        self.group = group
+        self.cells = [("", "")] * rows
+        self.colors = {}
+        
+        if group is not None:
+            self.group_id = group.ids
+            group.ids += 1
         
-        def remove(self):
-            t = self.start
-            e = time_map[t]
+        self.backgrounds = [canvas.create_rectangle(x, y + i * ROW_HEIGHT, x + width - 1, y + (i + 1) * ROW_HEIGHT - 1, fill='white', outline='#DDDDDD') for i in range(rows)]
+        self.texts = [canvas.create_text(x + 4, y + i * ROW_HEIGHT + ROW_HEIGHT // 2, anchor=tk.W, text="", font='TkDefaultFont') for i in range(rows)]
+        canvas.regions.append(self)
+    
+    def tag_configure(self, tag: str, foreground: str):
+        self.colors[tag] = foreground
+    
+    def set_cell(self, row: int, text: str, tags: str = ""):
+        if self.cells[row] != (text, tags):
+            self.cells[row] = (text, tags)
             
-            for _ in range(self.quarters()):
-                time_map.pop(t)
-                t += timedelta(minutes=15)
+            if row == self.selected:
+                self.canvas.queue(self.texts[row], '-text', text)
+            else:
+                self.canvas.queue(self.texts[row], '-text', text, '-fill', self.colors.get(tags, 'black'))
+    
+    def highlight(self, row: int, selected: bool):
+        self.canvas.queue(self.backgrounds[row], '-fill', 'dark cyan' if selected else 'white')
+        self.canvas.queue(self.texts[row], '-fill', 'white' if selected else self.colors.get(self.cells[row][1], 'black'))
+    
+    def click(self, row: int):
+        if self.selectable and self.selected != row:
+            self.deselect()
+            self.selected = row
             
-            schedule.pop(e)
-        
-        def color(self):
-            return PRIORITIES[min(self.priority, len(PRIORITIES) - 1)]
+            if self.group is not None and self.group.selected is not self:
+                if self.group.selected is not None:
+                    self.group.selected.deselect()
+                self.group.selected = self
+            
+            if row != -1:
+                self.highlight(row, True)
+                self.on_select(row)
+    
+    def deselect(self, _=None):
+        if self.selected != -1:
+            self.highlight(self.selected, False)
+            self.selected = -1
+    
+    def grid(self):
+        if not self.visible:
+            self.visible = True
+            
+            for item in self.backgrounds + self.texts:
+                self.canvas.queue(item, '-state', tk.NORMAL)
+    
+    def grid_remove(self):
+        if self.visible:
+            self.visible = False
+            
+            for item in self.backgrounds + self.texts:
+                self.canvas.queue(item, '-state', tk.HIDDEN)
+
+class CanvasCell:
+    def __init__(self, *parts):
+        self.parts = parts
+    
+    def __iter__(self):
+        return iter(self.parts)
+    
+    def grid(self):
+        for part in self.parts:
+            part.grid()
+    
+    def grid_remove(self):
+        for part in self.parts:
+            part.grid_remove()
 
+class ViewTime:
+    time: datetime
+    
+    def __init__(self):
+        self.time = datetime.now()
+        self.time -= timedelta(hours=self.time.hour, minutes=self.time.minute, seconds=self.time.second, microseconds=self.time.microsecond)
 
+def calendar():
     class Timetable(ttk.Frame):
+        headings: list[tk.Widget]
         slots: list[Tree]
         selected: int
 
         def __init__(self, master=None, headings: list[TkWidget] = [], on_select=lambda:None, on_tooltip=lambda s, r:None, group: TreeGroup = None, **kwargs):
             super().__init__(master)
 
-            frame = ttk.Frame(self)
-            frame.pack()
-
-            self.hours = Tree(frame, 24, 120, selectable=False)
-            self.hours.grid(column=0, row=1)
-
-            for (i, heading) in enumerate(headings):
-                heading.grid_widget(frame, row=0, column=i + 1, **kwargs)
-            
             self.slots = []
             self.selected = -1
             self.on_select = on_select
             self.on_tooltip = on_tooltip
-
-            for i in range(len(headings)):
-                slot = Tree(frame, 24, 120, group=group, on_select=lambda _:self.on_select(), on_tooltip=lambda r, i=i: self.on_tooltip(i, r))
-                
+            
+            self.build(headings, group, **kwargs)
+            
+            for slot in self.slots:
                 for p in PRIORITIES:
                     slot.tag_configure(p, foreground=p)
-                
-                slot.grid(column=i + 1, row=1)
-
-                self.slots.append(slot)
 
             HFrame(self, [
                 TkWidget(Selector, text="24 Hours", command=self.time_mode, value=False, variable=time_mode_var, selected=not time_mode_var.get()),
@@ -393,38 +591,51 @@ def calendar():
 
             self.time_mode(time_mode_var.get())
         
+        def build(self, headings: list[TkWidget], group: TreeGroup, **kwargs):
+            frame = ttk.Frame(self)
+            frame.pack()
+
+            self.hours = Tree(frame, 24, 120, selectable=False)
+            self.hours.grid(column=0, row=1)
+
+            self.headings = [heading.grid_widget(frame, row=0, column=i + 1, **kwargs) for i, heading in enumerate(headings)]
+
+            for i in range(len(headings)):
+                slot = Tree(frame, 24, 120, group=group, on_select=lambda _:self.on_select(), on_tooltip=lambda r, i=i: self.on_tooltip(i, r))
+                slot.grid(column=i + 1, row=1)
+                self.slots.append(slot)
+        
         def time_mode(self, mode):
             for h in range(24):
                 i = (h - 12) if h >= 12 else h
                 if i == 0:
                     i = 12
                 
-                self.hours.item(h, text=f"{i:02}:00 {'p' if h >= 12 else 'a'}.m." if mode else f"{h:02}:00")
+                self.hours.set_cell(h, f"{i:02}:00 {'p' if h >= 12 else 'a'}.m." if mode else f"{h:02}:00")
         
         def set_event(self, slot: int, index, event: Event):
-            self.slots[slot].item(index, text=event.name, tags=event.color())
-
-    def add_event(time: datetime, hours: int, minutes: int, name: str, description: str, priority: int):
-        if check_conflict(time, hours * 4 + minutes) and not ask_conflict():
-            return False
-
-        event_id = epoch()
-        schedule[event_id] = Event(time, hours, minutes, name, description, priority)
+            if event is None:
+                self.slots[slot].set_cell(index, "")
+            else:
+                self.slots[slot].set_cell(index, event.name, event.color())
 
-        for _ in range(hours * 4 + minutes):
-            e = time_map.get(time)
+    class CanvasTimetable(Timetable):
+        def build(self, headings: list[TkWidget], group: TreeGroup, **kwargs):
+            heading_height = 2 * ROW_HEIGHT
+            canvas = CanvasView(self, width=120 * (len(headings) + 1), height=heading_height + 24 * ROW_HEIGHT)
+            canvas.pack()
             
-            if e is not None:
-                schedule[e].remove()
-
-            time_map[time] = event_id
-            time += timedelta(minutes=15)
-        
-        return True
-
-    def event_tooltip(e: Event) -> TkWidget:
-        if e is None: return None
-        
+            self.hours = CanvasTree(canvas, 0, heading_height, 24, 120, selectable=False)
+            self.headings = [CanvasButton(canvas, 120 * (i + 1), 0, 120, heading_height, heading.kwargs.get("text", ""), heading.kwargs.get("command")) for i, heading in enumerate(headings)]
+            
+            for i in range(len(headings)):
+                self.slots.append(CanvasTree(canvas, 120 * (i + 1), heading_height, 24, 120, group=group, on_select=lambda _:self.on_select(), on_tooltip=lambda r, i=i: self.on_tooltip(i, r)))
+    
+    def event_tooltip(e: Event) -> Tip:
+        return None if e is None else event_tip(e, store.version)
+    
+    @lru_cache(maxsize=4096)
+    def event_tip(e: Event, version: int) -> Tip:
         if e.hours == 0:
             duration = f"{int(e.minutes) * 15} minutes"
         elif e.minutes == 0:
@@ -432,322 +643,997 @@ def calendar():
         else:
             duration = f"{e.hours} hours {int(e.minutes) * 15} minutes"
         
-        return TkWidget(
-            VFrame, widgets=[
-                TkWidget(ttk.Label, relief=tk.SOLID, background='white', text=e.name, foreground=e.color()),
-                None if e.description == "" or str.isspace(e.description) else TkWidget(ttk.Label, relief=tk.SOLID, background='white', text=e.description),
-                TkWidget(ttk.Label, relief=tk.SOLID, background='white', text=e.start.strftime("%H:%M")),
-                TkWidget(ttk.Label, relief=tk.SOLID, background='white', text=duration),
-            ], pack_all={"fill": tk.X}, style='Tooltip.TFrame', relief=tk.SOLID, padding=1
-        )
-
-    def update_view(mode = None, time=None):
-        for c in list(calendar_frame.children.keys()):
-            calendar_frame.children[c].destroy()
-
-        if mode is None:
-            mode = view_mode.get()
-
-        if time is not None:
-            view_time.time = time
-
-        match mode:
-            case "Daily":
-                time_label.configure(text=format_date(view_time.time))
-                daily.select()
-                reset.configure(text="Today")
-
-                event_var = tk.StringVar()
-                duration_hour = tk.StringVar(value='0')
-                duration_minutes = tk.StringVar(value='00')
-                priority_var = tk.StringVar(value='0')
-                visible = tk.BooleanVar()
-                group = TreeGroup()
-
-                def get_time(slot=-1, row=-1):
-                    if slot == -1:
-                        slot = group.selected.group_id
-                    
-                    if row == -1:
-                        row = group.selected.selected
-                    
-                    return view_time.time + timedelta(hours=row, minutes=[0, 15, 30, 45][slot])
+        return tuple(line for line in (
+            (e.name, e.color()),
+            None if e.description == "" or str.isspace(e.description) else (e.description, 'black'),
+            (e.start.strftime("%H:%M"), 'black'),
+            (duration, 'black'),
+            None if not isinstance(e, Occurrence) else (f"Repeats {e.frequency}", 'black'),
+        ) if line is not None)
+
+    class DailyView(ttk.Frame):
+        fill = tk.X
+        timetable: Timetable
+        label: ttk.Label
+        description: ScrolledText
+        button: ttk.Button
+        remove: ttk.Button
+        
+        def __init__(self, master=None):
+            super().__init__(master)
+            
+            self.event_var = tk.StringVar()
+            self.duration_hour = tk.StringVar(value='0')
+            self.duration_minutes = tk.StringVar(value='00')
+            self.priority_var = tk.StringVar(value='0')
+            self.repeat_var = tk.StringVar(value="Never")
+            self.until_var = tk.StringVar()
+            self.count_var = tk.StringVar()
+            self.weekday_vars = [tk.BooleanVar() for _ in WEEKDAYS]
+            self.visible = False
+            self.group = TreeGroup()
+            
+            self.timetable, self.frame = HFrame(self, [
+                TkWidget(TIMETABLE, headings=[TkWidget(ttk.Label, text=[":00 - :15", ":15 - :30", ":30 - :45", ":45 - :00"][i]) for i in range(4)], on_select=self.on_select, on_tooltip=self.on_tooltip, group=self.group),
+                TkWidget(VFrame, widgets=[
+                    TkWidget(ttk.Label),
+                    TkWidget(GridFrame, widgets=[
+                        [
+                            TkWidget(ttk.Label, text="Event:", pack={"sticky": tk.W, "padx": 10}),
+                            TkWidget(ttk.Entry, textvariable=self.event_var, pack={"sticky": tk.NSEW}),
+                        ],
+                        [
+                            TkWidget(ttk.Label, text="Description:", pack={"sticky": tk.W, "padx": 10}),
+                            TkWidget(ScrolledText, height=3, width=45),
+                        ],
+                        [
+                            TkWidget(ttk.Label, text="Duration:", pack={"sticky": tk.W, "padx": 10}),
+                            TkWidget(HFrame, widgets=[
+                                TkWidget(ttk.Spinbox, from_=0, to_=float('inf'), justify=tk.RIGHT, textvariable=self.duration_hour, validate=tk.ALL, validatecommand=(int_only, '%P')),
+                                TkWidget(ttk.Label, text="hours", pack={"padx": 10}),
+                                TkWidget(ttk.OptionMenu, self.duration_minutes, "00", "00", "15", "30", "45"),
+                                TkWidget(ttk.Label, text="minutes", pack={"padx": 10}),
+                            ], pack={"sticky": tk.W}),
+                        ],
+                        [
+                            TkWidget(ttk.Label, text="Priority:", pack={"sticky": tk.W, "padx": 10}),
+                            TkWidget(ttk.Spinbox, from_=0, to_=float('inf'), textvariable=self.priority_var, validate=tk.ALL, validatecommand=(int_only, '%P'), pack={"sticky": tk.NSEW}),
+                        ],
+                        [
+                            TkWidget(ttk.Label, text="Repeat:", pack={"sticky": tk.W, "padx": 10}),
+                            TkWidget(HFrame, widgets=[
+                                TkWidget(ttk.OptionMenu, self.repeat_var, "Never", "Never", *(f.capitalize() for f in FREQUENCIES)),
+                                TkWidget(ttk.Label, text="until", pack={"padx": 10}),
+                                TkWidget(ttk.Entry, textvariable=self.until_var, width=10),
+                                TkWidget(ttk.Label, text="or", pack={"padx": 10}),
+                                TkWidget(ttk.Spinbox, from_=0, to_=float('inf'), width=5, textvariable=self.count_var, validate=tk.ALL, validatecommand=(int_only, '%P')),
+                                TkWidget(ttk.Label, text="times", pack={"padx": 10}),
+                            ], pack={"sticky": tk.W}),
+                        ],
+                        [
+                            TkWidget(ttk.Label, text="Weekly on:", pack={"sticky": tk.W, "padx": 10}),
+                            TkWidget(HFrame, widgets=[
+                                TkWidget(ttk.Checkbutton, text=WEEKDAYS[d][:3], variable=self.weekday_vars[d])
+                            for d in range(7)], pack={"sticky": tk.W}),
+                        ],
+                    ]),
+                    TkWidget(HFrame, widgets=[
+                        TkWidget(ttk.Button, command=self.event_command),
+                        TkWidget(ttk.Button, text="Remove", command=self.remove_event),
+                    ]),
+                ]),
+            ], last_left=False).pack(fill=tk.X)
+            
+            (
+                self.label,
+                (
+                    (_, _),
+                    (_, self.description),
+                    (_, _),
+                    (p_label, _),
+                    (_, _),
+                    (_, _),
+                ),
+                (self.button, self.remove),
+            ) = self.frame
+            
+            tooltip(p_label, tuple((f"Priority {p}", color) for p, color in enumerate(PRIORITIES)))
+            
+            self.frame.pack_forget()
+        
+        def get_time(self, slot=-1, row=-1):
+            if slot == -1:
+                slot = self.group.selected.group_id
+            
+            if row == -1:
+                row = self.group.selected.selected
+            
+            return view_time.time + timedelta(hours=row, minutes=[0, 15, 30, 45][slot])
+        
+        def event_command(self):
+            if self.group.selected is not None:
+                n = self.event_var.get()
                 
-                def event_command():
-                    if group.selected is not None:
-                        n = event_var.get()
-                        
-                        if n == "" or str.isspace(n):
-                            messagebox.showerror("Invalid name", "Please enter a valid name that contains more than just whitespaces")
+                if n == "" or str.isspace(n):
+                    messagebox.showerror("Invalid name", "Please enter a valid name that contains more than just whitespaces")
+                    return
+                
+                h = stoi(self.duration_hour.get())
+                m = int(self.duration_minutes.get()) // 15
+                
+                if h == 0 and m == 0:
+                    messagebox.showerror("Invalid time", "Please enter time more than zero")
+                    return
+                
+                repeat = self.get_repeat()
+                
+                if repeat is None:
+                    return
+                
+                time = self.get_time()
+                d = self.description.get("1.0", tk.END)
+                p = stoi(self.priority_var.get())
+                e = store.event_at(time)
+                
+                if isinstance(e, Occurrence):
+                    if repeat[0] is None:
+                        if store.add(e.start, h, m, n, d, p, lambda c: c == [e] or ask_conflict()) is None:
                             return
+                    else:
+                        frequency, interval, *rest = repeat
+                        rule = store.rules[e.rule]
                         
-                        h = stoi(duration_hour.get())
-                        m = int(duration_minutes.get()) // 15
+                        if frequency == rule.frequency:
+                            interval = rule.interval
                         
-                        if h == 0 and m == 0:
-                            messagebox.showerror("Invalid time", "Please enter time more than zero")
+                        if not store.update_rule(e.rule, h, m, n, d, p, frequency, interval, *rest, on_conflict=lambda _: ask_conflict()):
                             return
-                        
-                        time = get_time()
-                        d = description.get("1.0", tk.END)
-                        p = stoi(priority_var.get())
-                        e = time_map.get(time)
-                        
-                        if e is not None:
-                            e = schedule[e]
-                            q = e.quarters()
-                            e.update(h, m, n, d, p)
-                            
-                            if e.quarters() != q:
-                                update_view()
-                        elif add_event(time, h, m, n, d, p):
+                    
+                    update_view()
+                elif e is not None:
+                    event_id = store.at(time)
+                    q = e.quarters()
+                    
+                    if repeat[0] is not None:
+                        if store.add_rule(e.start, h, m, n, d, p, *repeat, on_conflict=lambda c: c == [event_id] or ask_conflict()) is not None:
                             update_view()
+                    elif store.update(event_id, h, m, n, d, p, lambda _: ask_conflict()) and e.quarters() != q:
+                        update_view()
+                    else:
+                        self.fill_cells()
+                elif repeat[0] is not None:
+                    if store.add_rule(time, h, m, n, d, p, *repeat, on_conflict=lambda _: ask_conflict()) is not None:
+                        update_view()
+                elif store.add(time, h, m, n, d, p, lambda _: ask_conflict()) is not None:
+                    update_view()
+        
+        def get_repeat(self) -> tuple[str, int, tuple[int, ...], datetime, int]:
+            if self.repeat_var.get() == "Never":
+                return (None,)
+            
+            until = self.until_var.get().strip()
+            
+            try:
+                until = None if until == "" else datetime.fromisoformat(until) + timedelta(days=1)
+            except ValueError:
+                messagebox.showerror("Invalid date", "Please enter the last date as YYYY-MM-DD or leave it empty")
+                return None
+            
+            return self.repeat_var.get().lower(), 1, tuple(d for d, v in enumerate(self.weekday_vars) if v.get()), until, stoi(self.count_var.get()) or None
+        
+        def remove_event(self):
+            if self.group.selected is not None:
+                time = self.get_time()
+                e = store.event_at(time)
                 
-                def remove_event():
-                    if group.selected is not None:
-                        e = time_map.get(get_time())
-                        
-                        if e is not None:
-                            schedule[e].remove()
-                            update_view()
+                if isinstance(e, Occurrence):
+                    answer = messagebox.askyesnocancel("Remove recurring event", "Remove every occurrence of this event?\nChoose No to remove only this one.")
+                    
+                    if answer is None:
+                        return
+                    
+                    if answer:
+                        store.remove_rule(e.rule)
+                    else:
+                        store.exclude([e])
+                    
+                    update_view()
+                elif e is not None:
+                    store.remove(store.at(time))
+                    update_view()
+        
+        def show_form(self, visible: bool):
+            if visible != self.visible:
+                if visible:
+                    self.frame.pack()
+                else:
+                    self.frame.pack_forget()
                 
-                def on_select():
-                    if group.selected is not None and group.selected.selected != -1:
-                        if not visible.get():
-                            frame.pack()
-                            visible.set(True)
-                        
-                        e = time_map.get(get_time())
-                        description.delete("1.0", tk.END)
-                        
-                        if e is not None:
-                            e = schedule[e]
-                            label.configure(text="Event details")
-                            button.configure(text="Update")
-                            event_var.set(e.name)
-                            description.insert(tk.END, e.description)
-                            duration_hour.set(str(e.hours))
-                            duration_minutes.set(str(e.minutes * 15) if e.minutes != 0 else "00")
-                            priority_var.set(str(e.priority))
-                            remove.pack()
-                        else:
-                            label.configure(text="Add new event")
-                            button.configure(text="Add event")
-                            event_var.set("")
-                            duration_hour.set('0')
-                            duration_minutes.set('00')
-                            priority_var.set('0')
-                            remove.pack_forget()
-                    elif visible.get():
-                        frame.pack_forget()
-                        visible.set(False)
+                self.visible = visible
+        
+        def on_select(self):
+            if self.group.selected is not None and self.group.selected.selected != -1:
+                self.show_form(True)
                 
-                def on_tooltip(slot: int, row: int) -> TkWidget:
-                    time = get_time(slot, row)
-                    e = time_map.get(time)
-                    return event_tooltip(e if e is None else schedule[e])
+                e = store.event_at(self.get_time())
+                self.description.delete("1.0", tk.END)
                 
-                timetable: Timetable
-                timetable, frame = HFrame(calendar_frame, [
-                    TkWidget(Timetable, headings=[TkWidget(ttk.Label, text=[":00 - :15", ":15 - :30", ":30 - :45", ":45 - :00"][i]) for i in range(4)], on_select=on_select, on_tooltip=on_tooltip, group=group),
-                    TkWidget(VFrame, widgets=[
-                        TkWidget(ttk.Label),
-                        TkWidget(GridFrame, widgets=[
-                            [
-                                TkWidget(ttk.Label, text="Event:", pack={"sticky": tk.W, "padx": 10}),
-                                TkWidget(ttk.Entry, textvariable=event_var, pack={"sticky": tk.NSEW}),
-                            ],
-                            [
-                                TkWidget(ttk.Label, text="Description:", pack={"sticky": tk.W, "padx": 10}),
-                                TkWidget(ScrolledText, height=3, width=45),
-                            ],
-                            [
-                                TkWidget(ttk.Label, text="Duration:", pack={"sticky": tk.W, "padx": 10}),
-                                TkWidget(HFrame, widgets=[
-                                    TkWidget(ttk.Spinbox, from_=0, to_=float('inf'), justify=tk.RIGHT, textvariable=duration_hour, validate=tk.ALL, validatecommand=(int_only, '%P')),
-                                    TkWidget(ttk.Label, text="hours", pack={"padx": 10}),
-                                    TkWidget(ttk.OptionMenu, duration_minutes, "00", "00", "15", "30", "45"),
-                                    TkWidget(ttk.Label, text="minutes", pack={"padx": 10}),
-                                ], pack={"sticky": tk.W}),
-                            ],
-                            [
-                                TkWidget(ttk.Label, text="Priority:", pack={"sticky": tk.W, "padx": 10}),
-                                TkWidget(ttk.Spinbox, from_=0, to_=float('inf'), textvariable=priority_var, validate=tk.ALL, validatecommand=(int_only, '%P'), pack={"sticky": tk.NSEW}),
-                            ],
-                        ]),
-                        TkWidget(HFrame, widgets=[
-                            TkWidget(ttk.Button, command=event_command),
-                            TkWidget(ttk.Button, text="Remove", command=remove_event),
-                        ]),
-                    ]),
-                ], last_left=False).pack(fill=tk.X)
+                if e is not None:
+                    self.label.configure(text="Event details")
+                    self.button.configure(text="Update")
+                    self.event_var.set(e.name)
+                    self.description.insert(tk.END, e.description)
+                    self.duration_hour.set(str(e.hours))
+                    self.duration_minutes.set(str(e.minutes * 15) if e.minutes != 0 else "00")
+                    self.priority_var.set(str(e.priority))
+                    self.show_repeat(store.rules[e.rule] if isinstance(e, Occurrence) else None)
+                    self.remove.pack()
+                else:
+                    self.label.configure(text="Add new event")
+                    self.button.configure(text="Add event")
+                    self.event_var.set("")
+                    self.duration_hour.set('0')
+                    self.duration_minutes.set('00')
+                    self.priority_var.set('0')
+                    self.show_repeat(None)
+                    self.remove.pack_forget()
+            else:
+                self.show_form(False)
+        
+        def show_repeat(self, rule):
+            self.repeat_var.set("Never" if rule is None else rule.frequency.capitalize())
+            self.until_var.set("" if rule is None or rule.until is None else (rule.until - timedelta(days=1)).date().isoformat())
+            self.count_var.set("" if rule is None or rule.count is None else str(rule.count))
+            
+            for d, v in enumerate(self.weekday_vars):
+                v.set(rule is not None and rule.frequency == 'weekly' and d in rule.weekdays)
+        
+        def on_tooltip(self, slot: int, row: int) -> TkWidget:
+            return event_tooltip(store.event_at(self.get_time(slot, row)))
+        
+        def span(self) -> tuple[datetime, datetime]:
+            return view_time.time, view_time.time + timedelta(days=1)
+        
+        def refresh(self):
+            time_label.configure(text=format_date(view_time.time))
+            daily.select()
+            reset.configure(text="Today")
+            
+            self.group.clear()
+            self.show_form(False)
+            self.timetable.time_mode(time_mode_var.get())
+            self.fill_cells()
+        
+        def fill_cells(self):
+            for q, e in enumerate(prefetcher.cells("Daily", view_time.time)):
+                self.timetable.set_event(q % 4, q // 4, e)
+    
+    class WeeklyView(ttk.Frame):
+        fill = tk.NONE
+        start: datetime
+        timetable: Timetable
+        
+        def __init__(self, master=None):
+            super().__init__(master)
+            
+            self.start = None
+            self.group = TreeGroup()
+            self.timetable, _ = HFrame(self, [
+                TkWidget(TIMETABLE, headings=[TkWidget(tk.Button, justify="center", command=lambda d=d: update_view("Daily", self.start + timedelta(days=d))) for d in range(7)], on_tooltip=lambda slot, row: event_tooltip(self.get_event(self.start + timedelta(days=slot, hours=row))), group=self.group, sticky=tk.NSEW),
+                TkWidget(HFrame),
+            ], last_left=False).pack()
+        
+        def get_event(self, time: datetime) -> Event:
+            e = store.hour_rollup.winner(time)
+            e = None if e is None else store[e]
+            
+            for o in store.occurrences(self.start, self.start + timedelta(days=7)):
+                if o.start < time + timedelta(hours=1) and o.end() > time and (e is None or (o.priority, o.start) > (e.priority, e.start)):
+                    e = o
+            
+            return e
+        
+        def span(self) -> tuple[datetime, datetime]:
+            return self.start, self.start + timedelta(days=7)
+        
+        def refresh(self):
+            (s, e) = get_week(view_time.time)
+            time_label.configure(text=f"{format_date(s)} - {format_date(e)}")
+            weekly.select()
+            reset.configure(text="This Week")
+            
+            if s != self.start:
+                self.start = s
                 
-                label: ttk.Label
-                description: ScrolledText
-                button: ttk.Button
-                remove: ttk.Button
+                for d, heading in enumerate(self.timetable.headings):
+                    day = s + timedelta(days=d)
+                    heading.configure(text=f"{WEEKDAYS[d]}\n{day.year}-{day.month}-{day.day}")
+            
+            self.group.clear()
+            self.timetable.time_mode(time_mode_var.get())
+            
+            for d, column in enumerate(prefetcher.cells("Weekly", s)):
+                for h, e in enumerate(column):
+                    self.timetable.set_event(d, h, e)
+    
+    class MonthlyView(ttk.Frame):
+        fill = tk.NONE
+        first: datetime
+        cells: list[tuple[ttk.Frame | CanvasCell, ttk.Button | CanvasButton, Tree | CanvasTree]]
+        visible: list[bool]
+        labels: list[str]
+        events: list[list[Event]]
+        weeks: list[ttk.Button | CanvasButton]
+        
+        def __init__(self, master=None):
+            super().__init__(master)
+            
+            self.first = None
+            self.group = TreeGroup()
+            self.cells = []
+            
+            if RENDERER == "canvas":
+                self.build_canvas()
+            else:
+                self.build_widgets()
+            
+            for i, (_, _, tree) in enumerate(self.cells):
+                for p in PRIORITIES:
+                    tree.tag_configure(p, foreground=p)
                 
-                (
-                    label,
-                    (
-                        (_, _),
-                        (_, description),
-                        (_, _),
-                        (p_label, _),
-                    ),
-                    (button, remove),
-                ) = frame
+                tree.on_tooltip = lambda row, i=i: event_tooltip(self.events[i][row] if row < len(self.events[i]) else None)
+            
+            self.visible = [True] * len(self.cells)
+            self.labels = [""] * len(self.cells)
+            self.events = [[] for _ in self.cells]
+        
+        def open_day(self, i: int):
+            update_view("Daily", self.first + timedelta(days=i - self.first.weekday()))
+        
+        def open_week(self, w: int):
+            update_view("Weekly", self.first + timedelta(weeks=w))
+        
+        def span(self) -> tuple[datetime, datetime]:
+            return self.first, get_first_day_of_month(self.first + timedelta(days=31))
+        
+        def build_widgets(self):
+            for d, wd in enumerate(WEEKDAYS):
+                ttk.Label(self, text=wd).grid(row=0, column=d)
+                self.grid_columnconfigure(d, weight=1, uniform="frame")
+            
+            for i in range(6 * 7):
+                cell = VFrame(self, widgets=[
+                    TkWidget(ttk.Button, command=lambda i=i: self.open_day(i)),
+                    TkWidget(Tree, 3, 50, group=self.group),
+                ], pack_all={"fill": tk.X}).grid(sticky=tk.NSEW, padx=1, column=i % 7, row=i // 7 + 1)
+                button, tree = cell
+                self.cells.append((cell, button, tree))
+            
+            self.weeks = [ttk.Button(self, text="View week", command=lambda w=w: self.open_week(w)) for w in range(6)]
+            
+            for w, button in enumerate(self.weeks):
+                button.grid(sticky=tk.NSEW, row=w + 1, column=7)
+        
+        def build_canvas(self):
+            width = 150
+            height = 4 * ROW_HEIGHT + 4
+            canvas = CanvasView(self, width=width * 7 + 100, height=ROW_HEIGHT + 6 * height)
+            canvas.pack()
+            
+            for d, wd in enumerate(WEEKDAYS):
+                canvas.create_text(d * width + width // 2, ROW_HEIGHT // 2, text=wd, font='TkDefaultFont')
+            
+            for i in range(6 * 7):
+                x = i % 7 * width
+                y = ROW_HEIGHT + i // 7 * height
+                button = CanvasButton(canvas, x + 1, y, width - 2, ROW_HEIGHT, command=lambda i=i: self.open_day(i))
+                tree = CanvasTree(canvas, x + 1, y + ROW_HEIGHT, 3, width - 2, group=self.group)
+                self.cells.append((CanvasCell(button, tree), button, tree))
+            
+            self.weeks = [CanvasButton(canvas, width * 7, ROW_HEIGHT + w * height, 100, height - 4, "View week", lambda w=w: self.open_week(w)) for w in range(6)]
+        
+        def refresh(self):
+            monthly.select()
+            reset.configure(text="This Month")
+            
+            s = get_first_day_of_month(view_time.time)
+            days = prefetcher.cells("Monthly", s)
+            
+            self.first = s
+            self.group.clear()
+            offset = s.weekday()
+            week = (offset + len(days) + 6) // 7
+            
+            for i, (cell, button, tree) in enumerate(self.cells):
+                visible = offset <= i < offset + len(days)
                 
-                tooltip(p_label, TkWidget(VFrame, style='Tooltip.TFrame', relief=tk.SOLID, widgets=[
-                    TkWidget(ttk.Label, foreground=color, background='white', text=f"Priority {p}", pack={"fill": tk.X, "padx": 5, "pady": 3})
-                for p, color in enumerate(PRIORITIES)]))
+                if visible != self.visible[i]:
+                    if visible:
+                        cell.grid()
+                    else:
+                        cell.grid_remove()
+                    
+                    self.visible[i] = visible
                 
-                frame.pack_forget()
+                if not visible:
+                    continue
                 
-                for hour in range(24):
-                    for minute in range(4):
-                        time = view_time.time + timedelta(hours=hour, minutes=minute * 15)
-                        e = time_map.get(time)
-
-                        if e is not None:
-                            timetable.set_event(minute, hour, schedule[e])
-            case "Weekly":
-                (s, e) = get_week(view_time.time)
-                time_label.configure(text=f"{format_date(s)} - {format_date(e)}")
-                weekly.select()
-                reset.configure(text="This Week")
-
-                def heading(d):
-                    day = s + timedelta(days=d)
-                    return TkWidget(tk.Button, justify="center", text=f"{WEEKDAYS[d]}\n{day.year}-{day.month}-{day.day}", command=lambda d=day:update_view("Daily", d))
+                day, es, more = days[i - offset]
+                self.events[i] = es
+                label = f"{day.day}  (+{more} more)" if more else str(day.day)
                 
-                def get_event(time: datetime) -> Event:
-                    e = None
-                    
-                    for _ in range(4):
-                        q = time_map.get(time)
-                        
-                        if q is not None:
-                            q = schedule[q]
-                            
-                            if e is None or e.priority <= q.priority:
-                                e = q
-                        
-                        time += timedelta(minutes=15)
-                    
-                    return e
+                if self.labels[i] != label:
+                    self.labels[i] = label
+                    button.configure(text=label)
                 
-                group = TreeGroup()
-                timetable, _ = HFrame(calendar_frame, [
-                    TkWidget(Timetable, headings=[heading(d) for d in range(7)], on_tooltip=lambda slot, row: event_tooltip(get_event(s + timedelta(days=slot, hours=row))), group=group, sticky=tk.NSEW),
-                    TkWidget(HFrame),
-                ], last_left=False).pack()
+                for row in range(3):
+                    if row < len(es):
+                        tree.set_cell(row, es[row].name, es[row].color())
+                    else:
+                        tree.set_cell(row, "")
+            
+            for w, button in enumerate(self.weeks):
+                if w < week:
+                    button.grid()
+                else:
+                    button.grid_remove()
+            
+            time_label.configure(text=f"{format_date(s)} - {format_date(s + timedelta(weeks=week) - timedelta(days=1))}")
+    
+    class YearlyView(ttk.Frame):
+        fill = tk.NONE
+        size = 14
+        first: datetime
+        canvas: CanvasView
+        slots: list[list[int]]
+        days: dict[int, tuple[datetime, int, int]]
+        
+        def __init__(self, master=None):
+            super().__init__(master)
+            
+            self.first = None
+            self.days = {}
+            self.id = None
+            step = self.size + 2
+            width = 7 * step + 24
+            height = 2 * ROW_HEIGHT + 6 * step + 12
+            self.canvas = CanvasView(self, width=4 * width, height=3 * height)
+            self.canvas.pack()
+            self.slots = []
+            
+            for m in range(12):
+                x = m % 4 * width
+                y = m // 4 * height
+                self.canvas.create_text(x + 7 * step // 2, y + ROW_HEIGHT // 2, text=datetime(2000, m + 1, 1).strftime("%B"), font='TkDefaultFont')
                 
-                t = s
+                for d, wd in enumerate(WEEKDAYS):
+                    self.canvas.create_text(x + d * step + step // 2, y + ROW_HEIGHT + ROW_HEIGHT // 2, text=wd[0], font='TkSmallCaptionFont')
                 
-                for d in range(7):
-                    for h in range(24):
-                        e = get_event(t)
-                        
-                        if e is not None:
-                            timetable.set_event(d, h, e)
-                        
-                        t += timedelta(hours=1)
-            case "Monthly":
-                monthly.select()
-                reset.configure(text="This Month")
-
-                s = get_first_day_of_month(view_time.time)
-                day = s
-                month = s.month
-                week = 1
-                group = TreeGroup()
-                frame = ttk.Frame(calendar_frame)
-                frame.pack()
+                self.slots.append([self.canvas.create_rectangle(x + i % 7 * step, y + 2 * ROW_HEIGHT + i // 7 * step, x + i % 7 * step + self.size, y + 2 * ROW_HEIGHT + i // 7 * step + self.size, tags="day", state=tk.HIDDEN) for i in range(6 * 7)])
+            
+            self.canvas.tag_bind("day", "<Button-1>", self.open_day)
+            self.canvas.tag_bind("day", "<Enter>", self.enter)
+            self.canvas.tag_bind("day", "<Leave>", self.cancel)
+        
+        def span(self) -> tuple[datetime, datetime]:
+            return self.first, self.first.replace(year=self.first.year + 1)
+        
+        def current(self) -> tuple[datetime, int, int]:
+            items = self.canvas.find_withtag(tk.CURRENT)
+            return self.days.get(items[0]) if items else None
+        
+        def open_day(self, _: TkEvent):
+            cell = self.current()
+            
+            if cell is not None:
+                update_view("Daily", cell[0])
+        
+        def cancel(self, _=None):
+            hide_tooltip(self)
+            
+            if self.id is not None:
+                self.after_cancel(self.id)
+                self.id = None
+        
+        def enter(self, _: TkEvent):
+            self.cancel()
+            cell = self.current()
+            
+            if cell is not None:
+                day, minutes, priority = cell
+                tip = ((format_date(day), 'black'), (f"{minutes // 60}h {minutes % 60:02}m scheduled", 'black'))
                 
-                for d, wd in enumerate(WEEKDAYS):
-                    ttk.Label(frame, text=wd).grid(row=0, column=d)
-                    frame.grid_columnconfigure(d, weight=1, uniform="frame")
+                if priority >= 0:
+                    tip += ((f"Highest priority {priority}", PRIORITIES[min(priority, len(PRIORITIES) - 1)]),)
                 
-                while True:
-                    time = day
-                    es: set[Event] = set()
-                    
-                    for _ in range(24 * 4):
-                        e = time_map.get(time)
-                        
-                        if e is not None:
-                            es.add(schedule[e])
-                        
-                        time += timedelta(minutes=15)
-                    
-                    es = sorted(es, key=lambda e: (e.priority, e.start))
-                    es = es[-3:]
-                    
-                    tree: Tree
-                    _, tree = VFrame(frame, widgets=[
-                        TkWidget(ttk.Button, text=day.day, command=lambda d=day:update_view("Daily", d)),
-                        TkWidget(Tree, 3, 50, group=group),
-                    ], pack_all={"fill": tk.X}).grid(sticky=tk.NSEW, padx=1, column=day.weekday(), row=week)
-                    
-                    for p in PRIORITIES:
-                        tree.tag_configure(p, foreground=p)
-                    
-                    for i, e in enumerate(es):
-                        tree.item(i, text=e.name, tags=e.color())
-                    
-                    tree.on_tooltip = lambda row, es=es: event_tooltip(es[row] if row < len(es) else None)
-                    
-                    day += timedelta(days=1)
-
-                    if day.month != month:
-                        break
-
-                    if day.weekday() == 0:
-                        week += 1
+                self.id = self.after(400, lambda: TooltipWindow.get(self).show(self, tip))
+        
+        def refresh(self):
+            yearly.select()
+            reset.configure(text="This Year")
+            
+            s = get_first_day_of_year(view_time.time)
+            cells = prefetcher.cells("Yearly", s)
+            
+            self.first = s
+            self.days.clear()
+            shown = set()
+            
+            for cell in cells:
+                day, minutes, priority = cell
+                item = self.slots[day.month - 1][get_first_day_of_month(day).weekday() + day.day - 1]
+                self.days[item] = cell
+                shown.add(item)
+                self.canvas.queue(item, '-state', tk.NORMAL, *heat(minutes, priority))
+            
+            for month in self.slots:
+                for item in month:
+                    if item not in shown:
+                        self.canvas.queue(item, '-state', tk.HIDDEN)
+            
+            time_label.configure(text=str(s.year))
+    
+    class AgendaView(ttk.Frame):
+        fill = tk.BOTH
+        rows = 30
+        top: AgendaKey
+        time: datetime
+        events: list[Event]
+        tree: Tree
+        scrollbar: ttk.Scrollbar
+        
+        def __init__(self, master=None):
+            super().__init__(master)
+            
+            self.top = None
+            self.time = None
+            self.events = []
+            self.tree = Tree(self, self.rows, 700, on_select=self.on_select, on_tooltip=lambda row: event_tooltip(self.events[row] if row < len(self.events) else None))
+            self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.on_scroll)
+            self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+            self.scrollbar.pack(side=tk.LEFT, fill=tk.Y)
+            self.tree.bind("<MouseWheel>", lambda e: self.scroll(-3 if e.delta > 0 else 3))
+            self.tree.bind("<Button-4>", lambda _: self.scroll(-3))
+            self.tree.bind("<Button-5>", lambda _: self.scroll(3))
+            
+            for p in PRIORITIES:
+                self.tree.tag_configure(p, foreground=p)
+        
+        def span(self) -> tuple[datetime, datetime]:
+            if self.events:
+                return self.events[0].start, max(e.end() for e in self.events)
+            
+            return view_time.time, view_time.time + timedelta(days=1)
+        
+        def move(self, top: AgendaKey):
+            self.top = top
+            view_time.time = top[0].replace(hour=0, minute=0, second=0, microsecond=0)
+            self.time = view_time.time
+            navigate()
+        
+        def scroll(self, n: int):
+            if n > 0:
+                keys = [k for k, _ in islice(store.agenda(self.top), n + 1)]
                 
-                day = s
+                if len(keys) > 1:
+                    self.move(keys[min(n, len(keys) - 1)])
+            else:
+                keys = [k for k, _ in islice(store.agenda(self.top, reverse=True), -n)]
                 
-                for w in range(week):
-                    ttk.Button(frame, text="View week", command=lambda w=day:update_view("Weekly", w)).grid(sticky=tk.NSEW, row=w + 1, column=7)
-                    day += timedelta(weeks=1)
+                if keys:
+                    self.move(keys[-1])
+        
+        def on_scroll(self, command: str, value: str, unit: str = None):
+            if command == "scroll":
+                self.scroll(int(value) * (self.rows if unit == "pages" else 1))
+            elif (bounds := store.bounds()) is not None:
+                lo, hi = bounds
+                self.move((lo + (hi - lo) * min(1.0, max(0.0, float(value))), 0))
+        
+        def on_select(self, row: int):
+            if row < len(self.events):
+                update_view("Daily", self.events[row].start.replace(hour=0, minute=0))
+        
+        def refresh(self):
+            agenda.select()
+            reset.configure(text="Today")
+            
+            if self.time != view_time.time:
+                self.time = view_time.time
+                self.top = (view_time.time, 0)
+            
+            self.tree.deselect()
+            self.events = [e for _, e in islice(store.agenda(self.top), self.rows)]
+            
+            for row in range(self.rows):
+                if row < len(self.events):
+                    e = self.events[row]
+                    self.tree.set_cell(row, f"{e.start:%a %d %b %Y   %H:%M} - {e.end():%H:%M}   {e.name}", e.color())
+                else:
+                    self.tree.set_cell(row, "")
+            
+            bounds = store.bounds()
+            
+            if bounds is None or not self.events or bounds[1] <= bounds[0]:
+                self.scrollbar.set(0, 1)
+            else:
+                lo, hi = bounds
+                self.scrollbar.set(max(0.0, (self.events[0].start - lo) / (hi - lo)), min(1.0, (self.events[-1].end() - lo) / (hi - lo)))
+            
+            time_label.configure(text=format_date(self.events[0].start) if self.events else "No more events")
+    
+    class ConflictPanel(tk.Toplevel):
+        tree: ttk.Treeview
+        overlaps: list[Overlap]
+        
+        def __init__(self, master=None):
+            super().__init__(master)
+            
+            self.title("Conflicts")
+            self.overlaps = []
+            self.tree = ttk.Treeview(self, columns=("time", "first", "second"), show="headings", height=15)
+            
+            for column, text, width in (("time", "Overlap", 240), ("first", "Event", 200), ("second", "Conflicts with", 200)):
+                self.tree.heading(column, text=text)
+                self.tree.column(column, width=width)
+            
+            scrollbar = ttk.Scrollbar(self, command=self.tree.yview)
+            self.tree.configure(yscrollcommand=scrollbar.set)
+            self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+            scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+            self.tree.bind("<Double-1>", self.open)
+            self.protocol("WM_DELETE_WINDOW", self.withdraw)
+        
+        def open(self, _: TkEvent):
+            selection = self.tree.selection()
+            
+            if selection:
+                start = self.overlaps[int(selection[0])][2]
+                update_view("Daily", start.replace(hour=0, minute=0))
+        
+        def refresh(self, overlaps: list[Overlap]):
+            self.overlaps = overlaps
+            self.tree.delete(*self.tree.get_children())
+            
+            for i, (a, b, start, end) in enumerate(overlaps):
+                self.tree.insert("", tk.END, iid=str(i), values=(f"{start:%Y-%m-%d %H:%M} - {end:%H:%M}" if end.date() == start.date() else f"{start:%Y-%m-%d %H:%M} - {end:%Y-%m-%d %H:%M}", a.name, b.name))
+    
+    class AnalyticsPanel(tk.Toplevel):
+        width = 480
+        height = 120
+        summary: ttk.Label
+        chart: tk.Canvas
+        tree: ttk.Treeview
+        weeks: list[datetime]
+        
+        def __init__(self, master=None):
+            super().__init__(master)
+            
+            self.weeks = []
+            self.summary = ttk.Label(self, justify=tk.LEFT)
+            self.summary.pack(anchor=tk.W, padx=10, pady=10)
+            self.chart = tk.Canvas(self, width=self.width, height=self.height + ROW_HEIGHT, highlightthickness=0)
+            self.chart.pack(padx=10)
+            columns = ("week", *(str(p) for p in range(len(PRIORITIES))), "total", "booked")
+            self.tree = ttk.Treeview(self, columns=columns, show="headings", height=15)
+            
+            for column in columns:
+                self.tree.heading(column, text=column.capitalize())
+                self.tree.column(column, width=100 if column == "week" else 50, anchor=tk.W if column == "week" else tk.E)
+            
+            scrollbar = ttk.Scrollbar(self, command=self.tree.yview)
+            self.tree.configure(yscrollcommand=scrollbar.set)
+            self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(10, 0), pady=10)
+            scrollbar.pack(side=tk.RIGHT, fill=tk.Y, pady=10)
+            self.tree.bind("<Double-1>", self.open)
+            self.protocol("WM_DELETE_WINDOW", self.withdraw)
+        
+        def open(self, _: TkEvent):
+            selection = self.tree.selection()
+            
+            if selection:
+                update_view("Weekly", self.weeks[int(selection[0])])
+        
+        def refresh(self, start: datetime, end: datetime):
+            r = analytics.report(store, start, end)
+            weekday, hour = r["busiest_slot"]
+            self.title(f"Analytics {start.year}")
+            self.summary.configure(text="\n".join((
+                f"{r['events']} events, {r['hours'].sum():.1f} hours booked, {r['utilization']:.1%} of the year",
+                f"Busiest hour of day: {r['busiest_hour']:02}:00",
+                f"Busiest hour of week: {WEEKDAYS[weekday]} {hour:02}:00",
+            )))
+            
+            by_hour = r["hour_of_week"].sum(axis=0)
+            peak = max(by_hour.max(), 1e-9)
+            step = self.width // 24
+            self.chart.delete(tk.ALL)
+            
+            for h, hours in enumerate(by_hour):
+                top = self.height - int(hours / peak * (self.height - 4))
+                self.chart.create_rectangle(h * step + 2, top, h * step + step - 2, self.height, fill=PRIORITIES[2] if h == r["busiest_hour"] else '#AAAAAA', outline="")
                 
-                time_label.configure(text=f"{format_date(s)} - {format_date(day - timedelta(days=1))}")
-
-    time_map: dict[datetime, float] = {}
-    schedule: dict[float, Event] = {}
-    
-    try:
-        with open('calendar.json') as f:
-            d = json.load(f)
-            iso_map = d["map"]
-            events = d["events"]
-            
-            for iso, e in iso_map.items():
-                time_map[datetime.fromisoformat(iso)] = e
-            
-            for event_id, e in events.items():
-                schedule[float(event_id)] = Event(
-                    datetime.fromisoformat(e["start"]),
-                    e["hours"],
-                    e["minutes"],
-                    e["name"],
-                    e["description"],
-                    e["priority"],
-                )
-    except FileNotFoundError:
-        pass
+                if h % 3 == 0:
+                    self.chart.create_text(h * step + step // 2, self.height + ROW_HEIGHT // 2, text=f"{h:02}", font='TkSmallCaptionFont')
+            
+            self.weeks = r["weeks"]
+            self.tree.delete(*self.tree.get_children())
+            
+            for w, week in enumerate(self.weeks):
+                hours = r["hours"][:, w]
+                self.tree.insert("", tk.END, iid=str(w), values=(f"{week:%Y-%m-%d}", *(f"{h:.1f}" if h else "" for h in hours), f"{hours.sum():.1f}", f"{r['weekly_utilization'][w]:.0%}"))
+    
+    class FreeTimeDialog(tk.Toplevel):
+        tree: ttk.Treeview
+        slots: list[tuple[datetime, datetime]]
+        
+        def __init__(self, master=None):
+            super().__init__(master)
+            
+            self.title("Find free time")
+            self.slots = []
+            self.duration_hour = tk.StringVar(value='1')
+            self.duration_minutes = tk.StringVar(value='00')
+            self.from_var = tk.StringVar()
+            self.to_var = tk.StringVar()
+            self.work_start = tk.StringVar(value="09:00")
+            self.work_end = tk.StringVar(value="17:00")
+            self.priority_var = tk.StringVar(value='0')
+            self.count_var = tk.StringVar(value='10')
+            
+            GridFrame(self, widgets=[
+                [
+                    TkWidget(ttk.Label, text="Duration:", pack={"sticky": tk.W, "padx": 10}),
+                    TkWidget(HFrame, widgets=[
+                        TkWidget(ttk.Spinbox, from_=0, to_=float('inf'), width=5, justify=tk.RIGHT, textvariable=self.duration_hour, validate=tk.ALL, validatecommand=(int_only, '%P')),
+                        TkWidget(ttk.Label, text="hours", pack={"padx": 10}),
+                        TkWidget(ttk.OptionMenu, self.duration_minutes, "00", "00", "15", "30", "45"),
+                        TkWidget(ttk.Label, text="minutes", pack={"padx": 10}),
+                    ], pack={"sticky": tk.W}),
+                ],
+                [
+                    TkWidget(ttk.Label, text="Between:", pack={"sticky": tk.W, "padx": 10}),
+                    TkWidget(HFrame, widgets=[
+                        TkWidget(ttk.Entry, textvariable=self.from_var, width=10),
+                        TkWidget(ttk.Label, text="and", pack={"padx": 10}),
+                        TkWidget(ttk.Entry, textvariable=self.to_var, width=10),
+                    ], pack={"sticky": tk.W}),
+                ],
+                [
+                    TkWidget(ttk.Label, text="Working hours:", pack={"sticky": tk.W, "padx": 10}),
+                    TkWidget(HFrame, widgets=[
+                        TkWidget(ttk.Entry, textvariable=self.work_start, width=6),
+                        TkWidget(ttk.Label, text="to", pack={"padx": 10}),
+                        TkWidget(ttk.Entry, textvariable=self.work_end, width=6),
+                    ], pack={"sticky": tk.W}),
+                ],
+                [
+                    TkWidget(ttk.Label, text="Busy from priority:", pack={"sticky": tk.W, "padx": 10}),
+                    TkWidget(ttk.Spinbox, from_=0, to_=len(PRIORITIES) - 1, width=5, textvariable=self.priority_var, validate=tk.ALL, validatecommand=(int_only, '%P'), pack={"sticky": tk.W}),
+                ],
+                [
+                    TkWidget(ttk.Label, text="Results:", pack={"sticky": tk.W, "padx": 10}),
+                    TkWidget(ttk.Spinbox, from_=1, to_=float('inf'), width=5, textvariable=self.count_var, validate=tk.ALL, validatecommand=(int_only, '%P'), pack={"sticky": tk.W}),
+                ],
+            ]).pack(padx=10, pady=10)
+            
+            ttk.Button(self, text="Search", command=self.search).pack()
+            self.tree = ttk.Treeview(self, columns=("day", "time", "length"), show="headings", height=10)
+            
+            for column, text, width in (("day", "Day", 220), ("time", "Free", 160), ("length", "Length", 100)):
+                self.tree.heading(column, text=text)
+                self.tree.column(column, width=width)
+            
+            self.tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+            self.tree.bind("<Double-1>", self.open)
+            self.protocol("WM_DELETE_WINDOW", self.withdraw)
+        
+        def reset(self, start: datetime, end: datetime):
+            self.from_var.set(start.date().isoformat())
+            self.to_var.set((end - timedelta(days=1)).date().isoformat())
+        
+        def search(self):
+            duration = timedelta(hours=stoi(self.duration_hour.get()), minutes=int(self.duration_minutes.get()))
+            
+            if duration <= timedelta(0):
+                messagebox.showerror("Invalid time", "Please enter time more than zero", parent=self)
+                return
+            
+            try:
+                start = datetime.fromisoformat(self.from_var.get().strip())
+                end = datetime.fromisoformat(self.to_var.get().strip()) + timedelta(days=1)
+            except ValueError:
+                messagebox.showerror("Invalid date", "Please enter the dates as YYYY-MM-DD", parent=self)
+                return
+            
+            try:
+                hours = None if self.work_start.get().strip() == "" and self.work_end.get().strip() == "" else (parse_clock(self.work_start.get()), parse_clock(self.work_end.get()))
+            except ValueError:
+                messagebox.showerror("Invalid time", "Please enter working hours as HH:MM or leave both empty", parent=self)
+                return
+            
+            self.slots = store.free_slots(duration, start, end, hours, stoi(self.priority_var.get()), max(1, stoi(self.count_var.get(), 10)))
+            self.tree.delete(*self.tree.get_children())
+            
+            for i, (s, e) in enumerate(self.slots):
+                length = (e - s) // timedelta(minutes=15)
+                self.tree.insert("", tk.END, iid=str(i), values=(format_date(s), f"{s:%H:%M} - {e:%H:%M}" if e - s < timedelta(days=1) else f"{s:%H:%M} - {format_date(e)} {e:%H:%M}", f"{length // 4}h {length % 4 * 15:02}m"))
+        
+        def open(self, _: TkEvent):
+            selection = self.tree.selection()
+            
+            if selection:
+                update_view("Daily", self.slots[int(selection[0])][0].replace(hour=0, minute=0))
+    
+    class SearchResults(tk.Toplevel):
+        entry: ttk.Entry
+        listbox: tk.Listbox
+        events: list[Event]
+        
+        def __init__(self, master, entry: ttk.Entry):
+            super().__init__(master)
+            
+            self.overrideredirect(True)
+            self.withdraw()
+            self.entry = entry
+            self.events = []
+            self.listbox = tk.Listbox(self, width=70, height=12, activestyle=tk.NONE)
+            self.listbox.pack(fill=tk.BOTH, expand=True)
+            self.listbox.bind("<ButtonRelease-1>", self.open)
+            self.listbox.bind("<Return>", self.open)
+            self.listbox.bind("<Escape>", lambda _: self.withdraw())
+        
+        def show(self, events: list[Event]):
+            self.events = events
+            self.listbox.delete(0, tk.END)
+            
+            for e in events:
+                self.listbox.insert(tk.END, f"{e.start:%Y-%m-%d %H:%M}  {e.name}")
+                self.listbox.itemconfigure(tk.END, foreground=e.color())
+            
+            if events:
+                self.geometry(f"+{self.entry.winfo_rootx()}+{self.entry.winfo_rooty() + self.entry.winfo_height()}")
+                self.deiconify()
+                self.lift()
+            else:
+                self.withdraw()
+        
+        def select_first(self, _: TkEvent):
+            if self.events:
+                self.listbox.focus_set()
+                self.listbox.selection_set(0)
+        
+        def open(self, _: TkEvent):
+            selection = self.listbox.curselection()
+            
+            if selection:
+                self.withdraw()
+                update_view("Daily", self.events[selection[0]].start.replace(hour=0, minute=0))
+    
+    TIMETABLE = CanvasTimetable if RENDERER == "canvas" else Timetable
+    VIEWS = {"Daily": DailyView, "Weekly": WeeklyView, "Monthly": MonthlyView, "Yearly": YearlyView, "Agenda": AgendaView}
+
+    @perf.timed("ui.update_view")
+    def update_view(mode = None, time=None):
+        if mode is None:
+            mode = view_mode.get()
+
+        if time is not None:
+            view_time.time = time
+        
+        view = views.get(mode)
+        
+        if view is None:
+            view = views[mode] = VIEWS[mode](calendar_frame)
+        
+        for v in views.values():
+            if v is not view:
+                v.pack_forget()
+        
+        view.pack(fill=view.fill)
+        view.refresh()
+        store.pin(*view.span())
+        
+        if panel is not None and panel.winfo_viewable():
+            refresh_conflicts()
+        else:
+            conflicts.configure(text="Conflicts")
+        
+        if reports is not None and reports.winfo_viewable():
+            reports.refresh(*analytics_span())
+        
+        prefetcher.prefetch(mode, period_start(mode, view_time.time))
+
+    def show_conflicts():
+        nonlocal panel
+        
+        if panel is None:
+            panel = ConflictPanel(window)
+        else:
+            panel.deiconify()
+        
+        refresh_conflicts()
+
+    def refresh_conflicts():
+        overlaps = current_overlaps(*views[view_mode.get()].span(), store.version)
+        conflicts.configure(text=f"Conflicts ({len(overlaps)})")
+        panel.refresh(overlaps)
+
+    @lru_cache(maxsize=8)
+    def current_overlaps(start: datetime, end: datetime, version: int) -> list[Overlap]:
+        return store.overlaps(start, end)
+
+    def on_search():
+        query = search_var.get()
+        results.show(store.search(query, view_time.time) if query.strip() else [])
+
+    def show_analytics():
+        global analytics
+        nonlocal reports
+        
+        if analytics is None:
+            try:
+                import analytics
+            except ImportError:
+                messagebox.showerror("Analytics unavailable", "Analytics needs NumPy, install it with pip install numpy")
+                return
+        
+        if reports is None:
+            reports = AnalyticsPanel(window)
+        else:
+            reports.deiconify()
+        
+        reports.refresh(*analytics_span())
+
+    def analytics_span() -> tuple[datetime, datetime]:
+        first = get_first_day_of_year(view_time.time)
+        return first, first.replace(year=first.year + 1)
+
+    def show_free_time():
+        nonlocal finder
+        
+        if finder is None:
+            finder = FreeTimeDialog(window)
+        else:
+            finder.deiconify()
+        
+        finder.reset(*views[view_mode.get()].span())
+
+    store = CalendarStore(SqliteStore() if os.environ.get("CALENDAR_STORAGE") == "sqlite" else Journal())
+    prefetcher = Prefetcher(store, event_tooltip)
+    views: dict[str, ttk.Frame] = {}
+    panel: ConflictPanel = None
+    finder: FreeTimeDialog = None
+    reports: AnalyticsPanel = None
 
     window = tk.Tk()
     window.minsize(1400, 900)
     window.title("Calendar")
 
     int_only = window.register(lambda s:s == "" or str.isdigit(s))
+    search_var = tk.StringVar()
 
     view_time = ViewTime()
     view_mode = tk.StringVar()
     time_mode_var = tk.BooleanVar()
 
+    pending_view = None
+
+    def navigate():
+        nonlocal pending_view
+
+        if pending_view is None:
+            pending_view = window.after_idle(render_pending)
+
+    def render_pending():
+        nonlocal pending_view
+        pending_view = None
+        update_view()
+
+    def arrow(event: TkEvent, step):
+        if not isinstance(event.widget, (tk.Entry, ttk.Entry, tk.Text)):
+            step()
+
     def time_prev():
         old = view_time.time
 
@@ -760,9 +1646,13 @@ def calendar():
                 view_time.time = get_first_day_of_month(view_time.time)
                 view_time.time -= timedelta(days=1)
                 view_time.time = get_first_day_of_month(view_time.time)
+            case "Yearly":
+                view_time.time = view_time.time.replace(year=view_time.time.year - 1, month=1, day=1)
+            case "Agenda":
+                views["Agenda"].scroll(-AgendaView.rows)
         
         if old != view_time.time:
-            update_view()
+            navigate()
 
     def time_next():
         old = view_time.time
@@ -777,9 +1667,13 @@ def calendar():
 
                 while view_time.time.month == month:
                     view_time.time += timedelta(days=1)
+            case "Yearly":
+                view_time.time = view_time.time.replace(year=view_time.time.year + 1, month=1, day=1)
+            case "Agenda":
+                views["Agenda"].scroll(AgendaView.rows)
         
         if old != view_time.time:
-            update_view()
+            navigate()
 
     def reset_time():
         view_time.time = datetime.now()
@@ -792,6 +1686,8 @@ def calendar():
             TkWidget(Selector, text="Daily", variable=view_mode, command=update_view, selected=True),
             TkWidget(Selector, text="Weekly", variable=view_mode, command=update_view),
             TkWidget(Selector, text="Monthly", variable=view_mode, command=update_view),
+            TkWidget(Selector, text="Yearly", variable=view_mode, command=update_view),
+            TkWidget(Selector, text="Agenda", variable=view_mode, command=update_view),
         ], pack_all={"fill": tk.X, "expand": True}, pack={"fill": tk.X}),
         TkWidget(VFrame, widgets=[
             TkWidget(VFrame, widgets=[
@@ -800,6 +1696,13 @@ def calendar():
                 TkWidget(ttk.Label, pack={"expand": True, "padx": 10}),
             ], pack={"pady": 10}),
             TkWidget(tk.Button, relief=tk.SOLID, command=reset_time),
+            TkWidget(HFrame, widgets=[
+                TkWidget(tk.Button, relief=tk.SOLID, command=show_conflicts),
+                TkWidget(tk.Button, relief=tk.SOLID, text="Find free time", command=show_free_time, pack={"padx": 5}),
+                TkWidget(tk.Button, relief=tk.SOLID, text="Analytics", command=show_analytics),
+                TkWidget(ttk.Label, text="Search:", pack={"padx": 5}),
+                TkWidget(ttk.Entry, textvariable=search_var, width=30),
+            ]),
         ], pack={"fill": tk.X}),
         TkWidget(VFrame, pack={"fill": tk.BOTH, "expand": True}),
     ], pack_all={"pady": 10}).pack(fill=tk.BOTH, expand=True)
@@ -807,39 +1710,109 @@ def calendar():
     daily: Selector
     weekly: Selector
     monthly: Selector
+    yearly: Selector
+    agenda: Selector
     time_frame: ttk.Frame
     time_label: ttk.Label
     reset: tk.Button
+    conflicts: tk.Button
+    tools: ttk.Frame
     calendar_frame: ttk.Frame
     (
         _,
-        (daily, weekly, monthly),
-        (time_frame, reset),
+        (daily, weekly, monthly, yearly, agenda),
+        (time_frame, reset, tools),
         calendar_frame,
     ) = root_frame
     _, _, time_label = time_frame
+    conflicts, _, _, _, search_entry = tools
+    results = SearchResults(window, search_entry)
+    search_var.trace_add("write", lambda *_: on_search())
+    search_entry.bind("<Down>", results.select_first)
+    search_entry.bind("<Escape>", lambda _: results.withdraw())
 
     update_view("Daily")
+    loader = Loader(store, *views["Daily"].span())
+    loader.start()
 
     style = ttk.Style()
     style.configure('Tooltip.TFrame', background='white')
 
-    window.after(200, lambda: reset.place(anchor=tk.E, relx=1, rely=0.5, height=time_frame.winfo_height()))
-    window.mainloop()
-    
-    iso_map = {}
-    events = {}
+    def load():
+        try:
+            covered = loader.poll()
+        except Exception as e:
+            messagebox.showerror("Could not load calendar", f"{type(e).__name__}: {e}")
+            window.destroy()
+            return
+        
+        if covered is not None:
+            start, end = views[view_mode.get()].span()
+            
+            if covered[0] < end and start < covered[1]:
+                update_view()
+        
+        if store.loaded.is_set():
+            window.title("Calendar")
+        else:
+            window.title(f"Calendar (loading {loader.done * 100 // max(1, loader.total)}%)")
+            window.after(10, load)
     
-    for d, e in time_map.items():
-        iso_map[d.isoformat()] = e
+    saver = Autosaver(store)
+    saver.start()
+    warned = False
     
-    for event_id, e in schedule.items():
-        d = e.__dict__
-        d["start"] = d["start"].isoformat()
-        events[event_id] = d
+    def sync():
+        nonlocal warned
+        
+        if saver.error is None:
+            warned = False
+        elif not warned:
+            warned = True
+            messagebox.showwarning("Autosave failed", f"Your changes could not be saved and will be retried:\n{saver.error}")
+        
+        window.after(1000, sync)
+
+    window.after(200, lambda: reset.place(anchor=tk.E, relx=1, rely=0.5, height=time_frame.winfo_height()))
+    window.after(200, lambda: tools.place(anchor=tk.W, relx=0, rely=0.5, height=time_frame.winfo_height()))
+    if perf.enabled:
+        overlay = ttk.Label(window, font="TkFixedFont", background="white", relief=tk.SOLID, padding=5)
+        
+        def toggle_overlay(_: TkEvent):
+            if overlay.winfo_ismapped():
+                overlay.place_forget()
+            else:
+                overlay.configure(text=perf.report())
+                overlay.place(anchor=tk.SE, relx=1, rely=1)
+        
+        def refresh_overlay():
+            if overlay.winfo_ismapped():
+                overlay.configure(text=perf.report())
+            
+            window.after(500, refresh_overlay)
+        
+        window.bind("<F12>", toggle_overlay)
+        window.after(500, refresh_overlay)
+
+    window.bind("<Left>", lambda e: arrow(e, time_prev))
+    window.bind("<Right>", lambda e: arrow(e, time_next))
+    prefetcher.start()
+    window.after(10, load)
+    window.after(1000, sync)
+    window.mainloop()
+    prefetcher.stop()
+    saver.stop()
+    store.close()
     
-    with open('calendar.json', 'w') as f:
-        json.dump({"map": iso_map, "events": events}, f, indent=4)
+    if perf.enabled:
+        perf.dump()
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Calendar")
+    parser.add_argument('--profile', metavar='PATH', nargs='?', const=perf.PROFILE, help="time hot paths, press F12 for the overlay and write the results to PATH on exit (.prof for cProfile stats)")
+    args = parser.parse_args()
+    
+    if args.profile is not None:
+        perf.enable(args.profile)
+    
     calendar()
@@ -0,0 +1,1327 @@
+from datetime import datetime, timedelta
+from collections.abc import Callable, Iterable, Iterator
+from collections import OrderedDict
+from bisect import bisect_left, bisect_right, insort
+from functools import wraps
+from itertools import accumulate
+from storage import EPOCH, Journal, SqliteStore, Record, RuleRecord
+from perf import timed
+import threading
+import queue
+import heapq
+import time
+import re
+
+PRIORITIES = ['black', '#005500', '#00BB00', '#00FF00', '#77DD00', '#AADD00', '#DDDD00', '#FFBB00', '#FF9900', '#FF6600', '#FF0000']
+
+class IntervalIndex:
+    starts: list[datetime]
+    ends: list[datetime]
+    ids: list[int]
+
+    def __init__(self, intervals: Iterable[tuple[datetime, datetime, int]] = ()):
+        intervals = sorted(intervals)
+        self.starts = [s for s, _, _ in intervals]
+        self.ends = [e for _, e, _ in intervals]
+        self.ids = [i for _, _, i in intervals]
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+    
+    def __iter__(self) -> Iterator[tuple[datetime, datetime, int]]:
+        return zip(self.starts, self.ends, self.ids)
+    
+    def __contains__(self, time: datetime) -> bool:
+        return self.find(time) != -1
+    
+    def find(self, time: datetime) -> int:
+        i = bisect_right(self.starts, time) - 1
+        return i if i >= 0 and time < self.ends[i] else -1
+    
+    def get(self, time: datetime, default=None):
+        i = self.find(time)
+        return default if i == -1 else self.ids[i]
+    
+    def span(self, start: datetime, end: datetime) -> tuple[int, int]:
+        i = bisect_right(self.starts, start) - 1
+        
+        if i < 0 or self.ends[i] <= start:
+            i += 1
+        
+        return i, bisect_left(self.starts, end, lo=i)
+    
+    def overlapping(self, start: datetime, end: datetime) -> list[int]:
+        i, j = self.span(start, end)
+        return self.ids[i:j]
+    
+    def insert(self, start: datetime, end: datetime, event_id: int):
+        i = bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        self.ids.insert(i, event_id)
+    
+    def extend(self, intervals: Iterable[tuple[datetime, datetime, int]]):
+        intervals = sorted(intervals)
+        
+        if not intervals:
+            return
+        
+        i = bisect_right(self.starts, intervals[0][0])
+        
+        if i < len(self.starts) and self.starts[i] < intervals[-1][0]:
+            intervals = sorted([*self, *intervals])
+            i = 0
+            self.starts, self.ends, self.ids = [], [], []
+        
+        self.starts[i:i] = [s for s, _, _ in intervals]
+        self.ends[i:i] = [e for _, e, _ in intervals]
+        self.ids[i:i] = [event_id for _, _, event_id in intervals]
+    
+    def pop(self, start: datetime) -> int:
+        i = bisect_left(self.starts, start)
+        del self.starts[i]
+        del self.ends[i]
+        return self.ids.pop(i)
+
+class Rollup:
+    granularity: timedelta
+    buckets: dict[int, list[tuple[int, datetime, int]]]
+
+    def __init__(self, granularity: timedelta):
+        self.granularity = granularity
+        self.buckets = {}
+    
+    def bucket(self, time: datetime) -> int:
+        return (time - EPOCH) // self.granularity
+    
+    def spanned(self, start: datetime, end: datetime) -> range:
+        return range(self.bucket(start), -((EPOCH - end) // self.granularity))
+    
+    def add(self, start: datetime, end: datetime, priority: int, event_id: int):
+        for b in self.spanned(start, end):
+            insort(self.buckets.setdefault(b, []), (priority, start, event_id))
+    
+    def remove(self, start: datetime, end: datetime, priority: int, event_id: int):
+        for b in self.spanned(start, end):
+            es = self.buckets[b]
+            del es[bisect_left(es, (priority, start, event_id))]
+            
+            if not es:
+                del self.buckets[b]
+    
+    def top(self, time: datetime, n: int) -> tuple[list[int], int]:
+        es = self.buckets.get(self.bucket(time), [])
+        return [e for _, _, e in es[-n:]], max(0, len(es) - n)
+    
+    def winner(self, time: datetime) -> int:
+        es = self.buckets.get(self.bucket(time))
+        return None if es is None else es[-1][2]
+    
+    def count(self, time: datetime) -> int:
+        return len(self.buckets.get(self.bucket(time), ()))
+    
+    def entries(self, time: datetime) -> list[tuple[int, datetime, int]]:
+        return self.buckets.get(self.bucket(time), [])
+
+class DayLoad:
+    first: int
+    minutes: list[int]
+    prefix: list[int]
+    stale: int
+    
+    def __init__(self):
+        self.first = 0
+        self.minutes = []
+        self.prefix = [0]
+        self.stale = 0
+    
+    def day(self, time: datetime) -> int:
+        return (time - EPOCH) // timedelta(days=1)
+    
+    def grow(self, lo: int, hi: int):
+        if not self.minutes:
+            self.first = lo
+        elif lo < self.first:
+            self.minutes[0:0] = [0] * (self.first - lo)
+            self.first = lo
+            self.stale = 0
+        
+        if hi > self.first + len(self.minutes):
+            self.minutes += [0] * (hi - self.first - len(self.minutes))
+    
+    def apply(self, start: datetime, end: datetime, sign: int):
+        lo = self.day(start)
+        hi = -((EPOCH - end) // timedelta(days=1))
+        self.grow(lo, hi)
+        
+        for d in range(lo, hi):
+            day_end = EPOCH + timedelta(days=d + 1)
+            self.minutes[d - self.first] += sign * ((min(end, day_end) - start) // timedelta(minutes=1))
+            start = day_end
+        
+        self.stale = min(self.stale, lo - self.first)
+    
+    def add(self, start: datetime, end: datetime, priority: int, event_id: int):
+        self.apply(start, end, 1)
+    
+    def remove(self, start: datetime, end: datetime, priority: int, event_id: int):
+        self.apply(start, end, -1)
+    
+    def total(self, start: datetime, end: datetime) -> int:
+        if self.stale < len(self.minutes) or len(self.prefix) != len(self.minutes) + 1:
+            del self.prefix[self.stale + 1:]
+            self.prefix += accumulate(self.minutes[self.stale:], initial=self.prefix[self.stale])
+            del self.prefix[self.stale + 1]
+            self.stale = len(self.minutes)
+        
+        n = len(self.minutes)
+        i = min(n, max(0, self.day(start) - self.first))
+        j = min(n, max(0, -((EPOCH - end) // timedelta(days=1)) - self.first))
+        return self.prefix[j] - self.prefix[i] if i < j else 0
+
+class GapIndex:
+    size: int
+    blocks: list[list[tuple[datetime, datetime]]]
+    firsts: list[datetime]
+    reaches: list[datetime]
+    maxima: list[timedelta]
+    
+    def __init__(self, intervals: Iterable[tuple[datetime, datetime]] = (), size: int = 64):
+        intervals = sorted(intervals)
+        self.size = size
+        self.blocks = [intervals[i:i + size] for i in range(0, len(intervals), size)]
+        self.firsts = [b[0][0] for b in self.blocks]
+        self.reaches = [b[-1][1] for b in self.blocks]
+        self.maxima = [timedelta(0)] * len(self.blocks)
+        
+        for i in range(len(self.blocks)):
+            self.measure(i)
+    
+    def __len__(self) -> int:
+        return sum(map(len, self.blocks))
+    
+    def measure(self, i: int):
+        if 0 <= i < len(self.blocks):
+            b = self.blocks[i]
+            reach = b[0][1]
+            gaps = []
+            
+            for s, e in b[1:]:
+                gaps.append(s - reach)
+                reach = max(reach, e)
+            
+            if i + 1 < len(self.blocks):
+                gaps.append(self.firsts[i + 1] - reach)
+            
+            self.reaches[i] = reach
+            self.maxima[i] = max(gaps, default=timedelta(0))
+    
+    def add(self, start: datetime, end: datetime):
+        if not self.blocks:
+            self.blocks.append([(start, end)])
+            self.firsts.append(start)
+            self.reaches.append(end)
+            self.maxima.append(timedelta(0))
+            return
+        
+        i = max(0, bisect_right(self.firsts, start) - 1)
+        b = self.blocks[i]
+        insort(b, (start, end))
+        self.firsts[i] = b[0][0]
+        
+        if len(b) > 2 * self.size:
+            self.blocks.insert(i + 1, b[self.size:])
+            self.firsts.insert(i + 1, b[self.size][0])
+            self.reaches.insert(i + 1, end)
+            self.maxima.insert(i + 1, timedelta(0))
+            del b[self.size:]
+            self.measure(i + 1)
+        
+        self.measure(i)
+        self.measure(i - 1)
+    
+    def remove(self, start: datetime, end: datetime):
+        i = bisect_right(self.firsts, start) - 1
+        b = self.blocks[i]
+        b.remove((start, end))
+        
+        if b:
+            self.firsts[i] = b[0][0]
+            self.measure(i)
+        else:
+            del self.blocks[i], self.firsts[i], self.reaches[i], self.maxima[i]
+        
+        self.measure(i - 1)
+    
+    def free(self, start: datetime, end: datetime, duration: timedelta) -> Iterator[tuple[datetime, datetime]]:
+        if not self.blocks:
+            if end - start >= duration:
+                yield start, end
+            
+            return
+        
+        if self.firsts[0] > start and min(self.firsts[0], end) - start >= duration:
+            yield start, min(self.firsts[0], end)
+        
+        last = len(self.blocks) - 1
+        first = max(0, bisect_right(self.firsts, start) - 1)
+        reach = max(self.reaches[:first], default=datetime.min)
+        
+        for i in range(first, last + 1):
+            if self.firsts[i] >= end:
+                return
+            
+            if self.maxima[i] < duration and i != last:
+                reach = max(reach, self.reaches[i])
+                continue
+            
+            b = self.blocks[i]
+            
+            for k, (_, e) in enumerate(b):
+                reach = max(reach, e)
+                
+                if reach >= end:
+                    return
+                
+                if k + 1 < len(b):
+                    gap_end = b[k + 1][0]
+                elif i != last:
+                    gap_end = self.firsts[i + 1]
+                else:
+                    gap_end = end
+                
+                s, g = max(reach, start), min(gap_end, end)
+                
+                if g - s >= duration:
+                    yield s, g
+
+TOKEN = re.compile(r'\w+')
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN.findall(text.casefold())
+
+class SearchIndex:
+    postings: dict[str, set[int]]
+    tokens: list[str]
+    
+    def __init__(self):
+        self.postings = {}
+        self.tokens = []
+    
+    def add(self, key: int, text: str):
+        for token in set(tokenize(text)):
+            keys = self.postings.get(token)
+            
+            if keys is None:
+                keys = self.postings[token] = set()
+                insort(self.tokens, token)
+            
+            keys.add(key)
+    
+    def extend(self, items: Iterable[tuple[int, str]]):
+        tokens = []
+        
+        for key, text in items:
+            for token in set(tokenize(text)):
+                keys = self.postings.get(token)
+                
+                if keys is None:
+                    keys = self.postings[token] = set()
+                    tokens.append(token)
+                
+                keys.add(key)
+        
+        tokens.sort()
+        self.tokens += tokens
+        self.tokens.sort()
+    
+    def remove(self, key: int, text: str):
+        for token in set(tokenize(text)):
+            keys = self.postings[token]
+            keys.discard(key)
+            
+            if not keys:
+                del self.postings[token]
+                del self.tokens[bisect_left(self.tokens, token)]
+    
+    def prefixed(self, prefix: str) -> Iterator[str]:
+        for i in range(bisect_left(self.tokens, prefix), len(self.tokens)):
+            if not self.tokens[i].startswith(prefix):
+                return
+            
+            yield self.tokens[i]
+    
+    def search(self, query: str) -> set[int]:
+        terms = [[self.postings[t] for t in self.prefixed(term)] for term in set(tokenize(query))]
+        terms.sort(key=lambda postings: sum(map(len, postings)))
+        result = None
+        
+        for postings in terms:
+            if result is None:
+                result = set().union(*postings)
+            else:
+                result = {key for key in result if any(key in p for p in postings)}
+            
+            if not result:
+                break
+        
+        return set() if result is None else result
+
+def clamp_priority(priority: int) -> int:
+    return min(max(priority, 0), len(PRIORITIES) - 1)
+
+class Event:
+    __slots__ = ('start', 'hours', 'minutes', 'name', 'description', 'priority')
+    start: datetime
+    hours: int
+    minutes: int
+    name: str
+    description: str
+    priority: int
+    
+    def __init__(self, start, hours, minutes, name, description, priority):
+        self.start = start
+        self.hours = hours
+        self.minutes = minutes
+        self.name = name
+        self.description = description
+        self.priority = priority
+    
+    def quarters(self) -> int:
+        return self.hours * 4 + self.minutes
+    
+    def end(self) -> datetime:
+        return self.start + timedelta(minutes=15 * self.quarters())
+    
+    def color(self):
+        return PRIORITIES[clamp_priority(self.priority)]
+    
+    def record(self, event_id: int) -> Record:
+        return (event_id, self.start, self.hours, self.minutes, self.name, self.description, self.priority)
+    
+    def text(self) -> str:
+        return self.name + ' ' + self.description
+
+class Recurrence(Event):
+    __slots__ = ('frequency', 'interval', 'weekdays', 'until', 'count', 'exceptions')
+    frequency: str
+    interval: int
+    weekdays: tuple[int, ...]
+    until: datetime
+    count: int
+    exceptions: set[datetime]
+    
+    def __init__(self, start, hours, minutes, name, description, priority, frequency, interval=1, weekdays=(), until=None, count=None, exceptions=()):
+        super().__init__(start, hours, minutes, name, description, priority)
+        self.frequency = frequency
+        self.interval = max(1, interval)
+        self.weekdays = tuple(sorted(set(weekdays))) or (start.weekday(),)
+        self.until = until
+        self.count = count
+        self.exceptions = set(exceptions)
+    
+    def record(self, rule_id: int) -> RuleRecord:
+        return (rule_id, self.start, self.hours, self.minutes, self.name, self.description, self.priority, self.frequency, self.interval, self.weekdays, self.until, self.count, tuple(sorted(self.exceptions)))
+    
+    def candidates(self, after: datetime) -> Iterator[tuple[int, datetime]]:
+        try:
+            match self.frequency:
+                case 'daily':
+                    step = timedelta(days=self.interval)
+                    index = max(0, (after - self.start) // step)
+                    
+                    while True:
+                        yield index, self.start + index * step
+                        index += 1
+                case 'weekly':
+                    step = timedelta(weeks=self.interval)
+                    week = self.start - timedelta(days=self.start.weekday())
+                    first = [d for d in self.weekdays if d >= self.start.weekday()]
+                    w = max(0, (after - week) // step)
+                    index = 0 if w == 0 else len(first) + (w - 1) * len(self.weekdays)
+                    
+                    while True:
+                        for d in first if w == 0 else self.weekdays:
+                            yield index, week + w * step + timedelta(days=d)
+                            index += 1
+                        
+                        w += 1
+                case 'monthly':
+                    month = self.start.year * 12 + self.start.month - 1
+                    index = 0
+                    
+                    while month < 10000 * 12:
+                        try:
+                            t = self.start.replace(year=month // 12, month=month % 12 + 1)
+                        except ValueError:
+                            pass
+                        else:
+                            yield index, t
+                            index += 1
+                        
+                        month += self.interval
+        except OverflowError:
+            return
+    
+    def occurrences(self, start: datetime, end: datetime) -> Iterator[datetime]:
+        duration = self.end() - self.start
+        
+        for index, t in self.candidates(start - duration):
+            if t >= end or (self.until is not None and t >= self.until) or (self.count is not None and index >= self.count):
+                return
+            
+            if t + duration > start and t not in self.exceptions:
+                yield t
+
+class Occurrence(Event):
+    __slots__ = ('rule', 'frequency')
+    rule: int
+    frequency: str
+    
+    def __init__(self, rule_id: int, start: datetime, rule: Recurrence):
+        super().__init__(start, rule.hours, rule.minutes, rule.name, rule.description, rule.priority)
+        self.rule = rule_id
+        self.frequency = rule.frequency
+    
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Occurrence) and (self.rule, self.start) == (other.rule, other.start)
+    
+    def __hash__(self) -> int:
+        return hash((self.rule, self.start))
+
+POLICIES = ['skip', 'replace', 'higher']
+
+EventSpec = tuple[datetime, int, int, str, str, int]
+Overlap = tuple[Event, Event, datetime, datetime]
+AgendaKey = tuple[datetime, int]
+
+def subtract(start: datetime, end: datetime, busy: list[tuple[datetime, datetime]], ends: list[datetime]) -> Iterator[tuple[datetime, datetime]]:
+    i = bisect_right(ends, start)
+    
+    while start < end:
+        if i == len(busy) or busy[i][0] >= end:
+            yield start, end
+            return
+        
+        s, e = busy[i]
+        
+        if s > start:
+            yield start, s
+        
+        start = max(start, e)
+        i += 1
+
+def within_hours(start: datetime, end: datetime, hours: tuple[timedelta, timedelta]) -> Iterator[tuple[datetime, datetime]]:
+    if hours is None:
+        yield start, end
+        return
+    
+    day = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    
+    while day < end:
+        s, e = max(start, day + hours[0]), min(end, day + hours[1])
+        
+        if s < e:
+            yield s, e
+        
+        day += timedelta(days=1)
+
+def sweep(events: Iterable[Event]) -> Iterator[Overlap]:
+    active = []
+    
+    for n, e in enumerate(sorted(events, key=lambda e: e.start)):
+        while active and active[0][0] <= e.start:
+            heapq.heappop(active)
+        
+        for end, _, other in active:
+            yield other, e, e.start, min(end, e.end())
+        
+        heapq.heappush(active, (e.end(), n, e))
+
+def replace_all(conflicts: list[int]) -> bool:
+    return True
+
+class Snapshot:
+    version: int
+    schedule: dict[int, Event]
+    expanded: list[Occurrence]
+    day_rollup: Rollup
+    hour_rollup: Rollup
+    day_load: DayLoad
+
+    def __init__(self, version: int, events: list[tuple[int, Event]], occurrences: list[Occurrence]):
+        self.version = version
+        self.schedule = dict(events)
+        self.expanded = occurrences
+        self.day_rollup = Rollup(timedelta(days=1))
+        self.hour_rollup = Rollup(timedelta(hours=1))
+        self.day_load = DayLoad()
+        
+        for event_id, e in events:
+            for rollup in (self.day_rollup, self.hour_rollup, self.day_load):
+                rollup.add(e.start, e.end(), e.priority, event_id)
+    
+    def __getitem__(self, event_id: int) -> Event:
+        return self.schedule[event_id]
+    
+    def ensure(self, start: datetime, end: datetime):
+        pass
+    
+    def occurrences(self, start: datetime, end: datetime) -> list[Occurrence]:
+        return [o for o in self.expanded if o.start < end and o.end() > start]
+    
+    def events(self, start: datetime, end: datetime) -> list[Event]:
+        return sorted([e for e in self.schedule.values() if e.start < end and e.end() > start] + self.occurrences(start, end), key=lambda e: e.start)
+
+def mutates(f):
+    @wraps(f)
+    def wrapper(self, *args, **kwargs):
+        self.ready.wait()
+        
+        if self.error is not None:
+            raise RuntimeError("The calendar failed to load") from self.error
+        
+        with self.lock:
+            result = f(self, *args, **kwargs)
+            self.version += 1
+        
+        self.dirty.set()
+        return result
+    
+    return wrapper
+
+class CalendarStore:
+    backend: Journal | SqliteStore
+    schedule: dict[int, Event]
+    rules: dict[int, Recurrence]
+    expansions: OrderedDict[tuple[datetime, datetime], list[Occurrence]]
+    capacity: int
+    index: IntervalIndex
+    day_rollup: Rollup
+    hour_rollup: Rollup
+    day_load: DayLoad
+    rollups: list[Rollup | DayLoad]
+    gap_indexes: dict[int, GapIndex]
+    search_index: SearchIndex
+    last_id: int
+    version: int
+    lock: threading.RLock
+    dirty: threading.Event
+    ready: threading.Event
+    loaded: threading.Event
+    loader: 'Loader'
+    error: Exception
+
+    def __init__(self, backend: Journal | SqliteStore = None):
+        self.backend = Journal() if backend is None else backend
+        self.last_id = 0
+        self.version = 0
+        self.schedule = {}
+        self.rules = {}
+        self.expansions = OrderedDict()
+        self.capacity = 64
+        self.index = IntervalIndex()
+        self.day_rollup = Rollup(timedelta(days=1))
+        self.hour_rollup = Rollup(timedelta(hours=1))
+        self.day_load = DayLoad()
+        self.rollups = [self.day_rollup, self.hour_rollup, self.day_load]
+        self.gap_indexes = {}
+        self.search_index = SearchIndex()
+        self.lock = threading.RLock()
+        self.dirty = threading.Event()
+        self.ready = threading.Event()
+        self.loaded = threading.Event()
+        self.loader = None
+        self.error = None
+        self.ready.set()
+        self.loaded.set()
+    
+    def __len__(self) -> int:
+        return len(self.schedule)
+    
+    def __contains__(self, event_id: int) -> bool:
+        return event_id in self.schedule
+    
+    def __getitem__(self, event_id: int) -> Event:
+        return self.schedule[event_id]
+    
+    def load(self):
+        records, rules = self.backend.load()
+        self.last_id = self.backend.last_id
+        self.merge(records, rules)
+    
+    @timed("store.merge")
+    def merge(self, records: Iterable[Record], rules: Iterable[RuleRecord] = ()):
+        with self.lock:
+            for rule_id, *r in rules:
+                self.rules[rule_id] = Recurrence(*r)
+                self.search_index.add(rule_id, self.rules[rule_id].text())
+            
+            if rules:
+                self.expansions.clear()
+            
+            events = [(event_id, Event(*e)) for event_id, *e in records]
+            self.schedule.update(events)
+            self.index.extend((e.start, e.end(), event_id) for event_id, e in events)
+            
+            for event_id, e in events:
+                for rollup in self.rollups:
+                    rollup.add(e.start, e.end(), e.priority, event_id)
+            
+            self.search_index.extend((event_id, e.text()) for event_id, e in events)
+            self.gap_indexes.clear()
+            self.version += 1
+    
+    @timed("store.save")
+    def save(self):
+        checkpoint = None
+        
+        with self.lock:
+            if self.loaded.is_set() and self.backend.should_compact():
+                records, rules, checkpoint = self.records(), self.rule_records(), self.backend.checkpoint()
+        
+        if checkpoint is None:
+            self.backend.flush()
+        else:
+            self.backend.compact(records, rules, checkpoint)
+    
+    def close(self):
+        self.backend.close()
+    
+    def records(self) -> list[Record]:
+        return [self.schedule[event_id].record(event_id) for _, _, event_id in self.index]
+    
+    def rule_records(self) -> list[RuleRecord]:
+        return [rule.record(rule_id) for rule_id, rule in self.rules.items()]
+    
+    def new_id(self) -> int:
+        self.last_id += 1
+        return self.last_id
+    
+    def index_event(self, event_id: int, e: Event):
+        self.index.insert(e.start, e.end(), event_id)
+        
+        for rollup in self.rollups:
+            rollup.add(e.start, e.end(), e.priority, event_id)
+        
+        for threshold, gaps in self.gap_indexes.items():
+            if e.priority >= threshold:
+                gaps.add(e.start, e.end())
+        
+        if not self.backend.lazy:
+            self.search_index.add(event_id, e.text())
+    
+    def unindex_event(self, event_id: int, e: Event):
+        self.index.pop(e.start)
+        
+        for rollup in self.rollups:
+            rollup.remove(e.start, e.end(), e.priority, event_id)
+        
+        for threshold, gaps in self.gap_indexes.items():
+            if e.priority >= threshold:
+                gaps.remove(e.start, e.end())
+        
+        if not self.backend.lazy:
+            self.search_index.remove(event_id, e.text())
+    
+    def gaps(self, threshold: int = 0) -> GapIndex:
+        gaps = self.gap_indexes.get(threshold)
+        
+        if gaps is None:
+            gaps = self.gap_indexes[threshold] = GapIndex((s, e) for s, e, event_id in self.index if self.schedule[event_id].priority >= threshold)
+        
+        return gaps
+    
+    @timed("store.free_slots")
+    def free_slots(self, duration: timedelta, start: datetime, end: datetime, hours: tuple[timedelta, timedelta] = None, priority: int = 0, n: int = 5) -> list[tuple[datetime, datetime]]:
+        self.ensure(start, end)
+        busy = []
+        
+        for o in self.occurrences(start, end):
+            if o.priority >= priority:
+                if busy and busy[-1][1] >= o.start:
+                    busy[-1] = (busy[-1][0], max(busy[-1][1], o.end()))
+                else:
+                    busy.append((o.start, o.end()))
+        
+        ends = [e for _, e in busy]
+        slots = []
+        
+        for gap in self.gaps(priority).free(start, end, duration):
+            for free in subtract(*gap, busy, ends):
+                for s, e in within_hours(*free, hours):
+                    if e - s >= duration:
+                        slots.append((s, e))
+                        
+                        if len(slots) == n:
+                            return slots
+        
+        return slots
+    
+    @timed("store.ensure")
+    def ensure(self, start: datetime, end: datetime):
+        with self.lock:
+            if self.loader is not None:
+                records, rules = self.loader.claim(start, end)
+                
+                if records or rules:
+                    self.merge(records, rules)
+            
+            records, evicted = self.backend.fetch(start, end)
+            count = len(self.schedule)
+            
+            for s, e in evicted:
+                for event_id in self.index.overlapping(s, e):
+                    event = self.schedule[event_id]
+                    
+                    if not self.backend.loaded(event.start, event.end()):
+                        self.unindex_event(event_id, event)
+                        self.schedule.pop(event_id)
+            
+            if len(self.schedule) < count:
+                self.version += 1
+            
+            for event_id, *e in records:
+                if event_id not in self.schedule:
+                    event = self.schedule[event_id] = Event(*e)
+                    self.index_event(event_id, event)
+    
+    def pin(self, start: datetime, end: datetime):
+        with self.lock:
+            self.backend.pin(start, end)
+    
+    def snapshot(self, start: datetime, end: datetime) -> 'Snapshot':
+        with self.lock:
+            self.ensure(start, end)
+            version = self.version
+            events = [(event_id, Event(*self.schedule[event_id].record(event_id)[1:])) for event_id in self.index.overlapping(start, end)]
+            occurrences = self.occurrences(start, end)
+        
+        return Snapshot(version, events, occurrences)
+    
+    def at(self, time: datetime) -> int:
+        return self.index.get(time)
+    
+    def event_at(self, time: datetime) -> Event:
+        event_id = self.index.get(time)
+        
+        if event_id is not None:
+            return self.schedule[event_id]
+        
+        return max(self.expand(time, time + timedelta(minutes=1)), key=lambda o: (o.priority, o.start), default=None)
+    
+    def range(self, start: datetime, end: datetime) -> list[int]:
+        self.ensure(start, end)
+        return self.index.overlapping(start, end)
+    
+    def expand(self, start: datetime, end: datetime) -> list[Occurrence]:
+        return sorted((Occurrence(rule_id, t, rule) for rule_id, rule in self.rules.items() for t in rule.occurrences(start, end)), key=lambda o: o.start)
+    
+    def occurrences(self, start: datetime, end: datetime) -> list[Occurrence]:
+        key = (start, end)
+        
+        with self.lock:
+            if key in self.expansions:
+                self.expansions.move_to_end(key)
+            else:
+                self.expansions[key] = self.expand(start, end)
+                
+                if len(self.expansions) > self.capacity:
+                    self.expansions.popitem(last=False)
+            
+            return self.expansions[key]
+    
+    def events(self, start: datetime, end: datetime) -> list[Event]:
+        return sorted([self.schedule[e] for e in self.range(start, end)] + self.occurrences(start, end), key=lambda e: e.start)
+    
+    def iter_range(self, start: datetime = datetime.min, end: datetime = datetime.max) -> Iterator[Record]:
+        if self.backend.lazy:
+            yield from self.backend.scan(start, end)
+        else:
+            i, j = self.index.span(start, end)
+            
+            for i in range(i, j):
+                event_id = self.index.ids[i]
+                yield self.schedule[event_id].record(event_id)
+    
+    def agenda(self, after: AgendaKey = (datetime.min, 0), reverse: bool = False) -> Iterator[tuple[AgendaKey, Event]]:
+        time, rank = after
+        
+        with self.lock:
+            rules = list(self.rules.items())
+        
+        return heapq.merge(
+            self.event_walk(time, 0 < rank if reverse else 0 >= rank, reverse),
+            *(self.rule_walk(rule_id, rule, time, rule_id < rank if reverse else rule_id >= rank, reverse) for rule_id, rule in rules),
+            reverse=reverse,
+        )
+    
+    def event_walk(self, time: datetime, inclusive: bool, reverse: bool) -> Iterator[tuple[AgendaKey, Event]]:
+        if self.backend.lazy:
+            for _, *r in self.backend.walk(time, inclusive, reverse):
+                yield (r[0], 0), Event(*r)
+        else:
+            starts, ids = self.index.starts, self.index.ids
+            
+            if reverse:
+                for i in range((bisect_right if inclusive else bisect_left)(starts, time) - 1, -1, -1):
+                    yield (starts[i], 0), self.schedule[ids[i]]
+            else:
+                for i in range((bisect_left if inclusive else bisect_right)(starts, time), len(ids)):
+                    yield (starts[i], 0), self.schedule[ids[i]]
+    
+    def rule_walk(self, rule_id: int, rule: Recurrence, time: datetime, inclusive: bool, reverse: bool, step: timedelta = timedelta(days=28)) -> Iterator[tuple[AgendaKey, Occurrence]]:
+        if reverse:
+            end = time if rule.until is None else min(time, rule.until)
+            
+            while end >= rule.start:
+                start = end - step
+                
+                for t in reversed([t for t in rule.occurrences(start, end + timedelta(microseconds=1)) if start <= t and (t < end or (inclusive and t == time))]):
+                    yield (t, rule_id), Occurrence(rule_id, t, rule)
+                
+                end = start
+        else:
+            for t in rule.occurrences(max(time, rule.start), datetime.max):
+                if t > time or (inclusive and t == time):
+                    yield (t, rule_id), Occurrence(rule_id, t, rule)
+    
+    def bounds(self) -> tuple[datetime, datetime]:
+        if self.backend.lazy:
+            return self.backend.bounds()
+        
+        return (self.index.starts[0], self.index.ends[-1]) if self.index.starts else None
+    
+    def conflicts(self, start: datetime, end: datetime) -> list[int]:
+        return self.range(start, end)
+    
+    def rule_conflicts(self, rule: Recurrence) -> dict[int, Event]:
+        bounds = self.bounds()
+        conflicts = {}
+        
+        if bounds is None:
+            return conflicts
+        
+        duration = rule.end() - rule.start
+        
+        for t in rule.occurrences(*bounds):
+            if self.backend.lazy:
+                conflicts.update((event_id, Event(*r)) for event_id, *r in self.backend.scan(t, t + duration))
+            else:
+                conflicts.update((event_id, self.schedule[event_id]) for event_id in self.range(t, t + duration))
+        
+        return conflicts
+    
+    def nearest(self, time: datetime) -> Iterator[int]:
+        starts, ids = self.index.starts, self.index.ids
+        j = bisect_left(starts, time)
+        i = j - 1
+        
+        while i >= 0 or j < len(starts):
+            if j == len(starts) or (i >= 0 and time - starts[i] <= starts[j] - time):
+                yield ids[i]
+                i -= 1
+            else:
+                yield ids[j]
+                j += 1
+    
+    @timed("store.search")
+    def search(self, query: str, around: datetime, n: int = 50) -> list[Event]:
+        keys = self.search_index.search(query)
+        found = []
+        
+        for key in keys & self.rules.keys():
+            rule = self.rules[key]
+            t = next(rule.occurrences(max(around, rule.start), around + timedelta(days=366)), None)
+            found.append(Occurrence(key, rule.start if t is None else t, rule))
+        
+        if len(keys) <= 4 * n:
+            found += (self.schedule[key] for key in keys if key in self.schedule)
+        else:
+            matched = 0
+            
+            for event_id in self.nearest(around):
+                if event_id in keys:
+                    e = self.schedule[event_id]
+                    
+                    if matched >= n and abs(e.start - around) // timedelta(days=1) > abs(found[-1].start - around) // timedelta(days=1):
+                        break
+                    
+                    found.append(e)
+                    matched += 1
+        
+        if self.backend.lazy:
+            found += (Event(*r) for _, *r in self.backend.search(tokenize(query), around, n))
+        
+        return heapq.nsmallest(n, found, key=lambda e: (abs(e.start - around) // timedelta(days=1), -e.priority, abs(e.start - around)))
+    
+    @timed("store.overlaps")
+    def overlaps(self, start: datetime, end: datetime) -> list[Overlap]:
+        return list(sweep(self.events(start, end)))
+    
+    def check_many(self, events: Iterable[EventSpec]) -> list[Overlap]:
+        candidates = [Event(*e) for e in events]
+        
+        if not candidates:
+            return []
+        
+        new = set(map(id, candidates))
+        existing = self.events(min(e.start for e in candidates), max(e.end() for e in candidates))
+        return [o for o in sweep(existing + candidates) if id(o[0]) in new or id(o[1]) in new]
+    
+    @mutates
+    def add(self, start: datetime, hours: int, minutes: int, name: str, description: str, priority: int, on_conflict: Callable[[list[int | Occurrence]], bool] = replace_all) -> int:
+        priority = clamp_priority(priority)
+        end = start + timedelta(minutes=15 * (hours * 4 + minutes))
+        conflicts = self.conflicts(start, end)
+        occurrences = self.expand(start, end)
+        
+        if (conflicts or occurrences) and not on_conflict(conflicts + occurrences):
+            return None
+        
+        for e in conflicts:
+            self.remove(e)
+        
+        self.exclude(occurrences)
+        
+        event_id = self.new_id()
+        self.schedule[event_id] = Event(start, hours, minutes, name, description, priority)
+        self.index_event(event_id, self.schedule[event_id])
+        self.backend.add(event_id, start, hours, minutes, name, description, priority)
+        
+        return event_id
+    
+    @mutates
+    def add_many(self, events: Iterable[EventSpec], policy: str = 'skip') -> tuple[int, int, int]:
+        candidates = [Event(start, hours, minutes, name, description, clamp_priority(priority)) for start, hours, minutes, name, description, priority in events]
+        
+        if not candidates:
+            return 0, 0, 0
+        
+        self.ensure(min(e.start for e in candidates), max(e.end() for e in candidates))
+        order = sorted(range(len(candidates)), key=lambda k: -candidates[k].priority) if policy == 'higher' else range(len(candidates))
+        accepted = IntervalIndex()
+        removed = {}
+        excluded = {}
+        
+        for k in order:
+            e = candidates[k]
+            start, end = e.start, e.end()
+            
+            if accepted.overlapping(start, end):
+                continue
+            
+            existing = [i for i in self.index.overlapping(start, end) if i not in removed]
+            occurrences = [o for o in self.expand(start, end) if o not in excluded]
+            rivals = [self.schedule[i].priority for i in existing] + [o.priority for o in occurrences]
+            
+            if rivals and (policy == 'skip' or (policy == 'higher' and max(rivals) >= e.priority)):
+                continue
+            
+            removed.update(dict.fromkeys(existing))
+            excluded.update(dict.fromkeys(occurrences))
+            accepted.insert(start, end, k)
+        
+        added = []
+        
+        for event_id in removed:
+            e = self.schedule.pop(event_id)
+            
+            for rollup in self.rollups:
+                rollup.remove(e.start, e.end(), e.priority, event_id)
+            
+            if not self.backend.lazy:
+                self.search_index.remove(event_id, e.text())
+        
+        for k in sorted(accepted.ids):
+            e = candidates[k]
+            event_id = self.new_id()
+            self.schedule[event_id] = e
+            added.append(e.record(event_id))
+            
+            for rollup in self.rollups:
+                rollup.add(e.start, e.end(), e.priority, event_id)
+            
+            if not self.backend.lazy:
+                self.search_index.add(event_id, e.text())
+        
+        self.index = IntervalIndex((e.start, e.end(), event_id) for event_id, e in self.schedule.items())
+        self.gap_indexes.clear()
+        self.exclude(excluded)
+        self.backend.remove_many(removed)
+        self.backend.add_many(added)
+        
+        return len(added), len(candidates) - len(added), len(removed)
+    
+    @mutates
+    def update(self, event_id: int, hours: int, minutes: int, name: str, description: str, priority: int, on_conflict: Callable[[list[int | Occurrence]], bool] = replace_all) -> bool:
+        e = self.schedule[event_id]
+        q = e.quarters()
+        r = hours * 4 + minutes
+        priority = clamp_priority(priority)
+        
+        if r == 0:
+            self.remove(event_id)
+            return True
+        
+        if q < r:
+            conflicts = self.conflicts(e.end(), e.start + timedelta(minutes=15 * r))
+            occurrences = self.expand(e.end(), e.start + timedelta(minutes=15 * r))
+            
+            if (conflicts or occurrences) and not on_conflict(conflicts + occurrences):
+                return False
+            
+            for c in conflicts:
+                self.remove(c)
+            
+            self.exclude(occurrences)
+        
+        self.unindex_event(event_id, e)
+        e.hours = hours
+        e.minutes = minutes
+        e.name = name
+        e.description = description
+        e.priority = priority
+        self.index_event(event_id, e)
+        self.backend.update(event_id, hours, minutes, name, description, priority)
+        
+        return True
+    
+    @mutates
+    def remove(self, event_id: int):
+        e = self.schedule.pop(event_id, None) if self.backend.lazy else self.schedule.pop(event_id)
+        
+        if e is not None:
+            self.unindex_event(event_id, e)
+        
+        self.backend.remove(event_id)
+    
+    @mutates
+    def add_rule(self, start: datetime, hours: int, minutes: int, name: str, description: str, priority: int, frequency: str, interval: int = 1, weekdays: tuple[int, ...] = (), until: datetime = None, count: int = None, exceptions: Iterable[datetime] = (), on_conflict: Callable[[list[int]], bool] = replace_all) -> int:
+        rule = Recurrence(start, hours, minutes, name, description, clamp_priority(priority), frequency, interval, weekdays, until, count, exceptions)
+        conflicts = self.rule_conflicts(rule)
+        
+        if conflicts and not on_conflict(list(conflicts)):
+            return None
+        
+        for e in conflicts:
+            self.remove(e)
+        
+        rule_id = self.new_id()
+        self.rules[rule_id] = rule
+        self.search_index.add(rule_id, self.rules[rule_id].text())
+        self.expansions.clear()
+        self.backend.add_rule(self.rules[rule_id].record(rule_id))
+        
+        return rule_id
+    
+    @mutates
+    def update_rule(self, rule_id: int, hours: int, minutes: int, name: str, description: str, priority: int, frequency: str, interval: int = 1, weekdays: tuple[int, ...] = (), until: datetime = None, count: int = None, on_conflict: Callable[[list[int]], bool] = replace_all) -> bool:
+        rule = self.rules[rule_id]
+        
+        if hours * 4 + minutes == 0:
+            self.remove_rule(rule_id)
+            return True
+        
+        updated = Recurrence(rule.start, hours, minutes, name, description, clamp_priority(priority), frequency, interval, weekdays, until, count, rule.exceptions)
+        conflicts = self.rule_conflicts(updated)
+        
+        if conflicts and not on_conflict(list(conflicts)):
+            return False
+        
+        for e in conflicts:
+            self.remove(e)
+        
+        self.rules[rule_id] = updated
+        self.search_index.remove(rule_id, rule.text())
+        self.search_index.add(rule_id, updated.text())
+        self.expansions.clear()
+        self.backend.add_rule(updated.record(rule_id))
+        
+        return True
+    
+    @mutates
+    def remove_rule(self, rule_id: int):
+        self.search_index.remove(rule_id, self.rules.pop(rule_id).text())
+        self.expansions.clear()
+        self.backend.remove_rule(rule_id)
+    
+    @mutates
+    def exclude(self, occurrences: Iterable[Occurrence]):
+        changed = set()
+        
+        for o in occurrences:
+            self.rules[o.rule].exceptions.add(o.start)
+            changed.add(o.rule)
+        
+        if changed:
+            self.expansions.clear()
+        
+        for rule_id in changed:
+            self.backend.add_rule(self.rules[rule_id].record(rule_id))
+
+class Autosaver:
+    store: CalendarStore
+    delay: float
+    latency: float
+    stopped: threading.Event
+    thread: threading.Thread
+    error: Exception
+    
+    def __init__(self, store: CalendarStore, delay: float = 0.5, latency: float = 5.0):
+        self.store = store
+        self.delay = delay
+        self.latency = latency
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="autosave", daemon=True)
+        self.error = None
+    
+    def start(self):
+        self.thread.start()
+    
+    def run(self):
+        while not self.stopped.is_set():
+            self.store.dirty.wait()
+            first = time.monotonic()
+            
+            while self.store.dirty.is_set() and time.monotonic() - first < self.latency:
+                self.store.dirty.clear()
+                
+                if self.stopped.wait(self.delay):
+                    break
+            
+            try:
+                self.store.save()
+                self.error = None
+            except Exception as e:
+                self.error = e
+                self.store.dirty.set()
+                self.stopped.wait(self.latency)
+    
+    def stop(self):
+        self.stopped.set()
+        self.store.dirty.set()
+        self.thread.join()
+
+class Loader:
+    store: CalendarStore
+    visible: tuple[datetime, datetime]
+    size: int
+    total: int
+    done: int
+    batches: queue.SimpleQueue
+    thread: threading.Thread
+    error: Exception
+    records: list[Record]
+    starts: list[datetime]
+    merged: bytearray
+    rules: list[RuleRecord]
+    
+    def __init__(self, store: CalendarStore, start: datetime, end: datetime, size: int = 2000):
+        self.store = store
+        self.visible = (start, end)
+        self.size = size
+        self.total = 0
+        self.done = 0
+        self.batches = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self.run, name="loader", daemon=True)
+        self.error = None
+        self.records = []
+        self.starts = []
+        self.merged = bytearray()
+        self.rules = []
+    
+    def start(self):
+        self.store.ready.clear()
+        self.store.loaded.clear()
+        self.store.loader = self
+        self.store.error = None
+        self.thread.start()
+    
+    def run(self):
+        try:
+            records, rules = self.store.backend.load()
+        except Exception as e:
+            self.error = self.store.error = e
+            self.store.ready.set()
+            self.batches.put(None)
+            return
+        
+        records = sorted(records, key=lambda r: r[1])
+        self.total = len(records)
+        
+        with self.store.lock:
+            self.store.last_id = self.store.backend.last_id
+            self.records = records
+            self.starts = [r[1] for r in records]
+            self.merged = bytearray(len(records))
+            self.rules = list(rules)
+        
+        self.store.ready.set()
+        start, end = self.visible
+        i = max(0, bisect_left(self.starts, start) - 1)
+        j = bisect_left(self.starts, end, lo=i)
+        self.batches.put((start, end, i, j))
+        
+        while i > 0 or j < len(records):
+            if j < len(records):
+                self.put(j, min(len(records), j + self.size))
+                j += self.size
+            
+            if i > 0:
+                self.put(max(0, i - self.size), i)
+                i -= self.size
+        
+        self.batches.put(None)
+    
+    def put(self, i: int, j: int):
+        self.batches.put((self.starts[i], max(map(self.end, range(i, j))), i, j))
+    
+    def end(self, k: int) -> datetime:
+        _, start, hours, minutes, *_ = self.records[k]
+        return start + timedelta(minutes=15 * (hours * 4 + minutes))
+    
+    def take(self, i: int, j: int) -> tuple[list[Record], list[RuleRecord]]:
+        records = [self.records[k] for k in range(i, j) if not self.merged[k]]
+        self.merged[i:j] = bytes([1]) * (j - i)
+        rules, self.rules = self.rules, []
+        return records, rules
+    
+    def claim(self, start: datetime, end: datetime) -> tuple[list[Record], list[RuleRecord]]:
+        i = bisect_right(self.starts, start) - 1
+        
+        if i < 0 or self.end(i) <= start:
+            i += 1
+        
+        return self.take(i, bisect_left(self.starts, end, lo=i))
+    
+    @timed("loader.poll")
+    def poll(self, budget: float = 0.02) -> tuple[datetime, datetime]:
+        deadline = time.monotonic() + budget
+        covered = None
+        
+        while time.monotonic() < deadline:
+            try:
+                batch = self.batches.get_nowait()
+            except queue.Empty:
+                break
+            
+            if batch is None:
+                if self.error is not None:
+                    raise self.error
+                
+                with self.store.lock:
+                    self.store.loader = None
+                
+                self.store.loaded.set()
+                break
+            
+            start, end, i, j = batch
+            
+            with self.store.lock:
+                self.store.merge(*self.take(i, j))
+            
+            self.done += j - i
+            covered = (start, end) if covered is None else (min(covered[0], start), max(covered[1], end))
+        
+        return covered
@@ -0,0 +1,393 @@
+from datetime import datetime, timedelta, timezone
+from collections.abc import Iterable, Iterator
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from engine import PRIORITIES, POLICIES, CalendarStore, EventSpec, Recurrence
+from storage import EPOCH, FREQUENCIES, Journal, SqliteStore, Record, RuleRecord
+from operator import itemgetter
+import argparse
+import heapq
+import time
+import csv
+import sys
+import os
+import re
+
+Property = tuple[dict[str, str], str]
+Repeat = tuple[str, int, tuple[int, ...], datetime | None, int | None, tuple[datetime, ...]]
+
+WEEKDAYS = ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU']
+HORIZON = timedelta(days=366)
+
+DURATION = re.compile(r'([+-])?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?')
+
+def unfold(lines: Iterable[str]) -> Iterator[str]:
+    current = None
+
+    for line in lines:
+        line = line.rstrip('\r\n')
+
+        if line[:1] in (' ', '\t'):
+            if current is not None:
+                current += line[1:]
+        else:
+            if current is not None:
+                yield current
+
+            current = line
+
+    if current is not None:
+        yield current
+
+def parse_line(line: str) -> tuple[str, dict[str, str], str]:
+    head, _, value = line.partition(':')
+    name, *params = head.split(';')
+    return name.upper(), dict(p.partition('=')[::2] for p in params), value
+
+def iter_vevents(lines: Iterable[str]) -> Iterator[dict[str, list[Property]]]:
+    event = None
+    depth = 0
+
+    for line in unfold(lines):
+        name, params, value = parse_line(line)
+
+        if name == 'BEGIN':
+            if event is not None:
+                depth += 1
+            elif value.upper() == 'VEVENT':
+                event = {}
+        elif name == 'END' and event is not None:
+            if depth == 0:
+                yield event
+                event = None
+            else:
+                depth -= 1
+        elif event is not None and depth == 0:
+            event.setdefault(name, []).append((params, value))
+
+def first(event: dict[str, list[Property]], name: str, default: str = '') -> str:
+    return event[name][0][1] if name in event else default
+
+def unescape(text: str) -> str:
+    return re.sub(r'\\(.)', lambda m: '\n' if m.group(1) in 'nN' else m.group(1), text)
+
+def parse_time(params: dict[str, str], value: str) -> datetime:
+    date = datetime(int(value[0:4]), int(value[4:6]), int(value[6:8]))
+
+    if params.get('VALUE') == 'DATE' or len(value) == 8:
+        return date
+
+    t = date.replace(hour=int(value[9:11]), minute=int(value[11:13]), second=int(value[13:15]))
+
+    if value.endswith('Z'):
+        return t.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+
+    if 'TZID' in params:
+        try:
+            return t.replace(tzinfo=ZoneInfo(params['TZID'].strip('"'))).astimezone().replace(tzinfo=None)
+        except (ZoneInfoNotFoundError, ValueError):
+            pass
+
+    return t
+
+def parse_duration(value: str) -> timedelta:
+    m = DURATION.fullmatch(value)
+
+    if m is None:
+        raise ValueError(f"Invalid duration {value!r}")
+
+    sign, weeks, days, hours, minutes, seconds = m.groups()
+    d = timedelta(weeks=int(weeks or 0), days=int(days or 0), hours=int(hours or 0), minutes=int(minutes or 0), seconds=int(seconds or 0))
+    return -d if sign == '-' else d
+
+def round_quarter(time: datetime, up: bool = False) -> datetime:
+    q = timedelta(minutes=15)
+    rounded = EPOCH + (time - EPOCH) // q * q
+    return rounded + q if up and rounded != time else rounded
+
+def map_priority(value: str) -> int:
+    p = int(value or 0)
+    return 0 if not 1 <= p <= 9 else round((10 - p) * (len(PRIORITIES) - 1) / 9)
+
+def ics_priority(priority: int) -> int:
+    return 0 if priority <= 0 else max(1, 10 - round(min(priority, len(PRIORITIES) - 1) * 9 / (len(PRIORITIES) - 1)))
+
+def escape(text: str) -> str:
+    return text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+def fold(line: str) -> str:
+    data = line.encode()
+
+    if len(data) <= 75:
+        return line + '\r\n'
+
+    parts = []
+    start = 0
+
+    while start < len(data):
+        end = min(len(data), start + (75 if not parts else 74))
+
+        while end < len(data) and data[end] & 0xC0 == 0x80:
+            end -= 1
+
+        parts.append(data[start:end].decode())
+        start = end
+
+    return '\r\n '.join(parts) + '\r\n'
+
+def parse_until(value: str) -> datetime:
+    until = parse_time({}, value)
+    return until + (timedelta(days=1) if len(value) == 8 else timedelta(minutes=1)) - timedelta(seconds=until.second)
+
+def parse_rrule(value: str, start: datetime) -> tuple[str, int, tuple[int, ...], datetime | None, int | None]:
+    parts = dict(p.partition('=')[::2] for p in value.upper().split(';') if p)
+    frequency = parts.pop('FREQ', '').lower()
+    interval = int(parts.pop('INTERVAL', '1'))
+    weekdays = (start.weekday(),)
+
+    if frequency not in FREQUENCIES or interval < 1:
+        raise ValueError(f"Unsupported RRULE {value!r}")
+
+    if 'BYDAY' in parts:
+        days = parts.pop('BYDAY').split(',')
+
+        if frequency != 'weekly' or not set(days) <= set(WEEKDAYS):
+            raise ValueError(f"Unsupported RRULE {value!r}")
+
+        weekdays = tuple(WEEKDAYS.index(d) for d in days)
+
+    if frequency == 'monthly' and parts.get('BYMONTHDAY') == str(start.day):
+        del parts['BYMONTHDAY']
+
+    if parts.get('WKST', 'MO') == 'MO':
+        parts.pop('WKST', None)
+
+    until = parse_until(parts.pop('UNTIL')) if 'UNTIL' in parts else None
+    count = int(parts.pop('COUNT')) if 'COUNT' in parts else None
+
+    if parts:
+        raise ValueError(f"Unsupported RRULE {value!r}")
+
+    return frequency, interval, weekdays, until, count
+
+def to_spec(event: dict[str, list[Property]]) -> tuple[EventSpec, Repeat | None]:
+    if 'DTSTART' not in event:
+        raise ValueError("Missing DTSTART")
+
+    params, value = event['DTSTART'][0]
+    start = parse_time(params, value)
+
+    if 'DTEND' in event:
+        end = parse_time(*event['DTEND'][0])
+    elif 'DURATION' in event:
+        end = start + parse_duration(first(event, 'DURATION'))
+    elif params.get('VALUE') == 'DATE' or len(value) == 8:
+        end = start + timedelta(days=1)
+    else:
+        end = start
+
+    start = round_quarter(start)
+    quarters = max(1, (round_quarter(end, up=True) - start) // timedelta(minutes=15))
+    spec = (
+        start,
+        quarters // 4,
+        quarters % 4,
+        unescape(first(event, 'SUMMARY')).strip() or "(No title)",
+        unescape(first(event, 'DESCRIPTION')),
+        map_priority(first(event, 'PRIORITY', '0')),
+    )
+
+    if 'RRULE' not in event:
+        return spec, None
+
+    exceptions = []
+
+    for p, values in event.get('EXDATE', ()):
+        for t in filter(None, values.split(',')):
+            excluded = parse_time(p, t)
+            exceptions.append(datetime.combine(excluded.date(), start.time()) if len(t) == 8 else round_quarter(excluded))
+
+    return spec, (*parse_rrule(first(event, 'RRULE'), start), tuple(exceptions))
+
+def read_ics(path: str, invalid: list[str] = None) -> Iterator[tuple[EventSpec, Repeat | None]]:
+    with open(path, encoding='utf-8', errors='replace') as f:
+        for n, event in enumerate(iter_vevents(f), 1):
+            try:
+                yield to_spec(event)
+            except ValueError as e:
+                if invalid is not None:
+                    invalid.append(f"Event {n} ({unescape(first(event, 'SUMMARY')).strip() or 'untitled'}): {e}")
+
+def rrule(frequency: str, interval: int, weekdays: tuple[int, ...], until: datetime | None, count: int | None) -> str:
+    parts = [f'FREQ={frequency.upper()}']
+
+    if interval > 1:
+        parts.append(f'INTERVAL={interval}')
+
+    if frequency == 'weekly':
+        parts.append('BYDAY=' + ','.join(WEEKDAYS[d] for d in weekdays))
+
+    if until is not None:
+        parts.append(f'UNTIL={until - timedelta(minutes=1):%Y%m%dT%H%M%S}')
+
+    if count is not None:
+        parts.append(f'COUNT={count}')
+
+    return ';'.join(parts)
+
+def ics_lines(records: Iterable[Record], rules: Iterable[RuleRecord] = ()) -> Iterator[str]:
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    yield 'BEGIN:VCALENDAR\r\n'
+    yield 'VERSION:2.0\r\n'
+    yield 'PRODID:-//BMCS1033//Calendar//EN\r\n'
+
+    for event_id, start, hours, minutes, name, description, priority, *repeat in heapq.merge(records, rules, key=itemgetter(1)):
+        end = start + timedelta(minutes=15 * (hours * 4 + minutes))
+        yield 'BEGIN:VEVENT\r\n'
+        yield fold(f'UID:{event_id}@calendar')
+        yield f'DTSTAMP:{stamp}\r\n'
+        yield f'DTSTART:{start:%Y%m%dT%H%M%S}\r\n'
+        yield f'DTEND:{end:%Y%m%dT%H%M%S}\r\n'
+
+        if repeat:
+            *rule, exceptions = repeat
+            yield fold(f'RRULE:{rrule(*rule)}')
+
+            if exceptions:
+                yield fold('EXDATE:' + ','.join(f'{t:%Y%m%dT%H%M%S}' for t in exceptions))
+
+        yield fold(f'SUMMARY:{escape(name)}')
+
+        if description.strip():
+            yield fold(f'DESCRIPTION:{escape(description.rstrip())}')
+
+        if priority > 0:
+            yield f'PRIORITY:{ics_priority(priority)}\r\n'
+
+        yield 'END:VEVENT\r\n'
+
+    yield 'END:VCALENDAR\r\n'
+
+def csv_rows(rows: Iterable[tuple[Record, bool]]) -> Iterator[list]:
+    yield ['id', 'start', 'end', 'hours', 'minutes', 'name', 'description', 'priority', 'rule']
+
+    for (item_id, start, hours, minutes, name, description, priority), recurring in rows:
+        end = start + timedelta(minutes=15 * (hours * 4 + minutes))
+        yield ['' if recurring else item_id, start.isoformat(), end.isoformat(), hours, minutes * 15, name, description.rstrip('\n'), priority, item_id if recurring else '']
+
+def active_rules(store: CalendarStore, start: datetime, end: datetime) -> list[RuleRecord]:
+    with store.lock:
+        return sorted((rule.record(rule_id) for rule_id, rule in store.rules.items() if next(rule.occurrences(max(start, rule.start), end), None) is not None), key=itemgetter(1))
+
+def expand_rules(store: CalendarStore, start: datetime, end: datetime) -> Iterator[Record]:
+    horizon = max(start, datetime.now()) + HORIZON
+
+    with store.lock:
+        rules = list(store.rules.items())
+
+    def expand(rule_id, rule):
+        stop = horizon if end == datetime.max and rule.until is None and rule.count is None else end
+
+        for t in rule.occurrences(max(start, rule.start), stop):
+            yield rule_id, t, rule.hours, rule.minutes, rule.name, rule.description, rule.priority
+
+    return heapq.merge(*(expand(rule_id, rule) for rule_id, rule in rules), key=itemgetter(1))
+
+def export(store: CalendarStore, out, format: str = 'ics', start: datetime = datetime.min, end: datetime = datetime.max) -> int:
+    count = 0
+
+    def counted(items):
+        nonlocal count
+
+        for item in items:
+            count += 1
+            yield item
+
+    match format:
+        case 'ics':
+            out.writelines(ics_lines(counted(store.iter_range(start, end)), counted(active_rules(store, start, end))))
+        case 'csv':
+            rows = heapq.merge(((r, False) for r in store.iter_range(start, end)), ((o, True) for o in expand_rules(store, start, end)), key=lambda row: row[0][1])
+            csv.writer(out).writerows(csv_rows(counted(rows)))
+
+    return count
+
+def import_ics(store: CalendarStore, path: str, policy: str = 'skip', invalid: list[str] = None) -> dict[str, float]:
+    invalid = [] if invalid is None else invalid
+    begin = time.perf_counter()
+    events = []
+    rules = []
+
+    for spec, repeat in read_ics(path, invalid):
+        if repeat is None:
+            events.append(spec)
+        else:
+            rules.append((*spec, *repeat))
+
+    added, skipped, replaced = store.add_many(events, policy)
+    rules_added = 0
+
+    for rule in rules:
+        conflicts = store.rule_conflicts(Recurrence(*rule)).values()
+        accept = policy == 'replace' or (policy == 'higher' and all(e.priority < rule[5] for e in conflicts))
+
+        if store.add_rule(*rule, on_conflict=lambda _: accept) is None:
+            skipped += 1
+        else:
+            rules_added += 1
+            replaced += len(conflicts)
+
+    seconds = time.perf_counter() - begin
+
+    return {
+        "added": added,
+        "skipped": skipped,
+        "replaced": replaced,
+        "rules": rules_added,
+        "invalid": len(invalid),
+        "seconds": seconds,
+        "events_per_second": (added + skipped + rules_added) / seconds if seconds > 0 else 0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Import and export calendar events")
+    commands = parser.add_subparsers(dest='command', required=True)
+    importer = commands.add_parser('import', help="import events from an iCalendar file")
+    importer.add_argument('path')
+    importer.add_argument('--policy', choices=POLICIES, default='skip', help="how to resolve conflicts with existing events")
+    exporter = commands.add_parser('export', help="export a range of events as iCalendar or CSV")
+    exporter.add_argument('--format', choices=['ics', 'csv'], default='ics')
+    exporter.add_argument('--start', type=datetime.fromisoformat, default=datetime.min, help="ISO date or time, inclusive")
+    exporter.add_argument('--end', type=datetime.fromisoformat, default=datetime.max, help="ISO date or time, exclusive, CSV expands open-ended recurring events for a year by default")
+    exporter.add_argument('-o', '--output', help="file to write, standard output by default")
+    args = parser.parse_args()
+
+    store = CalendarStore(SqliteStore() if os.environ.get("CALENDAR_STORAGE") == "sqlite" else Journal())
+    store.load()
+
+    try:
+        match args.command:
+            case 'import':
+                invalid = []
+                stats = import_ics(store, args.path, args.policy, invalid)
+
+                for message in invalid:
+                    print(f"Skipped invalid {message}", file=sys.stderr)
+
+                print(f"Imported {stats['added']} events and {stats['rules']} recurring events ({stats['skipped']} skipped, {stats['replaced']} replaced, {stats['invalid']} invalid) in {stats['seconds']:.2f}s, {stats['events_per_second']:.0f} events/s")
+            case 'export':
+                if args.output is None:
+                    try:
+                        export(store, sys.stdout, args.format, args.start, args.end)
+                        sys.stdout.flush()
+                    except BrokenPipeError:
+                        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+                else:
+                    with open(args.output, 'w', encoding='utf-8', newline='') as f:
+                        count = export(store, f, args.format, args.start, args.end)
+
+                    print(f"Exported {count} events to {args.output}", file=sys.stderr)
+    finally:
+        store.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+from collections.abc import Callable
+from functools import wraps
+import cProfile
+import json
+import time
+import os
+
+PROFILE = 'profile.json'
+BUCKETS = 32
+
+class Histogram:
+    count: int
+    total: float
+    worst: float
+    buckets: list[int]
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.worst = 0.0
+        self.buckets = [0] * BUCKETS
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.worst = max(self.worst, seconds)
+        self.buckets[min(BUCKETS - 1, int(seconds * 1e6).bit_length())] += 1
+
+    def percentile(self, q: float) -> float:
+        seen = 0
+
+        for i, n in enumerate(self.buckets):
+            seen += n
+
+            if seen >= q * self.count:
+                return min(self.worst, 2 ** i / 1e6)
+
+        return self.worst
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "total_seconds": self.total,
+            "mean_seconds": self.total / self.count if self.count else 0,
+            "p50_seconds": self.percentile(0.5),
+            "p99_seconds": self.percentile(0.99),
+            "max_seconds": self.worst,
+            "buckets": {f"<{2 ** i}us": n for i, n in enumerate(self.buckets) if n},
+        }
+
+histograms: dict[str, Histogram] = {}
+enabled = False
+output: str = None
+profiler: cProfile.Profile = None
+
+def enable(path: str = PROFILE):
+    global enabled, output, profiler
+    enabled = True
+    output = path
+
+    if path.endswith(('.prof', '.pstats')) and profiler is None:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+def record(name: str, seconds: float):
+    h = histograms.get(name)
+
+    if h is None:
+        h = histograms[name] = Histogram()
+
+    h.add(seconds)
+
+def timed(name: str) -> Callable[[Callable], Callable]:
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return f(*args, **kwargs)
+
+            begin = time.perf_counter()
+
+            try:
+                return f(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - begin)
+
+        return wrapper
+
+    return decorator
+
+def report() -> str:
+    lines = [f"{'':<18} {'count':>7} {'mean':>9} {'p50':>9} {'p99':>9} {'max':>9}"]
+
+    for name, h in sorted(histograms.items(), key=lambda item: -item[1].total):
+        lines.append(f"{name:<18} {h.count:>7}" + "".join(f" {s * 1000:7.2f}ms" for s in (h.total / h.count, h.percentile(0.5), h.percentile(0.99), h.worst)))
+
+    return '\n'.join(lines)
+
+def dump(path: str = None):
+    path = output if path is None else path
+
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(path)
+        path = os.path.splitext(path)[0] + '.json'
+
+    with open(path, 'w') as f:
+        json.dump({name: h.summary() for name, h in histograms.items()}, f, indent=4)
+
+if os.environ.get("CALENDAR_PROFILE"):
+    enable(os.environ["CALENDAR_PROFILE"] if os.environ["CALENDAR_PROFILE"] != '1' else PROFILE)
@@ -0,0 +1,234 @@
+from datetime import datetime, timedelta
+from collections.abc import Callable, Iterator
+from collections import OrderedDict
+from typing import Any
+from engine import CalendarStore, Event
+from perf import timed
+import threading
+
+def get_week(date) -> tuple[datetime, datetime]:
+    date -= timedelta(days=date.weekday())
+    return (date, date + timedelta(days=6))
+
+def get_first_day_of_month(date) -> datetime:
+    return date - timedelta(days=date.day - 1)
+
+@timed("render.daily")
+def daily_cells(store: CalendarStore, day: datetime) -> list[Event]:
+    day_end = day + timedelta(days=1)
+    cells: list[Event] = [None] * (24 * 4)
+
+    for e in sorted(store.events(day, day_end), key=lambda e: (e.priority, e.start)):
+        time = max(e.start, day)
+
+        while time < e.end() and time < day_end:
+            cells[(time - day) // timedelta(minutes=15)] = e
+            time += timedelta(minutes=15)
+
+    return cells
+
+def spread(occurrences: list[Event], start: datetime, size: timedelta, n: int) -> dict[int, list[Event]]:
+    buckets = {}
+
+    for o in occurrences:
+        for i in range(max(0, (o.start - start) // size), min(n, -((start - o.end()) // size))):
+            buckets.setdefault(i, []).append(o)
+
+    return buckets
+
+@timed("render.weekly")
+def weekly_cells(store: CalendarStore, start: datetime) -> list[list[Event]]:
+    store.ensure(start, start + timedelta(days=7))
+    occurrences = spread(store.occurrences(start, start + timedelta(days=7)), start, timedelta(hours=1), 7 * 24)
+    cells = []
+
+    for d in range(7):
+        column = []
+
+        for h in range(24):
+            e = store.hour_rollup.winner(start + timedelta(days=d, hours=h))
+            e = None if e is None else store[e]
+
+            for o in occurrences.get(d * 24 + h, ()):
+                if e is None or (o.priority, o.start) > (e.priority, e.start):
+                    e = o
+
+            column.append(e)
+
+        cells.append(column)
+
+    return cells
+
+@timed("render.monthly")
+def monthly_cells(store: CalendarStore, first: datetime, n: int = 3) -> list[tuple[datetime, list[Event], int]]:
+    end = get_first_day_of_month(first + timedelta(days=31))
+    store.ensure(first, end)
+    occurrences = spread(store.occurrences(first, end), first, timedelta(days=1), (end - first).days)
+    cells = []
+    day = first
+
+    while day < end:
+        extra = occurrences.get((day - first).days)
+
+        if extra is None:
+            ids, more = store.day_rollup.top(day, n)
+            cells.append((day, [store[e] for e in ids], more))
+        else:
+            es = sorted([(p, s, store[e]) for p, s, e in store.day_rollup.entries(day)] + [(o.priority, o.start, o) for o in extra], key=lambda e: e[:2])
+            cells.append((day, [e for _, _, e in es[-n:]], max(0, len(es) - n)))
+
+        day += timedelta(days=1)
+
+    return cells
+
+def get_first_day_of_year(date) -> datetime:
+    return date.replace(month=1, day=1)
+
+@timed("render.yearly")
+def yearly_cells(store: CalendarStore, first: datetime) -> list[tuple[datetime, int, int]]:
+    end = first.replace(year=first.year + 1)
+    store.ensure(first, end)
+    occurrences = spread(store.occurrences(first, end), first, timedelta(days=1), (end - first).days)
+    cells = []
+    day = first
+
+    for d in range((end - first).days):
+        next_day = day + timedelta(days=1)
+        minutes = store.day_load.total(day, next_day)
+        es = store.day_rollup.entries(day)
+        priority = es[-1][0] if es else -1
+
+        for o in occurrences.get(d, ()):
+            minutes += (min(o.end(), next_day) - max(o.start, day)) // timedelta(minutes=1)
+            priority = max(priority, o.priority)
+
+        cells.append((day, minutes, priority))
+        day = next_day
+
+    return cells
+
+MODELS = {"Daily": daily_cells, "Weekly": weekly_cells, "Monthly": monthly_cells, "Yearly": yearly_cells}
+
+def period_start(mode: str, time: datetime) -> datetime:
+    match mode:
+        case "Daily":
+            return time
+        case "Weekly":
+            return get_week(time)[0]
+        case "Monthly":
+            return get_first_day_of_month(time)
+        case "Yearly":
+            return get_first_day_of_year(time)
+
+def period_end(mode: str, start: datetime) -> datetime:
+    match mode:
+        case "Daily":
+            return start + timedelta(days=1)
+        case "Weekly":
+            return start + timedelta(weeks=1)
+        case "Monthly":
+            return get_first_day_of_month(start + timedelta(days=31))
+        case "Yearly":
+            return start.replace(year=start.year + 1)
+
+def adjacent(mode: str, start: datetime) -> tuple[datetime, datetime]:
+    match mode:
+        case "Daily":
+            return start - timedelta(days=1), start + timedelta(days=1)
+        case "Weekly":
+            return start - timedelta(weeks=1), start + timedelta(weeks=1)
+        case "Monthly":
+            return get_first_day_of_month(start - timedelta(days=1)), get_first_day_of_month(start + timedelta(days=31))
+        case "Yearly":
+            return start.replace(year=start.year - 1), start.replace(year=start.year + 1)
+
+def cell_events(mode: str, cells: Any) -> Iterator[Event]:
+    match mode:
+        case "Daily":
+            yield from cells
+        case "Weekly":
+            for column in cells:
+                yield from column
+        case "Monthly":
+            for _, es, _ in cells:
+                yield from es
+
+class Prefetcher:
+    store: CalendarStore
+    warm: Callable[[Event], Any]
+    capacity: int
+    models: OrderedDict[tuple[str, datetime], tuple[int, Any]]
+    wanted: list[tuple[str, datetime]]
+    condition: threading.Condition
+    stopped: bool
+    thread: threading.Thread
+    error: Exception
+
+    def __init__(self, store: CalendarStore, warm: Callable[[Event], Any] = lambda e: None, capacity: int = 8):
+        self.store = store
+        self.warm = warm
+        self.capacity = capacity
+        self.models = OrderedDict()
+        self.wanted = []
+        self.condition = threading.Condition()
+        self.stopped = False
+        self.thread = threading.Thread(target=self.run, name="prefetch", daemon=True)
+        self.error = None
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+
+        self.thread.join()
+
+    def cells(self, mode: str, start: datetime) -> Any:
+        with self.condition:
+            model = self.models.get((mode, start))
+
+        if model is not None and model[0] == self.store.version:
+            return model[1]
+
+        return MODELS[mode](self.store, start)
+
+    def prefetch(self, mode: str, start: datetime):
+        if mode not in MODELS:
+            return
+
+        with self.condition:
+            self.wanted = [(mode, s) for s in adjacent(mode, start) if self.models.get((mode, s), (None,))[0] != self.store.version]
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.wanted and not self.stopped:
+                    self.condition.wait()
+
+                if self.stopped:
+                    return
+
+                key = self.wanted.pop(0)
+
+            mode, start = key
+
+            try:
+                snapshot = self.store.snapshot(start, period_end(mode, start))
+                cells = MODELS[mode](snapshot, start)
+
+                for e in cell_events(mode, cells):
+                    if e is not None:
+                        self.warm(e)
+            except Exception as e:
+                self.error = e
+                continue
+
+            with self.condition:
+                self.models[key] = (snapshot.version, cells)
+                self.models.move_to_end(key)
+
+                if len(self.models) > self.capacity:
+                    self.models.popitem(last=False)
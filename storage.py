@@ -0,0 +1,610 @@
+from datetime import datetime, timedelta
+from collections.abc import Iterable, Iterator
+from collections import OrderedDict
+from itertools import chain
+from typing import Any
+from perf import timed
+import threading
+import sqlite3
+import struct
+import json
+import mmap
+import os
+
+SNAPSHOT = 'calendar.snap'
+LEGACY_SNAPSHOT = 'calendar.json'
+JOURNAL = 'calendar.journal'
+DATABASE = 'calendar.db'
+
+EPOCH = datetime(1970, 1, 1)
+SNAPSHOT_MAGIC = b'CALS'
+SNAPSHOT_VERSION = 3
+SNAPSHOT_HEADERS = {1: struct.Struct('<4sHxxQII'), 2: struct.Struct('<4sHxxQIIII'), 3: struct.Struct('<4sHxxQIIII')}
+SNAPSHOT_EVENTS = {1: struct.Struct('<dqIIII'), 2: struct.Struct('<dqIIII'), 3: struct.Struct('<QqIIII')}
+SNAPSHOT_RULES = {2: struct.Struct('<dqqIIIIIIBBH'), 3: struct.Struct('<QqqIIIIIIBBH')}
+NO_UNTIL = -2 ** 63
+
+FREQUENCIES = ['daily', 'weekly', 'monthly']
+
+Record = tuple[int, datetime, int, int, str, str, int]
+RuleRecord = tuple[int, datetime, int, int, str, str, int, str, int, tuple[int, ...], datetime | None, int | None, tuple[datetime, ...]]
+
+def to_minutes(time: datetime) -> int:
+    return (time - EPOCH) // timedelta(minutes=1)
+
+def from_minutes(minutes: int) -> datetime:
+    return EPOCH + timedelta(minutes=minutes)
+
+def event_record(start: datetime, hours: int, minutes: int, name: str, description: str, priority: int) -> dict[str, Any]:
+    return {
+        "start": start.isoformat(),
+        "hours": hours,
+        "minutes": minutes,
+        "name": name,
+        "description": description,
+        "priority": priority,
+    }
+
+def rule_record(start: datetime, hours: int, minutes: int, name: str, description: str, priority: int, frequency: str, interval: int, weekdays: tuple[int, ...], until: datetime | None, count: int | None, exceptions: tuple[datetime, ...]) -> dict[str, Any]:
+    return {
+        **event_record(start, hours, minutes, name, description, priority),
+        "frequency": frequency,
+        "interval": interval,
+        "weekdays": list(weekdays),
+        "until": None if until is None else until.isoformat(),
+        "count": count,
+        "exceptions": [t.isoformat() for t in exceptions],
+    }
+
+def parse_rule(rule_id: int, r: dict[str, Any]) -> RuleRecord:
+    return (
+        rule_id,
+        datetime.fromisoformat(r["start"]),
+        r["hours"],
+        r["minutes"],
+        r["name"],
+        r["description"],
+        r["priority"],
+        r["frequency"],
+        r["interval"],
+        tuple(r["weekdays"]),
+        None if r["until"] is None else datetime.fromisoformat(r["until"]),
+        r["count"],
+        tuple(datetime.fromisoformat(t) for t in r["exceptions"]),
+    )
+
+def write_atomic(path: str, write, mode: str = 'w'):
+    temp = path + '.tmp'
+
+    with open(temp, mode) as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(temp, path)
+
+def read_snapshot(path: str = SNAPSHOT) -> tuple[int, int, Iterator[Record], list[RuleRecord]]:
+    with open(path, 'rb') as f:
+        m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    try:
+        magic, version = struct.unpack_from('<4sH', m)
+
+        if magic != SNAPSHOT_MAGIC or version not in SNAPSHOT_HEADERS:
+            raise ValueError(f"{path} is not a version {min(SNAPSHOT_HEADERS)}-{max(SNAPSHOT_HEADERS)} calendar snapshot")
+
+        header = SNAPSHOT_HEADERS[version]
+        event = SNAPSHOT_EVENTS[version]
+        rule = SNAPSHOT_RULES.get(version)
+        _, _, seq, count, string_count, *extra = header.unpack_from(m)
+        rule_count, exception_count = extra or (0, 0)
+        rules_offset = header.size + count * event.size
+        exceptions_offset = rules_offset + rule_count * (0 if rule is None else rule.size)
+        offset = exceptions_offset + exception_count * 8
+        offsets = struct.unpack_from(f'<{string_count + 1}I', m, offset)
+        offset += (string_count + 1) * 4
+        strings = [str(m[offset + offsets[i]:offset + offsets[i + 1]], 'utf-8') for i in range(string_count)]
+        exceptions = iter(struct.unpack_from(f'<{exception_count}q', m, exceptions_offset))
+        rules = []
+
+        for rule_id, start, until, quarters, priority, name, description, repeat, n, frequency, weekdays, interval in (rule.iter_unpack(m[rules_offset:exceptions_offset]) if rule_count else ()):
+            rules.append((
+                rule_id,
+                from_minutes(start),
+                quarters // 4,
+                quarters % 4,
+                strings[name],
+                strings[description],
+                priority,
+                FREQUENCIES[frequency],
+                interval,
+                tuple(d for d in range(7) if weekdays >> d & 1),
+                None if until == NO_UNTIL else from_minutes(until),
+                repeat or None,
+                tuple(from_minutes(next(exceptions)) for _ in range(n)),
+            ))
+    except Exception:
+        m.close()
+        raise
+
+    def records():
+        with m, memoryview(m) as view:
+            for event_id, start, quarters, priority, name, description in event.iter_unpack(view[header.size:rules_offset]):
+                yield (event_id, from_minutes(start), quarters // 4, quarters % 4, strings[name], strings[description], priority)
+
+    return seq, count, records(), rules
+
+@timed("storage.snapshot")
+def write_snapshot(records: Iterable[Record], seq: int, path: str = SNAPSHOT, rules: Iterable[RuleRecord] = ()):
+    strings: dict[str, int] = {}
+    events = bytearray()
+    packed = bytearray()
+    exceptions = []
+    count = 0
+    rule_count = 0
+
+    def intern(s: str) -> int:
+        return strings.setdefault(s, len(strings))
+
+    for event_id, start, hours, minutes, name, description, priority in records:
+        events += SNAPSHOT_EVENTS[SNAPSHOT_VERSION].pack(event_id, to_minutes(start), hours * 4 + minutes, priority, intern(name), intern(description))
+        count += 1
+
+    for rule_id, start, hours, minutes, name, description, priority, frequency, interval, weekdays, until, repeat, skipped in rules:
+        packed += SNAPSHOT_RULES[SNAPSHOT_VERSION].pack(
+            rule_id,
+            to_minutes(start),
+            NO_UNTIL if until is None else to_minutes(until),
+            hours * 4 + minutes,
+            priority,
+            intern(name),
+            intern(description),
+            repeat or 0,
+            len(skipped),
+            FREQUENCIES.index(frequency),
+            sum(1 << d for d in set(weekdays)),
+            interval,
+        )
+        exceptions += (to_minutes(t) for t in skipped)
+        rule_count += 1
+
+    blob = [s.encode() for s in strings]
+    offsets = [0]
+
+    for b in blob:
+        offsets.append(offsets[-1] + len(b))
+
+    def write(f):
+        f.write(SNAPSHOT_HEADERS[SNAPSHOT_VERSION].pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, seq, count, len(blob), rule_count, len(exceptions)))
+        f.write(events)
+        f.write(packed)
+        f.write(struct.pack(f'<{len(exceptions)}q', *exceptions))
+        f.write(struct.pack(f'<{len(offsets)}I', *offsets))
+        f.writelines(blob)
+
+    write_atomic(path, write, 'wb')
+
+def read_json(source: str = LEGACY_SNAPSHOT) -> tuple[int, Iterator[Record]]:
+    with open(source) as f:
+        d = json.load(f)
+
+    return d.get("seq", 0), ((
+        float(event_id),
+        datetime.fromisoformat(e["start"]),
+        e["hours"],
+        e["minutes"],
+        e["name"],
+        e["description"],
+        e["priority"],
+    ) for event_id, e in d["events"].items())
+
+def load_snapshot(path: str = SNAPSHOT, legacy: str = LEGACY_SNAPSHOT) -> tuple[int, Iterator[Record], list[RuleRecord]]:
+    if not os.path.exists(path):
+        if not os.path.exists(legacy):
+            return 0, iter(()), []
+
+        seq, records = read_json(legacy)
+        return seq, records, []
+
+    seq, _, records, rules = read_snapshot(path)
+    return seq, records, rules
+
+class Journal:
+    lazy = False
+    path: str
+    snapshot: str
+    threshold: int
+    seq: int
+    size: int
+    last_id: int
+    pending: list[str]
+    lock: threading.Lock
+    io: threading.Lock
+
+    def __init__(self, path: str = JOURNAL, snapshot: str = SNAPSHOT, threshold: int = 1000):
+        self.path = path
+        self.snapshot = snapshot
+        self.threshold = threshold
+        self.seq = 0
+        self.size = 0
+        self.last_id = 0
+        self.pending = []
+        self.lock = threading.Lock()
+        self.io = threading.Lock()
+        self.file = None
+
+    def load(self) -> tuple[Iterable[Record], Iterable[RuleRecord]]:
+        self.seq, records, snapshot_rules = load_snapshot(self.snapshot)
+        events = {r[0]: r for r in records}
+        rules = {r[0]: r for r in snapshot_rules}
+
+        for r in self.replay(self.seq):
+            match r["op"]:
+                case "add":
+                    events[r["id"]] = (r["id"], datetime.fromisoformat(r["start"]), r["hours"], r["minutes"], r["name"], r["description"], r["priority"])
+                case "update":
+                    events[r["id"]] = (r["id"], events[r["id"]][1], r["hours"], r["minutes"], r["name"], r["description"], r["priority"])
+                case "remove":
+                    events.pop(r["id"])
+                case "rule":
+                    rules[r["id"]] = parse_rule(r["id"], r)
+                case "remove_rule":
+                    rules.pop(r["id"])
+
+        if not all(isinstance(i, int) for i in chain(events, rules)):
+            events = {i: (i, *r[1:]) for i, r in enumerate(sorted(events.values(), key=lambda r: r[1]), 1)}
+            rules = {i: (i, *r[1:]) for i, r in enumerate(rules.values(), len(events) + 1)}
+            write_snapshot(events.values(), self.seq, self.snapshot, rules.values())
+
+            for path in (self.path + '.old', self.path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+        self.last_id = max(chain(events, rules), default=0)
+        return events.values(), rules.values()
+
+    def fetch(self, start: datetime, end: datetime) -> tuple[list[Record], list[tuple[datetime, datetime]]]:
+        return [], []
+
+    def pin(self, start: datetime, end: datetime):
+        pass
+
+    def loaded(self, start: datetime, end: datetime) -> bool:
+        return True
+
+    def replay(self, after: int) -> Iterator[dict[str, Any]]:
+        for path in (self.path + '.old', self.path):
+            try:
+                with open(path) as f:
+                    for line in f:
+                        try:
+                            r = json.loads(line)
+                        except json.JSONDecodeError:
+                            break
+
+                        self.size += 1
+
+                        if r["seq"] > after:
+                            self.seq = r["seq"]
+                            yield r
+            except FileNotFoundError:
+                pass
+
+    def entry(self, op: str, event_id: int, **record):
+        with self.lock:
+            self.seq += 1
+            self.size += 1
+            self.pending.append(json.dumps({"seq": self.seq, "op": op, "id": event_id, **record}) + '\n')
+
+    def add(self, event_id: int, start: datetime, hours: int, minutes: int, name: str, description: str, priority: int):
+        self.entry("add", event_id, **event_record(start, hours, minutes, name, description, priority))
+
+    def update(self, event_id: int, hours: int, minutes: int, name: str, description: str, priority: int):
+        self.entry("update", event_id, hours=hours, minutes=minutes, name=name, description=description, priority=priority)
+
+    def remove(self, event_id: int):
+        self.entry("remove", event_id)
+
+    def add_rule(self, rule: RuleRecord):
+        self.entry("rule", rule[0], **rule_record(*rule[1:]))
+
+    def remove_rule(self, rule_id: int):
+        self.entry("remove_rule", rule_id)
+
+    def add_many(self, records: Iterable[Record]):
+        for event_id, start, hours, minutes, name, description, priority in records:
+            self.entry("add", event_id, **event_record(start, hours, minutes, name, description, priority))
+
+    def remove_many(self, event_ids: Iterable[int]):
+        for event_id in event_ids:
+            self.entry("remove", event_id)
+
+    def write(self, lines: list[str]):
+        if lines:
+            if self.file is None:
+                self.file = open(self.path, 'a')
+
+            self.file.writelines(lines)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def flush(self):
+        with self.io:
+            with self.lock:
+                lines, self.pending = self.pending, []
+
+            self.write(lines)
+
+    def should_compact(self) -> bool:
+        return self.size >= self.threshold
+
+    def checkpoint(self) -> tuple[int, list[str]]:
+        self.io.acquire()
+
+        with self.lock:
+            lines, self.pending = self.pending, []
+            self.size = 0
+            return self.seq, lines
+
+    def compact(self, records: list[Record], rules: list[RuleRecord], checkpoint: tuple[int, list[str]]):
+        seq, lines = checkpoint
+
+        try:
+            self.write(lines)
+
+            if not os.path.exists(self.path + '.old'):
+                if self.file is not None:
+                    self.file.close()
+                    self.file = None
+
+                if os.path.exists(self.path):
+                    os.replace(self.path, self.path + '.old')
+
+            write_snapshot(records, seq, self.snapshot, rules)
+
+            try:
+                os.remove(self.path + '.old')
+            except FileNotFoundError:
+                pass
+        finally:
+            self.io.release()
+
+    def close(self):
+        self.flush()
+
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+class SqliteStore:
+    lazy = True
+    path: str
+    chunk: timedelta
+    margin: timedelta
+    capacity: int
+    pending: int
+    chunks: OrderedDict[int, None]
+    pinned: range
+    last_id: int
+    lock: threading.RLock
+
+    def __init__(self, path: str = DATABASE, chunk: timedelta = timedelta(days=7), margin: timedelta = timedelta(days=7), capacity: int = 16):
+        exists = os.path.exists(path)
+        self.path = path
+        self.chunk = chunk
+        self.margin = margin
+        self.capacity = capacity
+        self.pending = 0
+        self.chunks = OrderedDict()
+        self.pinned = range(0)
+        self.lock = threading.RLock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        indexed = self.db.execute("SELECT 1 FROM sqlite_master WHERE name = 'events_search'").fetchone() is not None
+        legacy = self.db.execute("SELECT 1 FROM pragma_table_info('events') WHERE name = 'id' AND type = 'REAL'").fetchone() is not None
+
+        if legacy:
+            self.db.executescript("""
+                DROP TRIGGER IF EXISTS events_insert;
+                DROP TRIGGER IF EXISTS events_delete;
+                DROP TRIGGER IF EXISTS events_update;
+                DROP TABLE IF EXISTS events_search;
+                DROP INDEX IF EXISTS events_start;
+                DROP INDEX IF EXISTS events_end;
+                CREATE TABLE IF NOT EXISTS rules (id REAL PRIMARY KEY, rule TEXT NOT NULL);
+                ALTER TABLE events RENAME TO legacy_events;
+                ALTER TABLE rules RENAME TO legacy_rules;
+            """)
+
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY,
+                start INTEGER NOT NULL,
+                end INTEGER NOT NULL,
+                quarters INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                description TEXT NOT NULL,
+                priority INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS events_start ON events (start);
+            CREATE INDEX IF NOT EXISTS events_end ON events (end);
+            CREATE TABLE IF NOT EXISTS rules (
+                id INTEGER PRIMARY KEY,
+                rule TEXT NOT NULL
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS events_search USING fts5 (name, description, content='events');
+            CREATE TRIGGER IF NOT EXISTS events_insert AFTER INSERT ON events BEGIN
+                INSERT INTO events_search (rowid, name, description) VALUES (new.rowid, new.name, new.description);
+            END;
+            CREATE TRIGGER IF NOT EXISTS events_delete AFTER DELETE ON events BEGIN
+                INSERT INTO events_search (events_search, rowid, name, description) VALUES ('delete', old.rowid, old.name, old.description);
+            END;
+            CREATE TRIGGER IF NOT EXISTS events_update AFTER UPDATE ON events BEGIN
+                INSERT INTO events_search (events_search, rowid, name, description) VALUES ('delete', old.rowid, old.name, old.description);
+                INSERT INTO events_search (rowid, name, description) VALUES (new.rowid, new.name, new.description);
+            END;
+        """)
+
+        if legacy:
+            self.db.executescript("""
+                INSERT INTO events SELECT row_number() OVER (ORDER BY start, id), start, end, quarters, name, description, priority FROM legacy_events;
+                INSERT INTO rules SELECT (SELECT count(*) FROM legacy_events) + row_number() OVER (ORDER BY id), rule FROM legacy_rules;
+                DROP TABLE legacy_events;
+                DROP TABLE legacy_rules;
+            """)
+            self.db.commit()
+        elif exists and not indexed:
+            self.db.execute("INSERT INTO events_search (events_search) VALUES ('rebuild')")
+            self.db.commit()
+
+        if not exists:
+            records, rules = Journal().load()
+            self.db.executemany("INSERT INTO events VALUES (?, ?, ?, ?, ?, ?, ?)", (
+                (event_id, to_minutes(start), to_minutes(start) + 15 * (hours * 4 + minutes), hours * 4 + minutes, name, description, priority)
+                for event_id, start, hours, minutes, name, description, priority in records
+            ))
+            self.db.executemany("INSERT INTO rules VALUES (?, ?)", ((rule_id, json.dumps(rule_record(*rule))) for rule_id, *rule in rules))
+            self.db.commit()
+
+        self.last_id = self.db.execute("SELECT max(coalesce((SELECT max(id) FROM events), 0), coalesce((SELECT max(id) FROM rules), 0))").fetchone()[0]
+
+    def load(self) -> tuple[Iterable[Record], Iterable[RuleRecord]]:
+        return (), [parse_rule(rule_id, json.loads(rule)) for rule_id, rule in self.db.execute("SELECT id, rule FROM rules")]
+
+    def chunk_range(self, start: datetime, end: datetime) -> range:
+        size = self.chunk // timedelta(minutes=1)
+        return range(to_minutes(start) // size, -(-to_minutes(end) // size))
+
+    def loaded(self, start: datetime, end: datetime) -> bool:
+        return any(c in self.chunks for c in self.chunk_range(start, end))
+
+    def fetch(self, start: datetime, end: datetime) -> tuple[list[Record], list[tuple[datetime, datetime]]]:
+        size = self.chunk // timedelta(minutes=1)
+        wanted = self.chunk_range(start - self.margin, end + self.margin)
+        records = []
+
+        for c in wanted:
+            if c in self.chunks:
+                self.chunks.move_to_end(c)
+            else:
+                self.chunks[c] = None
+                records += (
+                    (event_id, from_minutes(s), quarters // 4, quarters % 4, name, description, priority)
+                    for event_id, s, quarters, name, description, priority in self.db.execute(
+                        "SELECT id, start, quarters, name, description, priority FROM events WHERE start < ? AND end > ?",
+                        ((c + 1) * size, c * size),
+                    )
+                )
+
+        evicted = []
+        excess = len(self.chunks) - self.capacity
+
+        for c in [c for c in self.chunks if c not in wanted and c not in self.pinned][:max(0, excess)]:
+            del self.chunks[c]
+            evicted.append((from_minutes(c * size), from_minutes((c + 1) * size)))
+
+        return records, evicted
+
+    def pin(self, start: datetime, end: datetime):
+        self.pinned = self.chunk_range(start - self.margin, end + self.margin)
+
+    def scan(self, start: datetime, end: datetime) -> Iterator[Record]:
+        for event_id, s, quarters, name, description, priority in self.db.execute(
+            "SELECT id, start, quarters, name, description, priority FROM events WHERE start < ? AND end > ? ORDER BY start",
+            (to_minutes(end), to_minutes(start)),
+        ):
+            yield (event_id, from_minutes(s), quarters // 4, quarters % 4, name, description, priority)
+
+    def columns(self, start: datetime, end: datetime) -> Iterator[tuple[int, int, int]]:
+        return self.db.execute("SELECT start, end, priority FROM events WHERE start < ? AND end > ? ORDER BY start", (to_minutes(end), to_minutes(start)))
+
+    def walk(self, time: datetime, inclusive: bool, reverse: bool = False, page: int = 256) -> Iterator[Record]:
+        order = 'DESC' if reverse else 'ASC'
+        where = f"start {'<' if reverse else '>'}{'=' if inclusive else ''} ?"
+        parameters = (to_minutes(time),)
+
+        while True:
+            rows = self.db.execute(
+                f"SELECT id, start, quarters, name, description, priority FROM events WHERE {where} ORDER BY start {order}, id {order} LIMIT ?",
+                (*parameters, page),
+            ).fetchall()
+
+            for event_id, s, quarters, name, description, priority in rows:
+                yield (event_id, from_minutes(s), quarters // 4, quarters % 4, name, description, priority)
+
+            if len(rows) < page:
+                return
+
+            where = f"(start, id) {'<' if reverse else '>'} (?, ?)"
+            parameters = (rows[-1][1], rows[-1][0])
+
+    def bounds(self) -> tuple[datetime, datetime]:
+        start, end = self.db.execute("SELECT min(start), max(end) FROM events").fetchone()
+        return None if start is None else (from_minutes(start), from_minutes(end))
+
+    def search(self, terms: list[str], around: datetime, limit: int) -> list[Record]:
+        if not terms:
+            return []
+
+        minutes = to_minutes(around)
+        return [
+            (event_id, from_minutes(s), quarters // 4, quarters % 4, name, description, priority)
+            for event_id, s, quarters, name, description, priority in self.db.execute(
+                "SELECT e.id, e.start, e.quarters, e.name, e.description, e.priority FROM events_search JOIN events e ON e.rowid = events_search.rowid "
+                "WHERE events_search MATCH ? ORDER BY abs(e.start - ?) / 1440, -e.priority, abs(e.start - ?) LIMIT ?",
+                (' '.join(f'"{t}"*' for t in terms), minutes, minutes, limit),
+            )
+        ]
+
+    def execute(self, sql: str, parameters: tuple):
+        with self.lock:
+            self.db.execute(sql, parameters)
+            self.pending += 1
+
+    def add(self, event_id: int, start: datetime, hours: int, minutes: int, name: str, description: str, priority: int):
+        quarters = hours * 4 + minutes
+        self.execute("INSERT INTO events VALUES (?, ?, ?, ?, ?, ?, ?)", (event_id, to_minutes(start), to_minutes(start) + 15 * quarters, quarters, name, description, priority))
+
+    def update(self, event_id: int, hours: int, minutes: int, name: str, description: str, priority: int):
+        quarters = hours * 4 + minutes
+        self.execute("UPDATE events SET end = start + ?, quarters = ?, name = ?, description = ?, priority = ? WHERE id = ?", (15 * quarters, quarters, name, description, priority, event_id))
+
+    def remove(self, event_id: int):
+        self.execute("DELETE FROM events WHERE id = ?", (event_id,))
+
+    def add_rule(self, rule: RuleRecord):
+        self.execute("INSERT OR REPLACE INTO rules VALUES (?, ?)", (rule[0], json.dumps(rule_record(*rule[1:]))))
+
+    def remove_rule(self, rule_id: int):
+        self.execute("DELETE FROM rules WHERE id = ?", (rule_id,))
+
+    def add_many(self, records: Iterable[Record]):
+        with self.lock:
+            self.db.executemany("INSERT INTO events VALUES (?, ?, ?, ?, ?, ?, ?)", (
+                (event_id, to_minutes(start), to_minutes(start) + 15 * (hours * 4 + minutes), hours * 4 + minutes, name, description, priority)
+                for event_id, start, hours, minutes, name, description, priority in records
+            ))
+            self.pending += 1
+
+    def remove_many(self, event_ids: Iterable[int]):
+        with self.lock:
+            self.db.executemany("DELETE FROM events WHERE id = ?", ((event_id,) for event_id in event_ids))
+            self.pending += 1
+
+    def flush(self):
+        with self.lock:
+            if self.pending:
+                self.db.commit()
+                self.pending = 0
+
+    def should_compact(self) -> bool:
+        return False
+
+    def checkpoint(self) -> None:
+        return None
+
+    def compact(self, records: list[Record], rules: list[RuleRecord], checkpoint: None):
+        pass
+
+    def close(self):
+        self.flush()
+        self.db.close()
@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+from engine import PRIORITIES, CalendarStore
+from storage import Journal
+from analytics import report
+import numpy as np
+import random
+
+def test_report_matches_per_minute_count(tmp_path):
+    store = CalendarStore(Journal(str(tmp_path / 'calendar.journal'), str(tmp_path / 'calendar.snap')))
+    store.load()
+    rng = random.Random(25)
+    first = datetime(2024, 3, 1)
+
+    store.add_rule(first + timedelta(hours=7), 1, 2, "Standup", "", 4, 'daily', 2)
+    store.add(first - timedelta(hours=3), 10, 0, "Across the start", "", 2)
+
+    for _ in range(60):
+        store.add(first + timedelta(minutes=15 * rng.randrange(4 * 24 * 25)), rng.randint(0, 9), rng.randrange(4), "Event", "", rng.randrange(len(PRIORITIES)), on_conflict=lambda c: False)
+    start, end = first + timedelta(hours=5), first + timedelta(days=19, hours=13)
+    r = report(store, start, end)
+
+    monday = datetime(2024, 2, 26)
+    weeks = -(-(end - monday) // timedelta(weeks=1))
+    hours = np.zeros((len(PRIORITIES), weeks))
+    by_hour = np.zeros((7, 24))
+    covered = np.zeros(weeks)
+    busy = set()
+    events = store.events(start, end)
+
+    for e in events:
+        t = max(e.start, start)
+
+        while t < min(e.end(), end):
+            week = (t - monday) // timedelta(weeks=1)
+            hours[e.priority, week] += 1 / 60
+            by_hour[t.weekday(), t.hour] += 1 / 60
+
+            if t not in busy:
+                busy.add(t)
+                covered[week] += 1
+
+            t += timedelta(minutes=1)
+
+    week_minutes = [(min(end, monday + timedelta(weeks=w + 1)) - max(start, monday + timedelta(weeks=w))) // timedelta(minutes=1) for w in range(weeks)]
+
+    assert {type(e).__name__ for e in events} == {"Event", "Occurrence"} and events[0].start < start
+    assert r["events"] == len(events)
+    assert r["weeks"] == [monday + timedelta(weeks=w) for w in range(weeks)]
+    assert np.allclose(r["hours"], hours)
+    assert np.allclose(r["hour_of_week"], by_hour)
+    assert np.isclose(r["utilization"], len(busy) / ((end - start) // timedelta(minutes=1)))
+    assert np.allclose(r["weekly_utilization"], covered / week_minutes)
+    assert r["busiest_hour"] == int(np.argmax(by_hour.sum(axis=0)))
+    assert r["busiest_slot"] == tuple(int(i) for i in np.unravel_index(np.argmax(by_hour), by_hour.shape))
@@ -0,0 +1,369 @@
+from datetime import datetime, timedelta
+from engine import IntervalIndex, Rollup, DayLoad, GapIndex, Recurrence, CalendarStore, Loader, Event, Occurrence, sweep
+from storage import Journal
+import pytest
+import random
+
+BASE = datetime(2024, 1, 1)
+
+def random_events(rng: random.Random, n: int) -> list[tuple[datetime, datetime, int, int]]:
+    events = []
+
+    for event_id in range(1, n + 1):
+        start = BASE + timedelta(minutes=15 * rng.randrange(4 * 24 * 20))
+        events.append((start, start + timedelta(minutes=15 * rng.randint(1, 4 * 30)), rng.randrange(11), event_id))
+
+    return events
+
+def overlapping(events, start: datetime, end: datetime) -> list[tuple[int, datetime, int]]:
+    return sorted((p, s, i) for s, e, p, i in events if s < end and e > start)
+
+def disjoint_intervals(rng: random.Random, n: int) -> list[tuple[datetime, datetime, int]]:
+    intervals = []
+    t = BASE
+
+    for event_id in range(1, n + 1):
+        t += timedelta(minutes=15 * rng.randrange(8))
+        end = t + timedelta(minutes=15 * rng.randint(1, 8))
+        intervals.append((t, end, event_id))
+        t = end
+
+    return intervals
+
+def test_interval_index_matches_brute_force():
+    rng = random.Random(1)
+    intervals = disjoint_intervals(rng, 400)
+    shuffled = rng.sample(intervals, len(intervals))
+    index = IntervalIndex(shuffled[:100])
+
+    for s, e, i in shuffled[100:200]:
+        index.insert(s, e, i)
+
+    index.extend(shuffled[200:300])
+    index.extend(sorted(shuffled[300:])[-50:])
+    index.extend(sorted(shuffled[300:])[:-50])
+
+    assert list(index) == intervals
+    last = intervals[-1][1]
+
+    for _ in range(300):
+        start = BASE + timedelta(minutes=5 * rng.randrange((last - BASE) // timedelta(minutes=5) + 10))
+        end = start + timedelta(minutes=5 * rng.randint(1, 40))
+        assert index.overlapping(start, end) == [i for s, e, i in intervals if s < end and e > start]
+        assert index.get(start, 0) == next((i for s, e, i in intervals if s <= start < e), 0)
+
+def test_rollup_matches_brute_force():
+    rng = random.Random(8)
+    events = random_events(rng, 300)
+    day, hour = Rollup(timedelta(days=1)), Rollup(timedelta(hours=1))
+
+    for e in events:
+        day.add(*e)
+        hour.add(*e)
+
+    for e in rng.sample(events, 100):
+        events.remove(e)
+        day.remove(*e)
+        hour.remove(*e)
+
+    for d in range(22):
+        t = BASE + timedelta(days=d)
+        expected = overlapping(events, t, t + timedelta(days=1))
+        assert day.entries(t) == expected
+        assert day.count(t + timedelta(hours=5)) == len(expected)
+        assert day.top(t, 3) == ([i for _, _, i in expected[-3:]], max(0, len(expected) - 3))
+
+    for h in range(24 * 22):
+        t = BASE + timedelta(hours=h)
+        expected = overlapping(events, t, t + timedelta(hours=1))
+        assert hour.winner(t) == (expected[-1][2] if expected else None)
+
+def test_rollup_drops_empty_buckets():
+    rollup = Rollup(timedelta(days=1))
+    event = (BASE + timedelta(hours=20), BASE + timedelta(days=2, hours=1), 3, 1)
+    rollup.add(*event)
+    assert len(rollup.buckets) == 3
+
+    rollup.remove(*event)
+    assert rollup.buckets == {}
+    assert rollup.top(BASE, 3) == ([], 0)
+
+def test_store_rollups_follow_edits(tmp_path):
+    store = CalendarStore(Journal(str(tmp_path / 'calendar.journal'), str(tmp_path / 'calendar.snap')))
+    store.load()
+    a = store.add(BASE + timedelta(hours=9), 1, 0, "A", "", 2)
+    b = store.add(BASE + timedelta(hours=23), 2, 0, "B", "", 5)
+
+    assert store.day_rollup.top(BASE, 3) == ([a, b], 0)
+    assert store.hour_rollup.winner(BASE + timedelta(days=1)) == b
+
+    store.update(a, 1, 0, "A", "", 9)
+    assert store.day_rollup.top(BASE, 1) == ([a], 1)
+
+    store.remove(b)
+    assert store.day_rollup.entries(BASE + timedelta(days=1)) == []
+    assert store.hour_rollup.winner(BASE + timedelta(hours=9)) == a
+
+def brute_force(rule: Recurrence, start: datetime, end: datetime) -> list[datetime]:
+    candidates = []
+    monday = rule.start.date() - timedelta(days=rule.start.weekday())
+
+    for d in range(0, 3 * 366):
+        t = rule.start + timedelta(days=d)
+        months = (t.year - rule.start.year) * 12 + t.month - rule.start.month
+
+        match rule.frequency:
+            case 'daily':
+                ok = d % rule.interval == 0
+            case 'weekly':
+                ok = t.weekday() in rule.weekdays and (t.date() - monday).days // 7 % rule.interval == 0
+            case 'monthly':
+                ok = t.day == rule.start.day and months % rule.interval == 0
+
+        if ok:
+            candidates.append(t)
+
+    if rule.count is not None:
+        candidates = candidates[:rule.count]
+
+    duration = rule.end() - rule.start
+    return [t for t in candidates if (rule.until is None or t < rule.until) and t not in rule.exceptions and t < end and t + duration > start]
+
+def test_recurrence_matches_brute_force():
+    start = datetime(2024, 1, 31, 22)
+    rules = [
+        Recurrence(start, 3, 0, "Daily", "", 0, 'daily', 3),
+        Recurrence(start, 1, 0, "Weekly", "", 0, 'weekly', 2, (0, 2, 6)),
+        Recurrence(start, 0, 2, "Weekly", "", 0, 'weekly', 1, (1,), count=7),
+        Recurrence(start, 1, 0, "Monthly", "", 0, 'monthly', 1, until=datetime(2025, 1, 1)),
+        Recurrence(start, 1, 0, "Monthly", "", 0, 'monthly', 2, count=5, exceptions=(datetime(2024, 3, 31, 22),)),
+        Recurrence(start, 2, 0, "Daily", "", 0, 'daily', 1, until=datetime(2024, 3, 1), exceptions=(start + timedelta(days=2), start + timedelta(days=5))),
+    ]
+
+    for rule in rules:
+        for a, b in ((datetime(2024, 1, 1), datetime(2025, 6, 1)), (datetime(2024, 2, 3, 23), datetime(2024, 2, 20)), (datetime(2024, 7, 1), datetime(2024, 7, 2))):
+            assert list(rule.occurrences(a, b)) == brute_force(rule, a, b), (rule.name, a, b)
+
+def test_store_expands_rules_with_exceptions(tmp_path):
+    store = CalendarStore(Journal(str(tmp_path / 'calendar.journal'), str(tmp_path / 'calendar.snap')))
+    store.load()
+    rule_id = store.add_rule(BASE + timedelta(hours=8), 1, 0, "Gym", "", 2, 'weekly', 1, (0, 3), count=6, exceptions=(BASE + timedelta(days=3, hours=8),))
+    occurrences = store.occurrences(BASE, BASE + timedelta(weeks=8))
+
+    assert [o.start for o in occurrences] == [BASE + timedelta(days=d, hours=8) for d in (0, 7, 10, 14, 17)]
+    assert {o.rule for o in occurrences} == {rule_id}
+
+def free_brute_force(intervals, start: datetime, end: datetime, duration: timedelta) -> list[tuple[datetime, datetime]]:
+    gaps = []
+    t = start
+
+    for s, e in sorted(intervals):
+        if s > t and min(s, end) - t >= duration:
+            gaps.append((t, min(s, end)))
+
+        t = max(t, e)
+
+        if t >= end:
+            return gaps
+
+    if end - t >= duration:
+        gaps.append((t, end))
+
+    return gaps
+
+def test_gap_index_matches_brute_force():
+    rng = random.Random(15)
+    intervals = [(s, e) for s, e, _, _ in random_events(rng, 200)]
+    gaps = GapIndex(intervals[:100], size=4)
+
+    for s, e in intervals[100:]:
+        gaps.add(s, e)
+
+    for s, e in rng.sample(intervals, 120):
+        intervals.remove((s, e))
+        gaps.remove(s, e)
+
+    assert len(gaps) == len(intervals)
+
+    for _ in range(200):
+        start = BASE + timedelta(minutes=15 * rng.randrange(4 * 24 * 22))
+        end = start + timedelta(hours=rng.randint(1, 24 * 5))
+        duration = timedelta(minutes=15 * rng.randint(1, 16))
+        assert list(gaps.free(start, end, duration)) == free_brute_force(intervals, start, end, duration)
+
+def test_gap_index_sees_through_nested_events():
+    day = [(BASE + timedelta(hours=9), BASE + timedelta(hours=17)), (BASE + timedelta(hours=10), BASE + timedelta(hours=11)), (BASE + timedelta(hours=12), BASE + timedelta(hours=13))]
+    gaps = GapIndex(day, size=1)
+
+    assert list(gaps.free(BASE, BASE + timedelta(days=1), timedelta(minutes=30))) == [(BASE, BASE + timedelta(hours=9)), (BASE + timedelta(hours=17), BASE + timedelta(days=1))]
+    assert list(GapIndex().free(BASE, BASE + timedelta(hours=1), timedelta(hours=2))) == []
+
+def test_edits_during_loading_never_drop_saved_events(tmp_path):
+    def backend():
+        return Journal(str(tmp_path / 'calendar.journal'), str(tmp_path / 'calendar.snap'))
+
+    saved = CalendarStore(backend())
+    saved.load()
+    kept = saved.add(BASE + timedelta(days=30, hours=9), 2, 0, "Saved", "", 1)
+    saved.add(BASE + timedelta(days=31, hours=9), 2, 0, "Also saved", "", 1)
+    saved.close()
+
+    store = CalendarStore(backend())
+    loader = Loader(store, BASE, BASE + timedelta(days=7), size=1)
+    loader.start()
+    loader.thread.join()
+    asked = []
+
+    assert store.add(BASE + timedelta(days=30, hours=10), 1, 0, "New", "", 5, on_conflict=lambda c: asked.append(c) or False) is None
+    assert asked == [[kept]]
+    assert store.add_many([(BASE + timedelta(days=31, hours=10), 1, 0, "Import", "", 9)]) == (0, 1, 0)
+
+    while not store.loaded.is_set():
+        loader.poll()
+
+    assert sorted(e.name for e in store.schedule.values()) == ["Also saved", "Saved"]
+    assert len(store.index) == 2
+    store.close()
+
+    reloaded = CalendarStore(backend())
+    reloaded.load()
+    assert sorted(e.name for e in reloaded.schedule.values()) == ["Also saved", "Saved"]
+
+def test_failed_load_releases_edits(tmp_path):
+    (tmp_path / 'calendar.snap').write_bytes(b'not a snapshot')
+    store = CalendarStore(Journal(str(tmp_path / 'calendar.journal'), str(tmp_path / 'calendar.snap')))
+    loader = Loader(store, BASE, BASE + timedelta(days=1))
+    loader.start()
+    loader.thread.join()
+
+    with pytest.raises(ValueError):
+        loader.poll()
+
+    assert store.ready.is_set() and not store.loaded.is_set()
+
+    with pytest.raises(RuntimeError):
+        store.add(BASE, 1, 0, "Lost", "", 0)
+
+def booked_minutes(events, start: datetime, end: datetime) -> int:
+    return sum(max(timedelta(0), min(e, end) - max(s, start)) // timedelta(minutes=1) for s, e, _, _ in events)
+
+def test_day_load_matches_brute_force():
+    rng = random.Random(24)
+    events = random_events(rng, 300)
+    rng.shuffle(events)
+    load = DayLoad()
+    live = []
+
+    for n, e in enumerate(events):
+        load.add(*e)
+        live.append(e)
+
+        if n % 3 == 0:
+            gone = live.pop(rng.randrange(len(live)))
+            load.remove(*gone)
+
+        if n % 25 == 0:
+            a = BASE + timedelta(days=rng.randrange(22))
+            b = a + timedelta(days=rng.randint(1, 10))
+            assert load.total(a, b) == booked_minutes(live, a, b)
+
+    for d in range(-2, 24):
+        a = BASE + timedelta(days=d)
+        assert load.total(a, a + timedelta(days=1)) == booked_minutes(live, a, a + timedelta(days=1))
+
+    assert load.total(BASE - timedelta(days=30), BASE + timedelta(days=60)) == booked_minutes(live, BASE - timedelta(days=30), BASE + timedelta(days=60))
+
+def test_day_load_grows_to_earlier_days():
+    load = DayLoad()
+    load.add(BASE + timedelta(days=10, hours=22), BASE + timedelta(days=11, hours=2), 0, 1)
+    assert load.total(BASE, BASE + timedelta(days=20)) == 240
+
+    load.add(BASE + timedelta(hours=23), BASE + timedelta(days=1, hours=1), 0, 2)
+    assert [load.total(BASE + timedelta(days=d), BASE + timedelta(days=d + 1)) for d in (0, 1, 10, 11)] == [60, 60, 120, 120]
+    assert load.total(BASE + timedelta(days=1, hours=12), BASE + timedelta(days=11)) == 180
+
+def journal_store(tmp_path) -> CalendarStore:
+    store = CalendarStore(Journal(str(tmp_path / 'calendar.journal'), str(tmp_path / 'calendar.snap')))
+    store.load()
+    return store
+
+def test_add_many_only_displaces_for_inserted_events(tmp_path):
+    store = journal_store(tmp_path)
+    a = store.add(BASE + timedelta(hours=9), 1, 0, "A", "", 1)
+    c = store.add(BASE + timedelta(hours=10), 1, 0, "C", "", 1)
+    d = store.add(BASE + timedelta(hours=11), 1, 0, "D", "", 9)
+
+    assert store.add_many([(BASE + timedelta(hours=9), 8, 0, "B", "", 9)], 'higher') == (0, 1, 0)
+    assert sorted(store.schedule) == [a, c, d]
+
+    assert store.add_many([(BASE + timedelta(hours=9), 2, 0, "B", "", 5), (BASE + timedelta(hours=10), 2, 0, "E", "", 7)], 'higher') == (1, 1, 2)
+    assert sorted(e.name for e in store.schedule.values()) == ["B", "D"]
+
+    assert store.add_many([(BASE + timedelta(hours=8), 5, 0, "F", "", 0), (BASE + timedelta(hours=8), 1, 0, "G", "", 0)], 'replace') == (1, 1, 2)
+    assert sorted(e.name for e in store.schedule.values()) == ["F"]
+    store.close()
+
+    reloaded = journal_store(tmp_path)
+    assert sorted(e.name for e in reloaded.schedule.values()) == ["F"]
+
+def test_add_many_leaves_existing_overlaps_alone(tmp_path):
+    j = Journal(str(tmp_path / 'calendar.journal'), str(tmp_path / 'calendar.snap'))
+    j.load()
+    j.add(1, BASE + timedelta(hours=9), 1, 0, "E", "", 0)
+    j.add_rule((2, BASE + timedelta(hours=9), 1, 0, "Daily", "", 0, 'daily', 1, (0,), None, None, ()))
+    j.close()
+
+    store = journal_store(tmp_path)
+    assert store.add_many([(BASE + timedelta(hours=8), 0, 2, "Early", "", 0), (BASE + timedelta(hours=11), 1, 0, "Late", "", 0)], 'skip') == (2, 0, 0)
+    store.close()
+
+    assert sorted(e.name for e in journal_store(tmp_path).schedule.values()) == ["E", "Early", "Late"]
+
+def test_rules_ask_before_replacing_events(tmp_path):
+    store = journal_store(tmp_path)
+    event_id = store.add(BASE + timedelta(days=2, hours=9, minutes=30), 1, 0, "Meeting", "", 0)
+    asked = []
+
+    assert store.add_rule(BASE + timedelta(hours=9), 1, 0, "Daily", "", 0, 'daily', 1, on_conflict=lambda c: asked.append(c) or False) is None
+    assert asked == [[event_id]] and store.rules == {}
+
+    rule_id = store.add_rule(BASE + timedelta(hours=8), 1, 0, "Daily", "", 0, 'daily', 2)
+    assert store.update_rule(rule_id, 2, 0, "Daily", "", 0, 'daily', 2, on_conflict=lambda c: False) is False
+    assert store.rules[rule_id].quarters() == 4 and event_id in store
+
+    assert store.update_rule(rule_id, 2, 0, "Daily", "", 0, 'daily', 2)
+    assert event_id not in store and store.rules[rule_id].interval == 2
+
+def test_sweep_matches_pairwise_brute_force():
+    rng = random.Random(14)
+    events = [Event(s, 0, (e - s) // timedelta(minutes=1), str(i), "", p) for s, e, p, i in random_events(rng, 150)]
+    rule = Recurrence(BASE + timedelta(hours=9), 2, 0, "Daily", "", 0, 'daily', 1)
+    events += [Occurrence(1, s, rule) for s in rule.occurrences(BASE, BASE + timedelta(days=21))]
+    expected = set()
+
+    for n, a in enumerate(events):
+        for b in events[n + 1:]:
+            if a.start < b.end() and b.start < a.end():
+                expected.add((frozenset((id(a), id(b))), max(a.start, b.start), min(a.end(), b.end())))
+
+    found = [(frozenset((id(a), id(b))), s, e) for a, b, s, e in sweep(events)]
+    assert len(found) == len(expected) and set(found) == expected
+
+def test_search_matches_prefixes_of_every_term(tmp_path):
+    store = journal_store(tmp_path)
+    store.add(BASE + timedelta(hours=9), 1, 0, "Dentist appointment", "Bring insurance card", 0)
+    store.add(BASE + timedelta(days=1, hours=9), 1, 0, "Team meeting", "Quarterly planning", 0)
+    store.add(BASE + timedelta(days=2, hours=9), 1, 0, "Planning poker", "", 0)
+    store.add_rule(BASE + timedelta(hours=7), 1, 0, "Morning run", "Park loop before the team meeting", 0, 'daily', 1)
+    store.remove(store.add(BASE + timedelta(days=3, hours=9), 1, 0, "Removed meeting", "", 0))
+
+    def names(query: str) -> list[str]:
+        return sorted(e.name for e in store.search(query, BASE))
+
+    assert names("dent") == ["Dentist appointment"]
+    assert names("PLAN") == ["Planning poker", "Team meeting"]
+    assert names("meet") == ["Morning run", "Team meeting"]
+    assert names("meet plan") == ["Team meeting"]
+    assert names("team loop") == ["Morning run"]
+    assert names("meeting dentist") == names("zzz") == []
+    assert all(type(e) is Occurrence for e in store.search("run", BASE))
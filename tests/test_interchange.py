@@ -0,0 +1,145 @@
+from datetime import datetime
+from itertools import islice
+from interchange import iter_vevents, import_ics, parse_rrule, export, expand_rules
+from engine import CalendarStore
+from storage import Journal
+import pytest
+import csv
+import io
+
+def ics(*events: str) -> list[str]:
+    return ['BEGIN:VCALENDAR', 'VERSION:2.0', *'\n'.join(events).split('\n'), 'END:VCALENDAR']
+
+def store(tmp_path) -> CalendarStore:
+    s = CalendarStore(Journal(str(tmp_path / 'calendar.journal'), str(tmp_path / 'calendar.snap')))
+    s.load()
+    return s
+
+def write(tmp_path, *events: str) -> str:
+    path = tmp_path / 'import.ics'
+    path.write_text('\r\n'.join(ics(*events)) + '\r\n')
+    return str(path)
+
+def test_nested_components_do_not_leak_properties():
+    lines = ics(
+        'BEGIN:VEVENT',
+        'SUMMARY:Dentist',
+        'BEGIN:VALARM',
+        'ACTION:DISPLAY',
+        'DESCRIPTION:Reminder',
+        'END:VALARM',
+        'DTSTART:20240301T090000',
+        'END:VEVENT',
+    )
+    events = list(iter_vevents(lines))
+
+    assert len(events) == 1
+    assert 'DESCRIPTION' not in events[0] and 'ACTION' not in events[0]
+    assert events[0]['DTSTART'] == [({}, '20240301T090000')]
+
+def test_invalid_events_are_skipped_and_reported(tmp_path):
+    path = write(tmp_path,
+        'BEGIN:VEVENT\nSUMMARY:Broken\nDTSTART:2024-03-01\nEND:VEVENT',
+        'BEGIN:VEVENT\nSUMMARY:No start\nEND:VEVENT',
+        'BEGIN:VEVENT\nSUMMARY:Yearly\nDTSTART:20240301T090000\nRRULE:FREQ=YEARLY\nEND:VEVENT',
+        'BEGIN:VEVENT\nSUMMARY:Fine\nDTSTART:20240301T090000\nDURATION:PT1H\nEND:VEVENT',
+    )
+    s = store(tmp_path)
+    invalid = []
+    stats = import_ics(s, path, invalid=invalid)
+
+    assert (stats['added'], stats['invalid']) == (1, 3)
+    assert [m.split(':')[0] for m in invalid] == ["Event 1 (Broken)", "Event 2 (No start)", "Event 3 (Yearly)"]
+    assert [e.name for e in s.schedule.values()] == ["Fine"]
+
+def test_rrule_imports_as_rule(tmp_path):
+    path = write(tmp_path,
+        'BEGIN:VEVENT',
+        'SUMMARY:Gym',
+        'DTSTART:20240101T080000',
+        'DTEND:20240101T090000',
+        'RRULE:FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,WE;UNTIL=20240131T080000',
+        'EXDATE:20240103T080000',
+        'END:VEVENT',
+    )
+    s = store(tmp_path)
+    stats = import_ics(s, path)
+
+    assert (stats['added'], stats['rules']) == (0, 1)
+    assert [o.start for o in s.occurrences(datetime(2024, 1, 1), datetime(2024, 3, 1))] == [
+        datetime(2024, 1, 1, 8),
+        datetime(2024, 1, 15, 8),
+        datetime(2024, 1, 17, 8),
+        datetime(2024, 1, 29, 8),
+        datetime(2024, 1, 31, 8),
+    ]
+
+@pytest.mark.parametrize('rule', ['FREQ=YEARLY', 'FREQ=DAILY;BYDAY=MO', 'FREQ=WEEKLY;BYDAY=1MO', 'FREQ=MONTHLY;BYSETPOS=-1', 'FREQ=WEEKLY;INTERVAL=0'])
+def test_unsupported_rrules_are_rejected(rule):
+    with pytest.raises(ValueError):
+        parse_rrule(rule, datetime(2024, 1, 1, 8))
+
+def test_rrule_until_is_inclusive():
+    start = datetime(2024, 1, 1, 8)
+
+    assert parse_rrule('FREQ=DAILY;UNTIL=20240105T080000;COUNT=3', start) == ('daily', 1, (0,), datetime(2024, 1, 5, 8, 1), 3)
+    assert parse_rrule('FREQ=MONTHLY;BYMONTHDAY=1;UNTIL=20240601', start) == ('monthly', 1, (0,), datetime(2024, 6, 2), None)
+
+def test_export_round_trips_rules(tmp_path):
+    s = store(tmp_path)
+    s.add(datetime(2024, 1, 2, 9), 1, 0, "Once", "", 3)
+    s.add_rule(datetime(2024, 1, 1, 8), 0, 2, "Gym", "", 2, 'weekly', 2, (0, 3), datetime(2024, 3, 1), None, (datetime(2024, 1, 4, 8),))
+    s.add_rule(datetime(2024, 1, 31, 18), 1, 0, "Rent", "", 0, 'monthly', 1, (), None, 4)
+    s.add_rule(datetime(2023, 1, 1, 7), 1, 0, "Over", "", 0, 'daily', 1, (), datetime(2023, 2, 1))
+
+    out = io.StringIO()
+    assert export(s, out, 'ics', datetime(2024, 1, 1)) == 3
+
+    path = tmp_path / 'export.ics'
+    path.write_text(out.getvalue())
+    (tmp_path / 'copy').mkdir()
+    copy = store(tmp_path / 'copy')
+    stats = import_ics(copy, str(path))
+
+    assert (stats['added'], stats['rules'], stats['invalid']) == (1, 2, 0)
+    assert sorted(r.record(0)[1:] for r in copy.rules.values()) == sorted(r.record(0)[1:] for i, r in s.rules.items() if r.name != "Over")
+
+def test_csv_export_expands_occurrences(tmp_path):
+    s = store(tmp_path)
+    event_id = s.add(datetime(2024, 1, 2, 9), 1, 0, "Once", "", 3)
+    rule_id = s.add_rule(datetime(2024, 1, 1, 8), 0, 2, "Daily", "", 2, 'daily', 1)
+
+    out = io.StringIO()
+    assert export(s, out, 'csv', datetime(2024, 1, 1), datetime(2024, 1, 4)) == 4
+
+    rows = list(csv.DictReader(io.StringIO(out.getvalue())))
+    assert [(r['id'], r['rule'], r['start']) for r in rows] == [
+        ('', str(rule_id), '2024-01-01T08:00:00'),
+        ('', str(rule_id), '2024-01-02T08:00:00'),
+        (str(event_id), '', '2024-01-02T09:00:00'),
+        ('', str(rule_id), '2024-01-03T08:00:00'),
+    ]
+
+def test_csv_export_bounds_open_ended_rules(tmp_path):
+    s = store(tmp_path)
+    s.add_rule(datetime.now().replace(microsecond=0), 0, 1, "Forever", "", 0, 'daily', 1)
+
+    assert 360 <= export(s, io.StringIO(), 'csv') <= 367
+
+def test_rrule_conflicts_follow_the_policy(tmp_path):
+    path = write(tmp_path, 'BEGIN:VEVENT\nSUMMARY:Standup\nDTSTART:20240101T090000\nDURATION:PT30M\nPRIORITY:9\nRRULE:FREQ=DAILY\nEND:VEVENT')
+    s = store(tmp_path)
+    s.add(datetime(2024, 1, 3, 9), 1, 0, "Meeting", "", 3)
+
+    assert (import_ics(s, path, 'skip')['skipped'], s.rules) == (1, {})
+    assert import_ics(s, path, 'higher')['skipped'] == 1
+    assert import_ics(s, path, 'replace')['replaced'] == 1
+    assert len(s) == 0 and len(s.rules) == 1
+
+def test_rule_expansion_streams(tmp_path):
+    s = store(tmp_path)
+    daily = s.add_rule(datetime(2024, 1, 1, 8), 0, 1, "Daily", "", 0, 'daily', 1)
+    weekly = s.add_rule(datetime(2024, 1, 3, 7), 0, 1, "Weekly", "", 0, 'weekly', 1)
+    occurrences = expand_rules(s, datetime(2024, 1, 1), datetime(9000, 1, 1))
+
+    assert [(r[0], r[1].day) for r in islice(occurrences, 5)] == [(daily, 1), (daily, 2), (weekly, 3), (daily, 3), (daily, 4)]
@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+from render import MODELS, Prefetcher, cell_events, period_end
+from engine import CalendarStore
+from storage import Journal, SqliteStore
+import random
+
+BASE = datetime(2024, 1, 1)
+
+def key(e):
+    return None if e is None else (e.start, e.quarters(), e.name, e.priority)
+
+def flatten(mode: str, cells):
+    if mode == "Yearly":
+        return cells
+
+    return [key(e) for e in cell_events(mode, cells)] + ([(day, more) for day, _, more in cells] if mode == "Monthly" else [])
+
+def filled(store: CalendarStore) -> CalendarStore:
+    rng = random.Random(22)
+    store.load()
+
+    for _ in range(400):
+        store.add(BASE + timedelta(minutes=15 * rng.randrange(4 * 24 * 366)), rng.randint(0, 30), rng.randrange(4), "Event", "", rng.randrange(11), on_conflict=lambda c: False)
+
+    store.add_rule(BASE + timedelta(hours=12), 1, 0, "Lunch", "", 4, 'weekly', 1, (0, 2, 4))
+    return store
+
+def test_snapshot_models_match_the_store(tmp_path):
+    store = filled(CalendarStore(Journal(str(tmp_path / 'calendar.journal'), str(tmp_path / 'calendar.snap'))))
+
+    for mode, start in (("Daily", BASE + timedelta(days=40)), ("Weekly", BASE + timedelta(weeks=20)), ("Monthly", datetime(2024, 5, 1)), ("Yearly", BASE)):
+        snapshot = store.snapshot(start, period_end(mode, start))
+        assert flatten(mode, MODELS[mode](snapshot, start)) == flatten(mode, MODELS[mode](store, start))
+
+def test_prefetch_keeps_the_visible_range(tmp_path):
+    store = filled(CalendarStore(SqliteStore(str(tmp_path / 'calendar.db'))))
+    visible = (datetime(2024, 6, 3), datetime(2024, 6, 10))
+    store.ensure(*visible)
+    store.pin(*visible)
+    expected = sorted(store.range(*visible))
+    version = store.version
+
+    prefetcher = Prefetcher(store)
+    prefetcher.start()
+    prefetcher.prefetch("Yearly", BASE)
+
+    while prefetcher.wanted or len(prefetcher.models) < 2:
+        prefetcher.thread.join(0.01)
+
+    prefetcher.stop()
+    assert store.version > version
+    assert store.backend.loaded(*visible)
+    assert sorted(store.index.overlapping(*visible)) == expected != []
+    store.close()
+
+def test_prefetch_survives_failed_models(tmp_path):
+    store = filled(CalendarStore(Journal(str(tmp_path / 'calendar.journal'), str(tmp_path / 'calendar.snap'))))
+    failures = []
+
+    def warm(e):
+        if not failures:
+            failures.append(e)
+            raise KeyError(e.name)
+
+    prefetcher = Prefetcher(store, warm)
+    prefetcher.start()
+    prefetcher.prefetch("Weekly", BASE + timedelta(weeks=10))
+
+    while prefetcher.wanted or len(prefetcher.models) < 1:
+        prefetcher.thread.join(0.01)
+
+    assert prefetcher.thread.is_alive() and isinstance(prefetcher.error, KeyError)
+    prefetcher.stop()
+
+def test_occurrences_carry_their_frequency(tmp_path):
+    store = filled(CalendarStore(Journal(str(tmp_path / 'calendar.journal'), str(tmp_path / 'calendar.snap'))))
+    occurrences = store.snapshot(BASE, BASE + timedelta(weeks=1)).occurrences(BASE, BASE + timedelta(weeks=1))
+    store.remove_rule(occurrences[0].rule)
+
+    assert [o.frequency for o in occurrences] == ['weekly'] * 3
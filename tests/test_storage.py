@@ -0,0 +1,213 @@
+from datetime import datetime
+from storage import SNAPSHOT_MAGIC, SNAPSHOT_HEADERS, SNAPSHOT_EVENTS, SNAPSHOT_RULES, NO_UNTIL, FREQUENCIES, Journal, read_snapshot, write_snapshot, to_minutes
+from engine import CalendarStore, Autosaver
+import pytest
+import struct
+import threading
+import json
+import os
+
+def journal(tmp_path, threshold=1000) -> Journal:
+    return Journal(str(tmp_path / 'calendar.journal'), str(tmp_path / 'calendar.snap'), threshold)
+
+def test_replay_applies_every_operation(tmp_path):
+    j = journal(tmp_path)
+    j.load()
+    j.add(1, datetime(2024, 1, 1, 9), 1, 0, "Standup", "", 3)
+    j.add(2, datetime(2024, 1, 1, 11), 0, 2, "Lunch", "Notes", 1)
+    j.update(1, 2, 1, "Planning", "Long", 5)
+    j.remove(2)
+    j.add_rule((3, datetime(2024, 1, 2, 8), 0, 1, "Gym", "", 0, 'weekly', 1, (1, 3), None, None, ()))
+    j.add_rule((4, datetime(2024, 1, 2, 8), 0, 1, "Gone", "", 0, 'daily', 1, (1,), None, 5, ()))
+    j.remove_rule(4)
+    j.close()
+
+    records, rules = journal(tmp_path).load()
+    assert list(records) == [(1, datetime(2024, 1, 1, 9), 2, 1, "Planning", "Long", 5)]
+    assert list(rules) == [(3, datetime(2024, 1, 2, 8), 0, 1, "Gym", "", 0, 'weekly', 1, (1, 3), None, None, ())]
+
+def test_replay_stops_at_torn_tail(tmp_path):
+    j = journal(tmp_path)
+    j.load()
+    j.add(1, datetime(2024, 1, 1, 9), 1, 0, "Kept", "", 0)
+    j.close()
+
+    with open(j.path, 'a') as f:
+        f.write('{"seq": 2, "op": "add", "id": 2, "sta')
+
+    loaded = journal(tmp_path)
+    records, _ = loaded.load()
+    assert [r[0] for r in records] == [1]
+    assert loaded.last_id == 1
+
+def test_replay_reads_rotated_journal_first(tmp_path):
+    j = journal(tmp_path)
+    lines = [{"seq": 1, "op": "add", "id": 1, "start": "2024-01-01T09:00:00", "hours": 1, "minutes": 0, "name": "Old", "description": "", "priority": 0}, {"seq": 2, "op": "update", "id": 1, "hours": 2, "minutes": 0, "name": "New", "description": "", "priority": 0}]
+
+    with open(j.path + '.old', 'w') as f:
+        f.write(json.dumps(lines[0]) + '\n')
+
+    with open(j.path, 'w') as f:
+        f.write(json.dumps(lines[1]) + '\n')
+
+    records, _ = j.load()
+    assert list(records) == [(1, datetime(2024, 1, 1, 9), 2, 0, "New", "", 0)]
+    assert j.seq == 2
+
+def test_compaction_keeps_later_entries(tmp_path):
+    store = CalendarStore(journal(tmp_path, threshold=3))
+    store.load()
+    ids = [store.add(datetime(2024, 1, d, 9), 1, 0, f"Event {d}", "", d % 3) for d in range(1, 6)]
+    store.remove(ids[1])
+    store.save()
+
+    assert os.path.exists(store.backend.snapshot)
+    assert not os.path.exists(store.backend.path + '.old')
+    assert not os.path.exists(store.backend.path)
+
+    store.add(datetime(2024, 2, 1, 9), 0, 1, "After", "", 0)
+    store.close()
+
+    reloaded = CalendarStore(journal(tmp_path))
+    reloaded.load()
+    assert sorted(e.name for e in reloaded.schedule.values()) == ["After", "Event 1", "Event 3", "Event 4", "Event 5"]
+    assert reloaded.last_id == store.last_id
+
+def test_flush_during_compaction_is_not_lost(tmp_path):
+    store = CalendarStore(journal(tmp_path, threshold=1))
+    store.load()
+    store.add(datetime(2024, 1, 1, 9), 1, 0, "Before", "", 0)
+
+    with store.lock:
+        records, rules, checkpoint = store.records(), store.rule_records(), store.backend.checkpoint()
+
+    def edit():
+        store.add(datetime(2024, 1, 2, 9), 1, 0, "During", "", 0)
+        store.backend.flush()
+
+    writer = threading.Thread(target=edit)
+    writer.start()
+    writer.join(0.2)
+    store.backend.compact(records, rules, checkpoint)
+    writer.join()
+    store.close()
+
+    reloaded = CalendarStore(journal(tmp_path))
+    reloaded.load()
+    assert sorted(e.name for e in reloaded.schedule.values()) == ["Before", "During"]
+
+RECORDS = [
+    (1, datetime(2024, 3, 1, 9), 1, 2, "Review", "", 4),
+    (2, datetime(2024, 3, 1, 13, 15), 0, 3, "Café ☕", "Line one\nline two", 0),
+    (3, datetime(1969, 12, 31, 23, 45), 25, 0, "Review", "Before the epoch", 10),
+]
+RULES = [
+    (4, datetime(2024, 1, 1, 8), 0, 2, "Gym", "", 2, 'weekly', 2, (0, 2, 4), datetime(2024, 6, 1), None, (datetime(2024, 1, 3, 8),)),
+    (5, datetime(2024, 1, 31, 18), 1, 0, "Rent", "", 7, 'monthly', 1, (2,), None, 12, ()),
+]
+
+def legacy_snapshot(path: str, version: int, records, rules=()):
+    strings = {}
+    events = b''.join(SNAPSHOT_EVENTS[version].pack(float(i), to_minutes(s), h * 4 + m, p, strings.setdefault(n, len(strings)), strings.setdefault(d, len(strings))) for i, s, h, m, n, d, p in records)
+    packed = b''.join(SNAPSHOT_RULES[version].pack(float(i), to_minutes(s), NO_UNTIL if u is None else to_minutes(u), h * 4 + m, p, strings.setdefault(n, len(strings)), strings.setdefault(d, len(strings)), c or 0, len(x), FREQUENCIES.index(f), sum(1 << w for w in ws), k) for i, s, h, m, n, d, p, f, k, ws, u, c, x in rules)
+    exceptions = [to_minutes(t) for r in rules for t in r[12]]
+    blob = [s.encode() for s in strings]
+    offsets = [0]
+
+    for b in blob:
+        offsets.append(offsets[-1] + len(b))
+
+    counts = (len(records), len(blob)) if version == 1 else (len(records), len(blob), len(rules), len(exceptions))
+
+    with open(path, 'wb') as f:
+        f.write(SNAPSHOT_HEADERS[version].pack(SNAPSHOT_MAGIC, version, 7, *counts))
+        f.write(events + packed)
+        f.write(struct.pack(f'<{len(exceptions)}q', *exceptions))
+        f.write(struct.pack(f'<{len(offsets)}I', *offsets))
+        f.writelines(blob)
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / 'calendar.snap')
+    write_snapshot(RECORDS, 42, path, RULES)
+    seq, count, records, rules = read_snapshot(path)
+
+    assert (seq, count) == (42, len(RECORDS))
+    assert list(records) == RECORDS
+    assert rules == RULES
+
+def test_empty_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / 'calendar.snap')
+    write_snapshot([], 0, path)
+    seq, count, records, rules = read_snapshot(path)
+
+    assert (seq, count, list(records), rules) == (0, 0, [], [])
+
+def test_reads_version_1_and_2_snapshots(tmp_path):
+    for version, rules in ((1, []), (2, RULES)):
+        path = str(tmp_path / f'v{version}.snap')
+        legacy_snapshot(path, version, RECORDS, rules)
+        seq, count, records, loaded = read_snapshot(path)
+
+        assert (seq, count) == (7, len(RECORDS))
+        assert [(int(i), *r) for i, *r in records] == RECORDS
+        assert [(int(i), *r) for i, *r in loaded] == rules
+
+def test_float_ids_are_migrated_to_integers(tmp_path):
+    j = journal(tmp_path)
+    legacy_snapshot(j.snapshot, 2, RECORDS, RULES)
+    records, rules = j.load()
+
+    assert [r[0] for r in records] == [1, 2, 3]
+    assert [r[1] for r in records] == sorted(r[1] for r in RECORDS)
+    assert [r[0] for r in rules] == [4, 5]
+    assert j.last_id == 5
+
+    with open(j.snapshot, 'rb') as f:
+        assert struct.unpack_from('<4sH', f.read()) == (SNAPSHOT_MAGIC, 3)
+
+def test_rejects_foreign_files(tmp_path):
+    path = tmp_path / 'calendar.snap'
+    path.write_bytes(b'not a snapshot at all')
+
+    with pytest.raises(ValueError):
+        read_snapshot(str(path))
+
+def test_rejects_unknown_versions(tmp_path):
+    path = tmp_path / 'calendar.snap'
+    path.write_bytes(SNAPSHOT_HEADERS[3].pack(SNAPSHOT_MAGIC, 4, 0, 0, 0, 0, 0))
+
+    with pytest.raises(ValueError, match="version 1-3"):
+        read_snapshot(str(path))
+
+def test_out_of_range_priorities_are_clamped(tmp_path):
+    store = CalendarStore(journal(tmp_path, threshold=1))
+    store.load()
+    event_id = store.add(datetime(2024, 1, 1, 9), 1, 0, "Huge", "", 2 ** 40)
+    store.add_many([(datetime(2024, 1, 2, 9), 1, 0, "Negative", "", -5)])
+    store.add_rule(datetime(2024, 1, 3, 9), 1, 0, "Rule", "", 2 ** 33, 'weekly')
+    store.update(event_id, 1, 0, "Huge", "", 2 ** 32)
+    store.save()
+    store.close()
+
+    reloaded = CalendarStore(journal(tmp_path))
+    reloaded.load()
+    assert sorted((e.name, e.priority) for e in [*reloaded.schedule.values(), *reloaded.rules.values()]) == [("Huge", 10), ("Negative", 0), ("Rule", 10)]
+
+def test_autosaver_survives_unexpected_errors(tmp_path, monkeypatch):
+    store = CalendarStore(journal(tmp_path))
+    store.load()
+    failed = threading.Event()
+
+    def save():
+        failed.set()
+        raise ValueError("Unsaveable record")
+
+    monkeypatch.setattr(store, 'save', save)
+    saver = Autosaver(store, delay=0.01, latency=0.2)
+    saver.start()
+    store.add(datetime(2024, 1, 1, 9), 1, 0, "Event", "", 0)
+
+    assert failed.wait(2)
+    saver.thread.join(0.1)
+    assert saver.thread.is_alive() and isinstance(saver.error, ValueError)
+    saver.stop()